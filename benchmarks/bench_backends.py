@@ -0,0 +1,45 @@
+"""
+Compares OrderbookCSVA and OrderbookDuckDB fetch times on the same date range.
+
+    python benchmarks/bench_backends.py data/ INET_MainMarket 2025-03-17 2025-03-31 --repeat 3
+"""
+import argparse
+import time
+from datetime import datetime
+from orderbook.db.csvreader import OrderbookCSVA
+from orderbook.db.duckdbreader import OrderbookDuckDB
+
+
+def bench(db, market, start, end, tickers, repeat):
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        start_ts = time.perf_counter()
+        df = db.fetch_filtered_orderbook_data(market=market, start=start, end=end, tickers=tickers)
+        timings.append(time.perf_counter() - start_ts)
+        rows = df.shape[0]
+    return min(timings), sum(timings) / len(timings), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("market")
+    parser.add_argument("start", type=datetime.fromisoformat)
+    parser.add_argument("end", type=datetime.fromisoformat)
+    parser.add_argument("--tickers", nargs="*", default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    backends = {
+        "csv": OrderbookCSVA(args.path),
+        "duckdb": OrderbookDuckDB(args.path, threads=args.threads),
+    }
+    for name, db in backends.items():
+        best, mean, rows = bench(db, args.market, args.start, args.end, args.tickers, args.repeat)
+        print(f"{name:>8}: best {best:.3f}s mean {mean:.3f}s rows {rows}")
+
+
+if __name__ == "__main__":
+    main()
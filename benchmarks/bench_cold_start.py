@@ -0,0 +1,80 @@
+"""
+Measures cold start of fresh interpreters: importing each module and running CLI --help,
+the cost every worker process and CLI invocation pays. Also reports heavy libraries
+loaded by the import and any files it leaves in the working directory.
+
+    python benchmarks/bench_cold_start.py --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+MODULES = [
+    "orderbook.db.base",
+    "orderbook.etl.pipeline",
+    "orderbook.etl.workqueue",
+    "orderbook.db.csvreader",
+    "orderbook.xmlgen.converter",
+    "orderbook.xmlgen.adhoc_pipe",
+]
+
+CLIS = [
+    "orderbook.etl.workqueue",
+    "orderbook.etl.streaming",
+    "orderbook.db.statsservice",
+]
+
+HEAVY = ["pandas", "numpy", "lxml", "pyarrow", "duckdb"]
+
+PROBE = (
+    "import sys, importlib; importlib.import_module(sys.argv[1]); "
+    f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+)
+
+
+def run(args, cwd):
+    env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    start_ts = time.perf_counter()
+    out = subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start_ts
+    if out.returncode != 0:
+        last_line = out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}"
+        return elapsed, f"FAILED {last_line}"
+    return elapsed, out.stdout.strip()
+
+
+def bench(args, repeat):
+    timings = []
+    loaded = ""
+    with tempfile.TemporaryDirectory(prefix="cold_start_") as cwd:
+        for _ in range(repeat):
+            elapsed, loaded = run(args, cwd)
+            timings.append(elapsed)
+        leftovers = sorted(os.listdir(cwd))
+    return statistics.median(timings), loaded, leftovers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline, _, _ = bench(["-c", "pass"], args.repeat)
+    print(f"{'interpreter':<36} {baseline * 1000:8.1f} ms")
+    for module in MODULES:
+        median, loaded, leftovers = bench(["-c", PROBE, module], args.repeat)
+        print(f"{'import ' + module:<36} {median * 1000:8.1f} ms  loads [{loaded}]  files {leftovers}")
+    for cli in CLIS:
+        median, out, leftovers = bench(["-m", cli, "--help"], args.repeat)
+        failed = f"  {out}" if out.startswith("FAILED") else ""
+        print(f"{cli + ' --help':<36} {median * 1000:8.1f} ms  files {leftovers}{failed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measures intra-day parsing of one orders csv.gz file: the serial pd.read_csv the reader
+does by default against read_csv_gz_parallel for a few pool sizes. Also reports the time
+spent inflating the file alone, the part of the work that stays serial in the parent.
+
+    python benchmarks/bench_csv_parallel.py data/ORK_Orders_INET_MainMarket_INET_FSALT_20250317.csv.gz --workers 2 4 8
+"""
+import argparse
+import gzip
+import os
+import time
+import pandas as pd
+from orderbook.db.base import orderbook_cols
+from orderbook.db.csvparallel import make_parse_pool, read_csv_gz_parallel
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start_ts = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start_ts)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, nargs="*", default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    dtype_map = {c: str for c in orderbook_cols}
+    dtype_map["seqnum"] = int
+    read_kwargs = dict(usecols=orderbook_cols, dtype=dtype_map, index_col=0)
+
+    def inflate():
+        with gzip.open(args.path, 'rb') as f:
+            return len(f.read())
+
+    inflate_s, size = best_of(inflate, args.repeat)
+    serial_s, serial = best_of(lambda: pd.read_csv(args.path, engine="c", compression="gzip", **read_kwargs), args.repeat)
+    print(f"{'inflate only':>12}: {inflate_s:.3f}s  {size / 2**20:.1f} MiB, {serial.shape[0]} rows")
+    print(f"{'serial':>12}: {serial_s:.3f}s")
+    for workers in sorted(set(args.workers)):
+        if workers < 2:
+            continue
+        pool = make_parse_pool(workers)
+        try:
+            # first call starts the workers, not counted
+            read_csv_gz_parallel(args.path, pool, workers, min_parallel_bytes=0, **read_kwargs)
+            parallel_s, parallel = best_of(
+                lambda: read_csv_gz_parallel(args.path, pool, workers, min_parallel_bytes=0, **read_kwargs), args.repeat
+            )
+        finally:
+            pool.shutdown()
+        assert parallel.shape == serial.shape
+        print(f"{f'{workers} workers':>12}: {parallel_s:.3f}s  speedup {serial_s / parallel_s:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
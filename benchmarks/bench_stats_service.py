@@ -0,0 +1,72 @@
+"""
+Load test for the stats query service: many concurrent clients issuing a mix of queries.
+
+    python -m orderbook.db.statsservice --stats-path orderbook_stats.db &
+    python benchmarks/bench_stats_service.py 2025-01-01 2025-03-31 --clients 32 --requests 20 --distinct 4
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+
+async def fetch(host, port, target):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    body = await reader.read()
+    writer.close()
+    status = int(body.split(b" ", 2)[1])
+    return status, len(body)
+
+
+async def client(host, port, targets, requests, latencies, errors):
+    for _ in range(requests):
+        start_ts = time.perf_counter()
+        status, _ = await fetch(host, port, random.choice(targets))
+        latencies.append(time.perf_counter() - start_ts)
+        if status != 200:
+            errors.append(status)
+
+
+async def run(args):
+    # distinct windows so the mix has cache hits, coalesced reads and fresh reads
+    span = (args.end - args.start).days
+    targets = []
+    for i in range(args.distinct):
+        start = args.start + timedelta(days=i * span // max(args.distinct, 1) // 2)
+        targets.append(f"/stats?start={start:%Y-%m-%d}&end={args.end:%Y-%m-%d}&format={args.format}")
+
+    latencies, errors = [], []
+    wall = time.perf_counter()
+    await asyncio.gather(*[client(args.host, args.port, targets, args.requests, latencies, errors) for _ in range(args.clients)])
+    wall = time.perf_counter() - wall
+
+    latencies.sort()
+    print(f"requests {len(latencies)} errors {len(errors)} wall {wall:.2f}s throughput {len(latencies) / wall:.1f} req/s")
+    print(f"latency p50 {statistics.median(latencies) * 1000:.1f}ms p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms max {latencies[-1] * 1000:.1f}ms")
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    writer.write(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+    health = (await reader.read()).split(b"\r\n\r\n", 1)[1]
+    writer.close()
+    print(f"service counters {json.loads(health)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("start", type=datetime.fromisoformat)
+    parser.add_argument("end", type=datetime.fromisoformat)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+    parser.add_argument("--distinct", type=int, default=4, help="Distinct queries in the mix")
+    parser.add_argument("--format", default="arrow", choices=["arrow", "json"])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Times split_and_write_xml over compression levels and writer thread counts.
+
+    python benchmarks/bench_xml_export.py data/ INET_MainMarket 2025-03-17 2025-03-31 --cap 50000 --levels 1 6 9 --writers 0 1 2 4
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from orderbook.db.csvreader import OrderbookCSVA
+from orderbook.xmlgen.converter import split_and_write_xml
+
+
+def bench(orders, cap, level, writers, repeat):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        out = tempfile.mkdtemp(prefix="bench_xml_") + os.sep
+        try:
+            start_ts = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                split_and_write_xml(orders, path=out, cap=cap, prevalidate=False, compress_level=level, writers=writers)
+            timings.append(time.perf_counter() - start_ts)
+            size = sum(os.path.getsize(os.path.join(out, f)) for f in os.listdir(out))
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+    return min(timings), sum(timings) / len(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("market")
+    parser.add_argument("start", type=datetime.fromisoformat)
+    parser.add_argument("end", type=datetime.fromisoformat)
+    parser.add_argument("--tickers", nargs="*", default=None)
+    parser.add_argument("--cap", type=int, default=250000)
+    parser.add_argument("--levels", type=int, nargs="*", default=[1, 6, 9])
+    parser.add_argument("--writers", type=int, nargs="*", default=[0, 1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    orders = OrderbookCSVA(args.path).fetch_filtered_orderbook_data(
+        market=args.market, start=args.start, end=args.end, tickers=args.tickers
+    )
+    print(f"{orders.shape[0]} orders, cap {args.cap}")
+    for level in args.levels:
+        for writers in args.writers:
+            best, mean, size = bench(orders, args.cap, level, writers, args.repeat)
+            print(f"level {level} writers {writers}: best {best:.2f}s mean {mean:.2f}s zip bytes {size}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Union, Any
+from typing import Iterator, List, Optional, Union, Any, TYPE_CHECKING
 from datetime import datetime
 from orderbook.MarketTypes import MARKET, PHASE
-from pandas import DataFrame
+
+if TYPE_CHECKING:
+    # annotations only, importing base must not load pandas or pyarrow
+    from pandas import DataFrame
+    from pyarrow import RecordBatch
 
 
 orderbook_cols = ['submittingentityid', 'dea', 'clientidcode',
@@ -32,7 +36,7 @@ class OrderbookDB(ABC):
         end: datetime,
         tickers: Optional[Union[str, List[str]]],        
         phases: Optional[Union[PHASE, List[PHASE]]]        
-    ) -> Optional[DataFrame]:
+    ) -> Optional["DataFrame"]:
         pass
 
     @abstractmethod
@@ -43,19 +47,42 @@ class OrderbookDB(ABC):
     def get_min_date(self, market: MARKET) -> Optional[datetime]:
         pass
 
+    def close(self):
+        """Releases worker processes held by the backend. Backends without any do nothing."""
+
+
+def make_orderbook_db(path: str, backend: str = "csv", parse_workers: int = 1) -> OrderbookDB:
+    """
+    Returns an OrderbookDB implementation for the given backend name, 'csv' or 'duckdb'.
+    Backends are imported on demand so optional engines are only required when used.
+    parse_workers sizes the csv backend's intra-day parse pool, 1 runs without one.
+    """
+    if backend == "csv":
+        from orderbook.db.csvreader import OrderbookCSVA
+        return OrderbookCSVA(path=path, parse_workers=parse_workers)
+    if backend == "duckdb":
+        from orderbook.db.duckdbreader import OrderbookDuckDB
+        return OrderbookDuckDB(path=path)
+    raise ValueError(f"Unknown orderbook backend: {backend}")
+
 
 class OrderbookStatsDB(ABC):
-    """Abstract base class for orderbook statistics database operations."""
+    """Abstract base class for orderbook statistics database operations.
+
+    Rows flagged ``provisional`` are intraday snapshots of a live stream. Date lookups only
+    see final rows, so the batch pipeline still processes a day a stream left partial, and
+    ``write_stats_df`` replaces the day's provisional rows.
+    """
 
     @abstractmethod
     def get_max_date(self) -> Optional[datetime]:
-        """Returns the maximum date in the orderbook statistics database."""
+        """Returns the maximum date with final stats in the orderbook statistics database."""
         raise NotImplementedError("Subclasses must implement this method.")
 
     @abstractmethod
     def get_dates_between(self, start: datetime, end: datetime) -> List[datetime]:
         """
-        Returns distinct orderbook statistics dates between given dates.
+        Returns distinct orderbook statistics dates with final stats between given dates.
         If no data is available, returns an empty list.
         """
         raise NotImplementedError("Subclasses must implement this method.")
@@ -63,15 +90,78 @@ class OrderbookStatsDB(ABC):
     @abstractmethod
     def get_date_exists(self, date: datetime) -> bool:
         """
-        Checks if a specific date exists in the orderbook statistics database.
+        Checks if final stats for a specific date exist in the orderbook statistics database.
         Returns True if the date exists, False otherwise.
         """
         raise NotImplementedError("Subclasses must implement this method.")
 
     @abstractmethod
-    def write_stats_df(self, df: DataFrame):
+    def write_stats_df(self, df: "DataFrame"):
         """
-        Writes a DataFrame of orderbook statistics to the database.
+        Writes a DataFrame of final orderbook statistics to the database, replacing
+        provisional rows of the same dates and markets.
         If the DataFrame is empty, it should not raise an error.
         """
-        raise NotImplementedError("Subclasses must implement this method.")
\ No newline at end of file
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def upsert_stats_df(self, df: "DataFrame"):
+        """
+        Writes a DataFrame of orderbook statistics, replacing existing rows with the same
+        (date, market, orderbookcode). Used for rolling intraday snapshots, flagged with a
+        ``provisional`` column.
+        """
+        raise NotImplementedError("Backend does not support replacing stats rows.")
+
+    def read_stats(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> "DataFrame":
+        """Returns stats rows between dates, optionally only some columns, markets and tickers."""
+        raise NotImplementedError("Backend does not support reading stats rows.")
+
+    def read_stats_batches(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+        batch_rows: int = 65536,
+    ) -> Iterator["RecordBatch"]:
+        """
+        Yields the rows of ``read_stats`` as Arrow record batches of at most ``batch_rows``.
+        Backends that can read incrementally override this, the default converts the frame.
+        """
+        import pyarrow as pa
+        df = self.read_stats(start, end, columns, markets, tickers)
+        yield from pa.Table.from_pandas(df, preserve_index=False).to_batches(max_chunksize=batch_rows)
+
+    def open_reader(self) -> Any:
+        """
+        Returns a handle with ``read_stats`` and ``read_stats_batches`` for a single reader thread, e.g. a dedicated
+        read-only connection. Stateless backends return themselves.
+        """
+        return self
+
+# default location per stats backend, a sqlite file or a directory of parquet partitions
+STATS_PATHS = {"sqlite": "orderbook_stats.db", "parquet": "orderbook_stats/"}
+
+
+def make_stats_db(path: Optional[str] = None, backend: str = "sqlite") -> OrderbookStatsDB:
+    """
+    Returns an OrderbookStatsDB implementation for the given backend name, 'sqlite' or 'parquet'.
+    Without a path the backend's default location from STATS_PATHS is used.
+    """
+    if path is None and backend in STATS_PATHS:
+        path = STATS_PATHS[backend]
+    if backend == "sqlite":
+        from orderbook.db.statssqlite import OrderbookStatsSqlite
+        return OrderbookStatsSqlite(db_path=path)
+    if backend == "parquet":
+        from orderbook.db.statsparquet import OrderbookStatsParquet
+        return OrderbookStatsParquet(root=path)
+    raise ValueError(f"Unknown stats backend: {backend}")
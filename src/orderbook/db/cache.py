@@ -0,0 +1,140 @@
+import logging
+import hashlib
+import json
+import os
+import uuid
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+
+class OrderbookResultCache:
+    """Content-addressed on-disk cache of fetched orderbook frames.
+
+    Frames are stored as uncompressed Arrow IPC files so they can be reopened
+    through a memory map without copying the column buffers. Least recently
+    used entries are evicted once the cache grows over ``max_bytes``.
+
+    Attributes
+    ----------
+    root : str
+        Directory holding the cached ``.arrow`` files.
+    max_bytes : int
+        Upper bound for the total size of the cache directory.
+
+    Methods
+    -------
+    make_key(market, dates, tickers, phases, fingerprints):
+        Returns a hex digest identifying a fetch request and its source files.
+    get(key):
+        Returns the cached DataFrame or None.
+    put(key, df):
+        Stores the DataFrame and evicts old entries if over budget.
+    """
+
+    SUFFIX = ".arrow"
+
+    def __init__(self, path: str = "orderbook_cache/", max_bytes: int = 8 * 1024**3):
+        """
+        Parameters
+        ----------
+        path : str
+            Directory for cache files. Created if missing.
+        max_bytes : int
+            Upper bound for the total size of cached files, defaults to 8 GiB.
+        """
+        self.root = path
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def make_key(
+        market: str,
+        dates: List[str],
+        tickers: Optional[Tuple[str, ...]],
+        phases: Optional[Tuple[str, ...]],
+        fingerprints: List[Tuple[str, int, int]],
+    ) -> str:
+        """
+        Builds a cache key from the fetch arguments and the (name, size, mtime) of every source file,
+        so that a re-delivered or newly arrived file invalidates the entry.
+        """
+        payload = json.dumps({
+            "market": market,
+            "dates": list(dates),
+            "tickers": sorted(tickers) if tickers is not None else None,
+            "phases": sorted(phases) if phases is not None else None,
+            "files": [list(f) for f in fingerprints],
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key + self.SUFFIX)
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        fname = self._entry_path(key)
+        try:
+            source = pa.memory_map(fname, 'r')
+        except FileNotFoundError:
+            return None
+        # buffers of the table keep the mapped region alive, so the file handle can be closed right away
+        with source:
+            try:
+                table = pa.ipc.open_file(source).read_all()
+            except pa.ArrowInvalid as e:
+                logger.warning(f"Corrupt cache entry {fname}, removing. Error: {e}")
+                table = None
+        if table is None:
+            os.remove(fname)
+            return None
+        # touch for LRU bookkeeping
+        os.utime(fname, None)
+        df = table.to_pandas(split_blocks=True)
+        # arrow nulls come back as None in text columns, fetched frames carry NaN for missing values
+        for c in df.columns[df.dtypes == object]:
+            df[c] = df[c].where(df[c].notna(), np.nan)
+        return df
+
+    def put(self, key: str, df: pd.DataFrame):
+        fname = self._entry_path(key)
+        tmp_fname = f"{fname}.{uuid.uuid4().hex}.tmp"
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        try:
+            with pa.OSFile(tmp_fname, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_fname, fname)
+        except Exception:
+            if os.path.exists(tmp_fname):
+                os.remove(tmp_fname)
+            raise
+        self._evict()
+
+    def clear(self):
+        for f in os.listdir(self.root):
+            if f.endswith(self.SUFFIX):
+                os.remove(os.path.join(self.root, f))
+
+    def _evict(self):
+        entries = []
+        for f in os.listdir(self.root):
+            if not f.endswith(self.SUFFIX):
+                continue
+            try:
+                st = os.stat(os.path.join(self.root, f))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+        total = sum(e[1] for e in entries)
+        for _, size, f in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, f))
+                total -= size
+                logger.info(f"Evicted cache entry {f} ({size} bytes)")
+            except FileNotFoundError:
+                continue
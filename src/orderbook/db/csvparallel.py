@@ -0,0 +1,111 @@
+import gzip
+import io
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# smaller files are parsed in the calling thread, pool overhead outweighs the split
+MIN_PARALLEL_BYTES = 16 * 2**20
+
+
+def _import_pandas():
+    # paid once per worker when it starts, not on its first range
+    import pandas  # noqa: F401
+
+
+def make_parse_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool for csv range parsing. Workers are started from a fork server (spawn
+    where unavailable) so the pool can be used from reader threads. Workers import pandas
+    in their initializer; the fork server's preload list is process wide, so it is left
+    alone.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+    else:
+        ctx = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_import_pandas)
+
+
+def split_line_ranges(data: bytes, n_parts: int, start: int = 0) -> List[tuple[int, int]]:
+    """
+    Splits data[start:] into about n_parts (begin, end) byte ranges that end on a newline.
+    Fields with embedded newlines are not supported.
+    """
+    size = len(data) - start
+    step = max(1, size // n_parts)
+    ranges = []
+    begin = start
+    while begin < len(data):
+        end = data.find(b'\n', min(begin + step, len(data) - 1))
+        end = len(data) if end < 0 else end + 1
+        ranges.append((begin, end))
+        begin = end
+    return ranges
+
+
+def _parse_range(header: bytes, chunk: bytes, read_kwargs: dict, tickers: Optional[tuple[str]]) -> pd.DataFrame:
+    df = pd.read_csv(io.BytesIO(header + chunk), engine="c", **read_kwargs)
+    if tickers:
+        df = df.loc[df.orderbookcode.isin(tickers)]
+    return df
+
+
+def read_csv_gz_parallel(
+    path: str,
+    pool: Executor,
+    n_parts: int,
+    usecols: List[str],
+    dtype: Dict[str, type],
+    index_col: Optional[int] = None,
+    tickers: Optional[tuple[str]] = None,
+    min_parallel_bytes: int = MIN_PARALLEL_BYTES,
+) -> pd.DataFrame:
+    """
+    Reads a gzipped csv by decompressing it once and parsing newline aligned byte ranges in a pool.
+
+    A gzip stream only inflates front to back, so the parent inflates the whole file; that is
+    under a tenth of a serial parse. Ranges go out as bytes, which pickle at memory speed. The
+    parsed frames come back pickled and unpickling their object columns in the parent costs a
+    quarter to a third of a serial parse, so the speedup stays below about 3x however many
+    workers there are. With ``tickers`` the workers send back only matching rows and most of
+    that cost goes away. See benchmarks/bench_csv_parallel.py.
+
+    Parameters
+    ----------
+    path : str
+        Path to the csv.gz file.
+    pool : Executor
+        Pool the ranges are parsed in, see make_parse_pool.
+    n_parts : int
+        Number of ranges to split the file into, usually the pool size.
+    usecols, dtype, index_col
+        Passed to pd.read_csv for every range.
+    tickers : tuple[str], optional
+        Orderbook codes kept by the workers, so only matching rows are sent back.
+    min_parallel_bytes : int
+        Files smaller than this when decompressed are parsed in the calling thread.
+
+    Returns
+    -------
+    pd.DataFrame
+        Rows of all ranges in file order, equal to a single pd.read_csv of the file.
+    """
+    with gzip.open(path, 'rb') as f:
+        data = f.read()
+    read_kwargs = dict(usecols=usecols, dtype=dtype, index_col=index_col)
+    header_end = data.find(b'\n') + 1
+    if header_end == 0 or len(data) < min_parallel_bytes or n_parts < 2:
+        return _parse_range(b'', data, read_kwargs, tickers)
+
+    header = data[:header_end]
+    ranges = split_line_ranges(data, n_parts, start=header_end)
+    futures = [pool.submit(_parse_range, header, data[b:e], read_kwargs, tickers) for b, e in ranges]
+    del data
+    parts = [f.result() for f in futures]
+    logger.debug(f"Parsed {path} in {len(parts)} ranges")
+    return pd.concat(parts, axis=0)
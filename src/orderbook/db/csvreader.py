@@ -1,7 +1,5 @@
 import logging
-from orderbook.utils import setup_logs
-setup_logs()
-from typing import List, Optional, Union
+from typing import List, Optional, Union, TYPE_CHECKING
 from collections import defaultdict
 import functools
 import concurrent.futures
@@ -10,6 +8,10 @@ from datetime import datetime
 import os
 from orderbook.MarketTypes import MARKET, PHASE
 from orderbook.db.base import OrderbookDB, orderbook_cols
+from orderbook.db.csvparallel import MIN_PARALLEL_BYTES, make_parse_pool, read_csv_gz_parallel
+
+if TYPE_CHECKING:
+    from orderbook.db.cache import OrderbookResultCache
 
 logger = logging.getLogger(__name__)
 
@@ -21,22 +23,51 @@ class OrderbookCSVA(OrderbookDB):
     ----------
     root : str
         Path to the directory containing CSV files.
+    cache : OrderbookResultCache, optional
+        Opt-in result cache for repeated fetches of the same arguments.
+    parse_workers : int
+        Processes parsing a day's orders file when fewer days than workers are fetched, 1 for none.
+    min_parallel_bytes : int
+        Decompressed size below which a day's orders file is parsed without the pool.
 
     Methods
     -------
     fetch_filtered_orderbook_data(market, start, end, tickers=None, phases=None): 
         Validates function arguments and returns filtered orderbook events.
+    close():
+        Shuts down the parse process pool.
     """
     
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, cache: Optional["OrderbookResultCache"] = None, parse_workers: int = 1):
         """
         Parameters
         ----------
         path : str
             Path to the directory containing CSV files.
+        cache : OrderbookResultCache, optional
+            Result cache keyed by fetch arguments and source file fingerprints. Defaults to None, no caching.
+        parse_workers : int
+            Size of the process pool used for intra-day parsing, e.g. os.cpu_count(). Defaults to 1,
+            no pool. Leave at 1 when the reader already runs inside a process pool or a worker.
+            Call close() to shut the pool down.
         """
         self.root = path
+        self.cache = cache
+        self.parse_workers = max(1, parse_workers)
+        self.min_parallel_bytes = MIN_PARALLEL_BYTES
+        self._parse_pool = None
+
+    def close(self):
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown()
+            self._parse_pool = None
+
+    def _get_parse_pool(self):
+        # started once and reused across fetches, worker startup is paid only on the first day
+        if self._parse_pool is None:
+            self._parse_pool = make_parse_pool(self.parse_workers)
+        return self._parse_pool
 
     def fetch_filtered_orderbook_data(
         self,
@@ -82,9 +113,19 @@ class OrderbookCSVA(OrderbookDB):
         if start < datetime(year=2021, month=1, day=4):
             start = datetime(year=2021, month=1, day=4)         
 
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(market, start, end, _tickers, _phases)
+            cached_df = self.cache.get(cache_key)
+            if cached_df is not None:
+                logger.info(f"Cache hit for {market} from {start} to {end}")
+                return cached_df
+
         fetched_df = self._fetch_filtered_orderbook_data_threads(market, start, end, _tickers, _phases)
         fetched_df['transactionprice'] = fetched_df['transactionprice'].replace('NOAP', '0')
         fetched_df['transactionprice'] = fetched_df['transactionprice'].fillna('0')
+        if cache_key is not None:
+            self.cache.put(cache_key, fetched_df)
         return fetched_df
     
     def get_max_date(self, market: MARKET) -> Optional[datetime]:
@@ -103,6 +144,36 @@ class OrderbookCSVA(OrderbookDB):
             raise None
         return min(dates)    
         
+    def _day_filenames(self, market: MARKET, current_time: datetime) -> tuple[str, str, str]:
+        """Returns orders, phases and prices file names for a single day."""
+        day = current_time.strftime('%Y%m%d')
+        return (
+            f"ORK_Orders_{market}_INET_FSALT_{day}.csv.gz",
+            f"ORK_Trading_Phases_{market}_INET_FSALT_{day}.csv.gz",
+            f"ORK_Equilibrium_Prices_{market}_INET_FSALT_{day}.csv.gz",
+        )
+
+    def _cache_key(
+        self,
+        market: MARKET,
+        start: datetime,
+        end: datetime,
+        tickers: Optional[tuple[str]] = None,
+        phases: Optional[tuple[PHASE]] = None
+    ) -> str:
+        """Cache key over fetch arguments and (name, size, mtime) of every source file in range."""
+        date_idx = pd.date_range(start=start, end=end, freq="B")
+        dates = [d.strftime('%Y%m%d') for d in date_idx]
+        fingerprints = []
+        for d in date_idx.to_pydatetime():
+            for fname in self._day_filenames(market, d):
+                try:
+                    st = os.stat(self.root + fname)
+                except FileNotFoundError:
+                    continue
+                fingerprints.append((fname, st.st_size, st.st_mtime_ns))
+        return self.cache.make_key(market, dates, tickers, phases, fingerprints)
+
     def _fetch_filtered_orderbook_data_threads(
         self, 
         market: MARKET,
@@ -113,6 +184,8 @@ class OrderbookCSVA(OrderbookDB):
     ) -> pd.DataFrame:
         """Multithreaded no GIL IO"""
         date_idx = pd.date_range(start=start, end=end, freq="B")
+        if self.parse_workers > 1 and date_idx.shape[0] < self.parse_workers:
+            return self._fetch_filtered_orderbook_data_intraday(market, start, end, date_idx, tickers, phases)
         n_threads = min(6, date_idx.shape[0] // 30 + 1)
         chunksize = max(1, date_idx.shape[0] // n_threads)
         with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
@@ -122,24 +195,58 @@ class OrderbookCSVA(OrderbookDB):
                 raise FileNotFoundError(f"No data found for {market} from {start} to {end} for tickers {tickers} and phases {phases}")
             return pd.concat(all_orders, axis=0, ignore_index=True)
     
+    def _fetch_filtered_orderbook_data_intraday(
+        self,
+        market: MARKET,
+        start: datetime,
+        end: datetime,
+        date_idx: pd.DatetimeIndex,
+        tickers: Optional[tuple[str]] = None,
+        phases: Optional[tuple[PHASE]] = None
+    ) -> pd.DataFrame:
+        """Few days, one after another, each parsed across the process pool"""
+        all_orders = []
+        for current_time in date_idx.to_pydatetime():
+            df = self._get_file_date(current_time, market=market, tickers=tickers, phases=phases, parallel=True)
+            if df is not None:
+                all_orders.append(df)
+        if len(all_orders) < 1:
+            raise FileNotFoundError(f"No data found for {market} from {start} to {end} for tickers {tickers} and phases {phases}")
+        return pd.concat(all_orders, axis=0, ignore_index=True)
+
+    def _read_orders_parallel(self, orders_filename: str, tickers: Optional[tuple[str]] = None) -> pd.DataFrame:
+        dtype_map = {c: str for c in orderbook_cols}
+        dtype_map["seqnum"] = int
+        return read_csv_gz_parallel(
+            self.root+orders_filename, self._get_parse_pool(), self.parse_workers,
+            usecols=orderbook_cols, dtype=dtype_map, index_col=0, tickers=tickers,
+            min_parallel_bytes=self.min_parallel_bytes,
+        )
+
     def _get_file_date(
         self,
         current_time: datetime, 
         market: str,
         tickers: Optional[tuple[str]] = None,
-        phases: Optional[tuple[PHASE]] = None
+        phases: Optional[tuple[PHASE]] = None,
+        parallel: bool = False
     ) -> pd.DataFrame | None:
-        ORDERS_FNAME = f"ORK_Orders_{market}_INET_FSALT_"
-        PHASES_NAME = f"ORK_Trading_Phases_{market}_INET_FSALT_"
-        PRICES_NAME = f"ORK_Equilibrium_Prices_{market}_INET_FSALT_"
-        orders_filename = ORDERS_FNAME + current_time.strftime('%Y%m%d') + ".csv.gz"
-        phases_filename = PHASES_NAME + current_time.strftime('%Y%m%d') + ".csv.gz"
-        prc_filename = PRICES_NAME + current_time.strftime('%Y%m%d') + ".csv.gz"
+        orders_filename, phases_filename, prc_filename = self._day_filenames(market, current_time)
         dtype_map = defaultdict(lambda: str)
         dtype_map["seqnum"] = int
+        read_phases = functools.partial(pd.read_csv, self.root+phases_filename, usecols=['seqnum', 'orderbookcode', 'tradingphases'], index_col=0, engine="c", compression="gzip", dtype=dtype_map)
+        read_prices = functools.partial(pd.read_csv, self.root+prc_filename, usecols=['seqnum', 'orderbookcode', 'indicativeauctionprice', 'indicativeauctionvolume'], index_col=0, engine="c", compression="gzip", dtype=dtype_map)
         try:
-            # get orders
-            fetched_orders = pd.read_csv(self.root+orders_filename, usecols=orderbook_cols, index_col=0, engine="c", compression="gzip", dtype=dtype_map)
+            if parallel:
+                # phases and prices are read in threads while the orders ranges are parsed in the pool
+                with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                    phases_future = executor.submit(read_phases)
+                    prices_future = executor.submit(read_prices)
+                    fetched_orders = self._read_orders_parallel(orders_filename, tickers)
+                    fetched_phases = phases_future.result()
+                    fetched_prices = prices_future.result()
+            else:
+                fetched_orders = pd.read_csv(self.root+orders_filename, usecols=orderbook_cols, index_col=0, engine="c", compression="gzip", dtype=dtype_map)
             if tickers:
                 fetched_orders = fetched_orders.loc[fetched_orders.orderbookcode.isin(tickers)]
             if fetched_orders.shape[0] < 1:
@@ -147,7 +254,8 @@ class OrderbookCSVA(OrderbookDB):
                 return None
             fetched_orders = fetched_orders.sort_values('seqnum')
             # get phases
-            fetched_phases = pd.read_csv(self.root+phases_filename, usecols=['seqnum', 'orderbookcode', 'tradingphases'], index_col=0, engine="c", compression="gzip", dtype=dtype_map)
+            if not parallel:
+                fetched_phases = read_phases()
             if fetched_phases.shape[0] < 1:
                 # TODO: At the moment if no phase data available, skips the day
                 logger.warning(f"No phase data available for {phases_filename}, skipping this day.")
@@ -160,7 +268,8 @@ class OrderbookCSVA(OrderbookDB):
                 logger.warning(f"No order data available after phase filter for {orders_filename}, skipping this day.")
                 return None
             # get prices
-            fetched_prices = pd.read_csv(self.root+prc_filename, usecols=['seqnum', 'orderbookcode', 'indicativeauctionprice', 'indicativeauctionvolume'], index_col=0, engine="c", compression="gzip", dtype=dtype_map)
+            if not parallel:
+                fetched_prices = read_prices()
             if fetched_prices.shape[0] > 0:
                 fetched_orders = pd.merge_asof(fetched_orders, fetched_prices, on='seqnum', by='orderbookcode')
             
@@ -0,0 +1,264 @@
+import logging
+from typing import List, Optional, Union, TYPE_CHECKING
+from datetime import datetime
+import os
+import duckdb
+import numpy as np
+import pandas as pd
+from orderbook.MarketTypes import MARKET, PHASE
+from orderbook.db.base import OrderbookDB, orderbook_cols
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# first column is consumed as the index by the csv reader, so it's not part of the frame contract
+ORDERS_COLS = orderbook_cols[1:]
+PHASES_COLS = ['seqnum', 'orderbookcode', 'tradingphases']
+PRICES_COLS = ['seqnum', 'orderbookcode', 'indicativeauctionprice', 'indicativeauctionvolume']
+# values pandas.read_csv reads as missing by default, so both readers agree on NaN
+PANDAS_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+
+def _sql_str(val: str) -> str:
+    return "'" + str(val).replace("'", "''") + "'"
+
+
+def _sql_list(vals) -> str:
+    return "[" + ", ".join(_sql_str(v) for v in vals) + "]"
+
+
+class OrderbookDuckDB(OrderbookDB):
+    """Queries ORK_* csv.gz files with DuckDB. Implements OrderbookDB interface.
+
+    Filtering and the as-of joins with trading phases and equilibrium prices are pushed down
+    into DuckDB, which runs them multi-threaded over all days at once. Where a ``.parquet`` file
+    with the same stem sits next to a ``.csv.gz`` file it is read instead.
+
+    Attributes
+    ----------
+    root : str
+        Path to the directory containing CSV files.
+    threads : int
+        Number of DuckDB worker threads.
+
+    Methods
+    -------
+    fetch_filtered_orderbook_data(market, start, end, tickers=None, phases=None):
+        Returns filtered orderbook events in the same shape as OrderbookCSVA.
+    """
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        """
+        Parameters
+        ----------
+        path : str
+            Path to the directory containing CSV files.
+        threads : int, optional
+            Number of DuckDB worker threads. Defaults to None, all available cores.
+        """
+        self.root = path
+        self.threads = threads or os.cpu_count() or 1
+
+    def fetch_filtered_orderbook_data(
+        self,
+        market: MARKET,
+        start: datetime,
+        end: datetime,
+        tickers: Optional[Union[str, List[str]]] = None,
+        phases: Optional[Union[PHASE, List[PHASE]]] = None,
+    ) -> pd.DataFrame:
+        """
+        Returns filtered orderbook events joined with trading phases and indicative auction prices.
+
+        Parameters
+        ----------
+        market : MARKET
+            The market identifier, e.g., 'INET_MainMarket', 'INET_FirstNorth', etc.
+        start : datetime
+            The start datetime for filtering orderbook events.
+        end : datetime
+            The end datetime for filtering orderbook events.
+        tickers : str or List[str], optional
+            A single ticker or a list of tickers to filter the orderbook events. Defaults to None, which includes all tickers.
+        phases : PHASE or List[PHASE], optional
+            A single phase or a list of phases to filter the orderbook events. Defaults to None, which includes all phases.
+
+        Returns
+        -------
+        pd.DataFrame
+            Same columns and dtypes as OrderbookCSVA.fetch_filtered_orderbook_data.
+
+        Raises
+        ------
+        FileNotFoundError
+            If no data is found for the specified market, date range, tickers, and phases.
+        """
+        _tickers = [tickers] if isinstance(tickers, str) else tickers
+        _phases = [phases] if isinstance(phases, str) else phases
+
+        if end > datetime.now():
+            end = datetime.now()
+        if start < datetime(year=2021, month=1, day=4):
+            start = datetime(year=2021, month=1, day=4)
+
+        orders_files, phases_files, prices_files = self._day_files(market, start, end)
+        if not orders_files:
+            raise FileNotFoundError(f"No data found for {market} from {start} to {end} for tickers {tickers} and phases {phases}")
+
+        staging, join_query, payload_query = self._build_statements(orders_files, phases_files, prices_files, _tickers, _phases)
+        with duckdb.connect(config={'threads': self.threads, 'preserve_insertion_order': True}) as conn:
+            for statement in staging:
+                conn.execute(statement)
+            keys = conn.execute(join_query).to_arrow_table()
+            payload = conn.execute(payload_query).to_arrow_table()
+        # rid -> payload position, so no assumption is made on the order rows come back in
+        positions = np.empty(payload.num_rows, dtype=np.int64)
+        positions[payload['rid'].to_numpy()] = np.arange(payload.num_rows)
+        fetched = payload.drop_columns(['rid']).take(positions[keys['rid'].to_numpy()])
+        for c in ['tradingphases', 'indicativeauctionprice', 'indicativeauctionvolume']:
+            fetched = fetched.append_column(c, keys[c])
+        if fetched.num_rows < 1:
+            raise FileNotFoundError(f"No data found for {market} from {start} to {end} for tickers {tickers} and phases {phases}")
+        return self._to_frame_contract(fetched)
+
+    def get_max_date(self, market: MARKET) -> Optional[datetime]:
+        dates = self._file_dates(market)
+        if not dates:
+            return None
+        return max(dates)
+
+    def get_min_date(self, market: MARKET) -> Optional[datetime]:
+        dates = self._file_dates(market)
+        if not dates:
+            return None
+        return min(dates)
+
+    def _file_dates(self, market: MARKET) -> List[datetime]:
+        files = os.listdir(self.root)
+        dates = {f.split('_')[-1].split('.')[0] for f in files if f.startswith(f"ORK_Orders_{market}")}
+        return [datetime.strptime(date, '%Y%m%d') for date in dates]
+
+    def _resolve_file(self, fname: str) -> Optional[str]:
+        """Prefers a columnar cache with the same stem over the csv.gz file."""
+        stem = fname[:-len(".csv.gz")]
+        parquet_path = os.path.join(self.root, stem + ".parquet")
+        if os.path.exists(parquet_path):
+            return parquet_path
+        csv_path = os.path.join(self.root, fname)
+        if os.path.exists(csv_path):
+            return csv_path
+        return None
+
+    def _day_files(self, market: MARKET, start: datetime, end: datetime) -> tuple[List[str], List[str], List[str]]:
+        """
+        Resolves files per business day. Days missing a phases or prices file are skipped as in OrderbookCSVA.
+        """
+        orders_files, phases_files, prices_files = [], [], []
+        for current_time in pd.date_range(start=start, end=end, freq="B").to_pydatetime():
+            day = current_time.strftime('%Y%m%d')
+            orders_f = self._resolve_file(f"ORK_Orders_{market}_INET_FSALT_{day}.csv.gz")
+            phases_f = self._resolve_file(f"ORK_Trading_Phases_{market}_INET_FSALT_{day}.csv.gz")
+            prices_f = self._resolve_file(f"ORK_Equilibrium_Prices_{market}_INET_FSALT_{day}.csv.gz")
+            if orders_f is None or phases_f is None or prices_f is None:
+                continue
+            orders_files.append(orders_f)
+            phases_files.append(phases_f)
+            prices_files.append(prices_f)
+        return orders_files, phases_files, prices_files
+
+    @staticmethod
+    def _scan_sql(files: List[str], columns: List[str]) -> str:
+        """
+        Builds a scan over csv.gz and parquet files with a ``day`` column taken from the file name,
+        all values as text and seqnum as integer.
+        """
+        select = ", ".join(
+            "CAST(seqnum AS BIGINT) AS seqnum" if c == 'seqnum' else f"CAST({c} AS VARCHAR) AS {c}"
+            for c in columns
+        )
+        day = r"regexp_extract(filename, '_(\d{8})\.', 1) AS day"
+        scans = []
+        csv_files = [f for f in files if f.endswith(".csv.gz")]
+        parquet_files = [f for f in files if f.endswith(".parquet")]
+        if csv_files:
+            scans.append(
+                f"SELECT {day}, {select} FROM read_csv({_sql_list(csv_files)}, header=true, all_varchar=true, "
+                f"nullstr={_sql_list(PANDAS_NA_VALUES)}, compression='gzip', filename=true)"
+            )
+        if parquet_files:
+            scans.append(
+                f"SELECT {day}, {select} FROM read_parquet({_sql_list(parquet_files)}, union_by_name=true, filename=true)"
+            )
+        if not scans:
+            # keeps the join well formed when a file kind is missing for the whole range
+            empty = ", ".join(
+                "CAST(NULL AS BIGINT) AS seqnum" if c == 'seqnum' else f"CAST(NULL AS VARCHAR) AS {c}"
+                for c in columns
+            )
+            return f"SELECT CAST(NULL AS VARCHAR) AS day, {empty} WHERE false"
+        return " UNION ALL BY NAME ".join(scans)
+
+    def _build_statements(
+        self,
+        orders_files: List[str],
+        phases_files: List[str],
+        prices_files: List[str],
+        tickers: Optional[List[str]],
+        phases: Optional[List[PHASE]],
+    ) -> tuple[List[str], str, str]:
+        """
+        Returns staging statements, the join query and the orders payload query.
+
+        The as-of joins run on narrow (rid, day, orderbookcode, seqnum) keys only and return
+        row ids in output order; carrying the ~50 text columns through the joins and the sort
+        costs several times more than gathering them afterwards by row id. rid is numbered
+        explicitly when staging, the payload returns it alongside the columns.
+        """
+        orders_where = f"WHERE orderbookcode IN (SELECT unnest({_sql_list(tickers)}))" if tickers else ""
+        phases_where = f"AND p.tradingphases IN (SELECT unnest({_sql_list(phases)}))" if phases else ""
+        staging = [
+            f"CREATE TEMP TABLE orders AS SELECT row_number() OVER () - 1 AS rid, * "
+            f"FROM ({self._scan_sql(orders_files, ORDERS_COLS)}) {orders_where}",
+            f"CREATE TEMP TABLE phases AS {self._scan_sql(phases_files, PHASES_COLS)}",
+            f"CREATE TEMP TABLE prices AS {self._scan_sql(prices_files, PRICES_COLS)}",
+        ]
+        join_query = f"""
+            WITH keys AS (
+                SELECT o.rid, o.day, o.orderbookcode, o.seqnum, p.tradingphases
+                FROM (SELECT rid, day, orderbookcode, seqnum FROM orders) o
+                ASOF LEFT JOIN phases p
+                    ON o.day = p.day AND o.orderbookcode = p.orderbookcode AND o.seqnum >= p.seqnum
+                WHERE o.day IN (SELECT DISTINCT day FROM phases) {phases_where}
+            )
+            SELECT k.rid, k.tradingphases, pr.indicativeauctionprice, pr.indicativeauctionvolume
+            FROM keys k
+            ASOF LEFT JOIN prices pr
+                ON k.day = pr.day AND k.orderbookcode = pr.orderbookcode AND k.seqnum >= pr.seqnum
+            ORDER BY k.day, k.seqnum
+        """
+        payload_select = ", ".join(
+            "CASE WHEN transactionprice IS NULL OR transactionprice = 'NOAP' THEN '0' "
+            "ELSE transactionprice END AS transactionprice" if c == 'transactionprice' else c
+            for c in ORDERS_COLS
+        )
+        payload_query = f"SELECT rid, {payload_select} FROM orders"
+        return staging, join_query, payload_query
+
+    @staticmethod
+    def _to_frame_contract(table: "pa.Table") -> pd.DataFrame:
+        """Text columns as str with NaN for missing values, matching the csv reader output."""
+        df = table.to_pandas()
+        df['seqnum'] = df['seqnum'].astype(np.int64)
+        for c in df.columns:
+            column = table.column(c)
+            if c == 'seqnum' or column.null_count == 0:
+                continue
+            # the scan casts every other column to VARCHAR, so only nulls need mapping: arrow
+            # gives None for them, which the xml converter's astype(str) would turn into 'None'
+            values = df[c].to_numpy(dtype=object, copy=True)
+            values[column.is_null().to_numpy(zero_copy_only=False)] = np.nan
+            df[c] = values
+        return df
@@ -0,0 +1,267 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Union
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from orderbook.MarketTypes import MARKET
+from orderbook.db.base import OrderbookDB
+from orderbook.etl.book import OrderBookState
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ('orderbookcode', pa.string()),
+    ('snap_seqnum', pa.int64()),
+    ('snap_time', pa.timestamp('us')),
+    ('orderidcode', pa.string()),
+    ('buysellind', pa.string()),
+    ('limitprice', pa.float64()),
+    ('remainingqtyinclhidden', pa.float64()),
+    ('validityperiod', pa.string()),
+    ('validityperiodandtime', pa.string()),
+])
+
+# the event fields OrderBookState.apply reads, kept per day so book_at doesn't refetch the day
+EVENTS_SCHEMA = pa.schema([
+    ('orderbookcode', pa.string()),
+    ('seqnum', pa.int64()),
+    ('event_time', pa.timestamp('us')),
+    ('orderidcode', pa.string()),
+    ('orderevent', pa.string()),
+    ('buysellind', pa.string()),
+    ('limitprice', pa.string()),
+    ('remainingqtyinclhidden', pa.string()),
+    ('validityperiod', pa.string()),
+    ('validityperiodandtime', pa.string()),
+])
+# small row groups so a single orderbook's rows can be read without the rest of the day
+EVENTS_ROW_GROUP_SIZE = 65536
+
+# validity periods that never survive the trading day: day, immediate or cancel, fill or kill,
+# good after time and good till time. Good after/till date (and time) orders carry over.
+DAY_ONLY_VALIDITY = {'DAVY', 'IOCV', 'FOKV', 'GATV', 'GTTV'}
+
+
+def _parse_ts(values: pd.Series) -> pd.Series:
+    """Event timestamps as naive UTC."""
+    return pd.to_datetime(values, utc=True, format='ISO8601').dt.tz_localize(None)
+
+
+class BookSnapshotStore:
+    """Periodic per-orderbookcode book snapshots for point-in-time queries.
+
+    For every processed day the store keeps ``<market>/<YYYYMMDD>.snapshots.parquet`` with
+    book states taken every ``every_events`` events or ``every_seconds`` seconds per orderbook,
+    ``<market>/<YYYYMMDD>.events.parquet`` with the day's events sorted by orderbookcode and
+    seqnum, and ``<market>/<YYYYMMDD>.carry.parquet`` with the orders (GTC, GTD, ...) still
+    valid at the end of the day. A day is built on top of the previous day's carry-over state.
+
+    Attributes
+    ----------
+    root : str
+        Directory holding the snapshot files.
+    source_db : OrderbookDB
+        Source of orderbook events.
+    every_events : int, optional
+        Take a snapshot after this many events of an orderbook.
+    every_seconds : float, optional
+        Take a snapshot when this much event time has passed since the last one.
+
+    Methods
+    -------
+    build_day(market, date, tickers=None):
+        Replays a day and writes its snapshots and carry-over state.
+    book_at(market, orderbookcode, ts):
+        Returns the book of an orderbook as of a point in time.
+    """
+
+    def __init__(
+        self,
+        source_db: OrderbookDB,
+        path: str = 'book_snapshots/',
+        every_events: Optional[int] = 5000,
+        every_seconds: Optional[float] = None,
+    ):
+        assert every_events or every_seconds, "Either every_events or every_seconds must be set"
+        self.source_db = source_db
+        self.root = path
+        self.every_events = every_events
+        self.every_seconds = every_seconds
+
+    def _day_path(self, market: MARKET, date: datetime, kind: str) -> str:
+        return os.path.join(self.root, market, f"{date.strftime('%Y%m%d')}.{kind}.parquet")
+
+    def _previous_carry_path(self, market: MARKET, date: datetime) -> Optional[str]:
+        """Latest carry-over file strictly before the date."""
+        market_dir = os.path.join(self.root, market)
+        if not os.path.isdir(market_dir):
+            return None
+        day = date.strftime('%Y%m%d')
+        carries = sorted(f for f in os.listdir(market_dir) if f.endswith('.carry.parquet') and f[:8] < day)
+        if not carries:
+            return None
+        return os.path.join(market_dir, carries[-1])
+
+    @staticmethod
+    def _books_from_table(df: pd.DataFrame) -> Dict[str, OrderBookState]:
+        books = {}
+        for code, rows in df.groupby('orderbookcode', sort=False):
+            rows = rows.loc[rows['orderidcode'].notna()]
+            books[code] = OrderBookState.from_records(rows.to_dict(orient='records'))
+        return books
+
+    def load_carry_over(self, market: MARKET, date: datetime) -> Dict[str, OrderBookState]:
+        """
+        Returns books carried into the date from the latest earlier processed day,
+        dropping orders whose validity date time has passed by the start of the date. Orders
+        expiring during the date are dropped at their expiry time by build_day and book_at.
+        Warns when business days
+        between that day and the date were not built, their events are missing from the books.
+        """
+        carry_path = self._previous_carry_path(market, date)
+        if carry_path is None:
+            return {}
+        carry_day = datetime.strptime(os.path.basename(carry_path)[:8], '%Y%m%d')
+        skipped = pd.bdate_range(carry_day + timedelta(days=1), date - timedelta(days=1))
+        if len(skipped) > 0:
+            logger.warning(
+                f"Carry-over for {market} on {date:%Y-%m-%d} comes from {carry_day:%Y-%m-%d}, "
+                f"{len(skipped)} business days in between were not built: {', '.join(f'{d:%Y-%m-%d}' for d in skipped)}"
+            )
+        carry = pq.read_table(carry_path, schema=SNAPSHOT_SCHEMA).to_pandas()
+        if carry.empty:
+            return {}
+        books = self._books_from_table(carry)
+        day_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        for book in books.values():
+            book.expire(day_start)
+        return books
+
+    @staticmethod
+    def _book_rows(code: str, book: OrderBookState, seqnum: int, snap_time: datetime) -> List[dict]:
+        records = book.to_records()
+        if not records:
+            # empty books still mark the snapshot point
+            records = [{'orderidcode': None}]
+        for r in records:
+            r.update(orderbookcode=code, snap_seqnum=seqnum, snap_time=snap_time)
+        return records
+
+    def build_day(self, market: MARKET, date: datetime, tickers: Optional[Union[str, List[str]]] = None):
+        """Replays a day on top of the previous carry-over and writes snapshots and the new carry-over."""
+        books = self.load_carry_over(market, date)
+        try:
+            events = self.source_db.fetch_filtered_orderbook_data(market=market, start=date, end=date, tickers=tickers)
+        except FileNotFoundError:
+            logger.warning(f"No data found for {market} on {date}, carrying over the previous state")
+            events = pd.DataFrame(columns=['orderbookcode', 'seqnum', 'dateandtime'])
+        events = events.sort_values('seqnum', kind='stable')
+        event_times = _parse_ts(events['dateandtime']) if not events.empty else pd.Series(dtype='datetime64[us]')
+
+        snapshot_rows = []
+        for code, idx in events.groupby('orderbookcode', sort=False).groups.items():
+            book = books.setdefault(code, OrderBookState())
+            since_snap = 0
+            last_snap_time = None
+            code_events = events.loc[idx].to_dict(orient='records')
+            for event, event_time in zip(code_events, event_times.loc[idx]):
+                book.apply(event)
+                since_snap += 1
+                last_snap_time = last_snap_time or event_time
+                due_events = self.every_events is not None and since_snap >= self.every_events
+                due_time = self.every_seconds is not None and (event_time - last_snap_time).total_seconds() >= self.every_seconds
+                if due_events or due_time:
+                    book.expire(event_time)
+                    snapshot_rows += self._book_rows(code, book, int(event['seqnum']), event_time)
+                    since_snap = 0
+                    last_snap_time = event_time
+
+        day_end = date.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        carry_rows = []
+        for code, book in books.items():
+            book.expire(day_end)
+            carried = OrderBookState.from_records(
+                [r for r in book.to_records() if r['validityperiod'] not in DAY_ONLY_VALIDITY]
+            )
+            carry_rows += self._book_rows(code, carried, book.last_seqnum, day_end)
+
+        os.makedirs(os.path.join(self.root, market), exist_ok=True)
+        self._write(snapshot_rows, self._day_path(market, date, 'snapshots'))
+        self._write_events(events, event_times, self._day_path(market, date, 'events'))
+        self._write(carry_rows, self._day_path(market, date, 'carry'))
+        logger.info(f"Built {len(snapshot_rows)} snapshot rows and {len(carry_rows)} carry-over rows for {market} on {date}")
+
+    @staticmethod
+    def _write(rows: List[dict], path: str):
+        df = pd.DataFrame(rows, columns=SNAPSHOT_SCHEMA.names)
+        for c in ['validityperiod', 'validityperiodandtime']:
+            df[c] = df[c].where(df[c].notna() & (df[c] != ''), None).astype(object)
+        table = pa.Table.from_pandas(df, schema=SNAPSHOT_SCHEMA, preserve_index=False)
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _write_events(events: pd.DataFrame, event_times: pd.Series, path: str):
+        df = events.reindex(columns=EVENTS_SCHEMA.names)
+        df['event_time'] = event_times.to_numpy()
+        df = df.sort_values(['orderbookcode', 'seqnum'], kind='stable')
+        for c in df.columns:
+            if c not in ('seqnum', 'event_time'):
+                df[c] = df[c].astype(object).where(df[c].notna(), None)
+        table = pa.Table.from_pandas(df, schema=EVENTS_SCHEMA, preserve_index=False)
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path, row_group_size=EVENTS_ROW_GROUP_SIZE)
+        os.replace(tmp_path, path)
+
+    def _events_after(self, market: MARKET, orderbookcode: str, day: datetime, seqnum: int, ts: datetime) -> Optional[pd.DataFrame]:
+        """Events of an orderbook after the seqnum and up to ts, from the day's events file, or from the source db if there is none."""
+        events_path = self._day_path(market, day, 'events')
+        if os.path.exists(events_path):
+            return ds.dataset(events_path, format='parquet').to_table(
+                filter=(ds.field('orderbookcode') == orderbookcode) & (ds.field('seqnum') > seqnum)
+                & (ds.field('event_time') <= pa.scalar(ts, pa.timestamp('us')))
+            ).to_pandas().sort_values('seqnum', kind='stable')
+        logger.warning(f"No events file for {market} on {day}, fetching the day from the source")
+        try:
+            events = self.source_db.fetch_filtered_orderbook_data(market=market, start=day, end=day, tickers=[orderbookcode])
+        except FileNotFoundError:
+            return None
+        events = events.loc[events['seqnum'] > seqnum]
+        return events.loc[np.asarray(_parse_ts(events['dateandtime']) <= ts)].sort_values('seqnum', kind='stable')
+
+    def book_at(self, market: MARKET, orderbookcode: str, ts: datetime) -> OrderBookState:
+        """
+        Returns the book of an orderbook as of ``ts`` (naive UTC). Loads the nearest earlier
+        snapshot of the day, or the previous day's carry-over, and replays only the later
+        events of the orderbook read from the day's events file. Orders whose validity date
+        time has passed by ``ts`` are dropped.
+        """
+        day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+        snap_path = self._day_path(market, day, 'snapshots')
+        book, snap_seqnum = None, -1
+        if os.path.exists(snap_path):
+            snaps = ds.dataset(snap_path, format='parquet').to_table(
+                filter=(ds.field('orderbookcode') == orderbookcode) & (ds.field('snap_time') <= pa.scalar(ts, pa.timestamp('us')))
+            ).to_pandas()
+            if not snaps.empty:
+                snap_seqnum = int(snaps['snap_seqnum'].max())
+                latest = snaps.loc[(snaps['snap_seqnum'] == snap_seqnum) & snaps['orderidcode'].notna()]
+                book = OrderBookState.from_records(latest.to_dict(orient='records'), snap_seqnum)
+        else:
+            logger.warning(f"No snapshots for {market} on {day}, replaying from the start of the day")
+        if book is None:
+            book = self.load_carry_over(market, day).get(orderbookcode, OrderBookState())
+            snap_seqnum = -1
+
+        events = self._events_after(market, orderbookcode, day, snap_seqnum, ts)
+        if events is None:
+            return book
+        for event in events.to_dict(orient='records'):
+            book.apply(event)
+        book.expire(ts)
+        return book
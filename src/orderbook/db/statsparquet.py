@@ -0,0 +1,273 @@
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Iterator, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from orderbook.db.base import OrderbookStatsDB
+
+logger = logging.getLogger(__name__)
+
+STATS_SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('market', pa.string()),
+    ('orderbookcode', pa.string()),
+    ('open', pa.float64()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close', pa.float64()),
+    ('volume', pa.int64()),
+    ('trade_count', pa.int64()),
+    ('top_spread', pa.float64()),
+    ('buy_5_depth', pa.float64()),
+    ('sell_5_depth', pa.float64()),
+    ('imbalance', pa.float64()),
+    # intraday rows of a live stream; files written before the column existed read as null, final
+    ('provisional', pa.bool_()),
+])
+# rows are unique on these, like the sqlite table's primary key
+KEY_COLS = ['date', 'market', 'orderbookcode']
+FINAL = ds.field('provisional').is_null() | (ds.field('provisional') == False)  # noqa: E712
+
+
+def _read_latest(files: List[str], columns: List[str], flt: Optional[ds.Expression] = None) -> pa.Table:
+    """
+    Reads part files and keeps the last row per key. Part files are named by write time and
+    listed oldest first, so the newest write of a key wins.
+    """
+    read_cols = columns + [c for c in KEY_COLS if c not in columns]
+    table = pa.concat_tables([
+        ds.dataset(f, schema=STATS_SCHEMA, format='parquet').to_table(columns=read_cols, filter=flt) for f in files
+    ])
+    if table.num_rows > 0:
+        duplicated = table.select(KEY_COLS).to_pandas().duplicated(keep='last').to_numpy()
+        table = table.filter(pa.array(~duplicated))
+    return table.select(columns)
+
+
+class OrderbookStatsParquet(OrderbookStatsDB):
+    """Orderbook statistics stored as Parquet files partitioned by market and month.
+
+    Layout is ``<root>/market=<market>/month=<YYYY-MM>/part-*.parquet``. Writes only add new
+    files, published with an atomic rename, so readers never block on a writer. Once a partition
+    collects more than ``compact_threshold`` files they are merged into one. Rows written again
+    for the same (date, market, orderbookcode) replace the earlier ones: reads and compaction
+    keep the newest. Batch writes also replace the provisional rows a live stream upserted for
+    the same dates. Assumes a single writer process, as with the ETL pipeline.
+
+    Attributes
+    ----------
+    root : str
+        Directory holding the partitioned dataset.
+    compact_threshold : int
+        Number of files in a partition that triggers compaction.
+    """
+
+    def __init__(self, root: str = 'orderbook_stats/', compact_threshold: int = 16):
+        self.root = root
+        self.compact_threshold = compact_threshold
+        os.makedirs(self.root, exist_ok=True)
+
+    def _partition_dir(self, market: str, month: str) -> str:
+        return os.path.join(self.root, f"market={market}", f"month={month}")
+
+    def _partitions(self, months: Optional[List[str]] = None, markets: Optional[List[str]] = None) -> List[str]:
+        """Returns partition directories, pruned by month and market from directory names only."""
+        dirs = []
+        for market_dir in sorted(os.listdir(self.root)):
+            if not market_dir.startswith("market="):
+                continue
+            if markets is not None and market_dir[len("market="):] not in markets:
+                continue
+            for month_dir in sorted(os.listdir(os.path.join(self.root, market_dir))):
+                if not month_dir.startswith("month="):
+                    continue
+                if months is not None and month_dir[len("month="):] not in months:
+                    continue
+                dirs.append(os.path.join(self.root, market_dir, month_dir))
+        return dirs
+
+    @staticmethod
+    def _part_files(partition_dir: str) -> List[str]:
+        return sorted(
+            os.path.join(partition_dir, f) for f in os.listdir(partition_dir)
+            if f.startswith("part-") and f.endswith(".parquet")
+        )
+
+    @staticmethod
+    def _months_between(start: datetime, end: datetime) -> List[str]:
+        return [m.strftime('%Y-%m') for m in pd.period_range(start=start, end=end, freq='M')]
+
+    def _scan(self, partition_dirs: List[str], columns: List[str], flt: Optional[ds.Expression] = None, latest: bool = False) -> pa.Table:
+        """Reads partitions, with latest only the newest row per key, see _read_latest."""
+        # a compaction may remove listed files mid-read, in which case the listing is retried
+        for attempt in range(3):
+            files = [f for d in partition_dirs for f in self._part_files(d)]
+            if not files:
+                return STATS_SCHEMA.empty_table().select(columns)
+            try:
+                if latest:
+                    return _read_latest(files, columns, flt)
+                dataset = ds.dataset(files, schema=STATS_SCHEMA, format='parquet')
+                return dataset.to_table(columns=columns, filter=flt)
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+
+    def get_max_date(self) -> Optional[datetime]:
+        partitions = self._partitions()
+        if not partitions:
+            return None
+        # month partitions sort lexically, so only the newest month of each market is scanned
+        latest = {}
+        for d in partitions:
+            market_dir = os.path.dirname(d)
+            latest[market_dir] = max(latest.get(market_dir, d), d)
+        dates = self._scan(list(latest.values()), ['date'], FINAL)['date']
+        if len(dates) == 0:
+            return None
+        max_date = pc.max(dates).as_py()
+        return datetime.combine(max_date, datetime.min.time())
+
+    def get_dates_between(self, start: datetime, end: datetime) -> List[datetime]:
+        partitions = self._partitions(months=self._months_between(start, end))
+        flt = (ds.field('date') >= start.date()) & (ds.field('date') <= end.date()) & FINAL
+        dates = pc.unique(self._scan(partitions, ['date'], flt)['date']).to_pylist()
+        return [datetime.combine(d, datetime.min.time()) for d in sorted(dates)]
+
+    def get_date_exists(self, date: datetime) -> bool:
+        partitions = self._partitions(months=[date.strftime('%Y-%m')])
+        dates = self._scan(partitions, ['date'], (ds.field('date') == date.date()) & FINAL)['date']
+        return len(dates) > 0
+
+    def read_stats(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Reads stats between dates, scanning only the matching month and market partitions
+        and only the requested columns.
+        """
+        return self._read_stats_table(start, end, columns, markets, tickers).to_pandas()
+
+    def read_stats_batches(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+        batch_rows: int = 65536,
+    ) -> Iterator[pa.RecordBatch]:
+        """
+        Same rows as read_stats as record batches, without a pandas conversion. Superseded
+        rows are only known once every file of a partition is read, so the scan completes first.
+        """
+        yield from self._read_stats_table(start, end, columns, markets, tickers).to_batches(max_chunksize=batch_rows)
+
+    def _read_stats_table(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> pa.Table:
+        columns = columns or STATS_SCHEMA.names
+        partitions = self._partitions(months=self._months_between(start, end), markets=markets)
+        flt = (ds.field('date') >= start.date()) & (ds.field('date') <= end.date())
+        if tickers is not None:
+            flt = flt & ds.field('orderbookcode').isin(tickers)
+        return self._scan(partitions, columns, flt, latest=True)
+
+    def write_stats_df(self, df: pd.DataFrame):
+        """
+        Appends a DataFrame of final orderbook stats as new files in the matching partitions.
+        Rows already stored for the same key are superseded, not duplicated. A partition holding
+        provisional rows of the written dates is rewritten without them instead.
+        """
+        if df.empty:
+            return
+        df = df.assign(provisional=False)
+        df['date'] = pd.to_datetime(df['date']).dt.date
+        months = pd.to_datetime(df['date']).dt.strftime('%Y-%m')
+        for (market, month), part in df.groupby([df['market'], months]):
+            partition_dir = self._partition_dir(market, month)
+            os.makedirs(partition_dir, exist_ok=True)
+            files = self._part_files(partition_dir)
+            provisional = (ds.field('provisional') == True) & ds.field('date').isin(list(set(part['date'])))  # noqa: E712
+            if files and _read_latest(files, ['date'], provisional).num_rows > 0:
+                self._replace_rows(partition_dir, files, part, drop_dates=set(part['date']))
+                continue
+            self._write_file(partition_dir, pa.Table.from_pandas(part, schema=STATS_SCHEMA, preserve_index=False))
+            if len(self._part_files(partition_dir)) > self.compact_threshold:
+                self.compact(partition_dir)
+
+    def upsert_stats_df(self, df: pd.DataFrame):
+        """
+        Replaces rows with the same (date, market, orderbookcode) by rewriting the affected
+        partitions as a single compacted file. Rows without a ``provisional`` column are final.
+        """
+        if df.empty:
+            return
+        df = df.copy()
+        if 'provisional' not in df.columns:
+            df['provisional'] = False
+        df['date'] = pd.to_datetime(df['date']).dt.date
+        months = pd.to_datetime(df['date']).dt.strftime('%Y-%m')
+        for (market, month), part in df.groupby([df['market'], months]):
+            partition_dir = self._partition_dir(market, month)
+            os.makedirs(partition_dir, exist_ok=True)
+            self._replace_rows(partition_dir, self._part_files(partition_dir), part)
+
+    def _replace_rows(self, partition_dir: str, files: List[str], part: pd.DataFrame, drop_dates: Optional[set] = None):
+        """
+        Rewrites a partition as one file holding ``part`` and the existing rows of other keys,
+        leaving out provisional rows of ``drop_dates``.
+        """
+        new_rows = pa.Table.from_pandas(part, schema=STATS_SCHEMA, preserve_index=False)
+        if files:
+            existing = _read_latest(files, STATS_SCHEMA.names).to_pandas()
+            keys = set(zip(part['date'], part['orderbookcode']))
+            keep = pd.Series([k not in keys for k in zip(existing['date'], existing['orderbookcode'])], index=existing.index)
+            if drop_dates:
+                keep &= ~(existing['date'].isin(drop_dates) & (existing['provisional'] == True))  # noqa: E712
+            existing = pa.Table.from_pandas(existing.loc[keep], schema=STATS_SCHEMA, preserve_index=False)
+            new_rows = pa.concat_tables([existing, new_rows])
+        self._write_file(partition_dir, new_rows.sort_by([('date', 'ascending'), ('orderbookcode', 'ascending')]))
+        for f in files:
+            os.remove(f)
+
+    def _write_file(self, partition_dir: str, table: pa.Table) -> str:
+        fname = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+        # dot-prefixed temp files are ignored by readers until renamed
+        tmp_path = os.path.join(partition_dir, "." + fname + ".tmp")
+        pq.write_table(table, tmp_path)
+        out_path = os.path.join(partition_dir, fname)
+        os.replace(tmp_path, out_path)
+        return out_path
+
+    def compact(self, partition_dir: str):
+        """
+        Merges all files of a partition into one, sorted by date and orderbookcode, keeping the
+        newest row per key. The merged file is published before the old ones are removed; it is
+        the newest file, so readers listing both keep its rows and never miss any.
+        """
+        files = self._part_files(partition_dir)
+        if len(files) < 2:
+            return
+        table = _read_latest(files, STATS_SCHEMA.names)
+        table = table.sort_by([('date', 'ascending'), ('orderbookcode', 'ascending')])
+        self._write_file(partition_dir, table)
+        for f in files:
+            os.remove(f)
+        logger.info(f"Compacted {len(files)} files in {partition_dir}")
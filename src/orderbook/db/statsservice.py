@@ -0,0 +1,434 @@
+import asyncio
+import io
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import pyarrow as pa
+import pyarrow.compute as pc
+from orderbook.db.base import OrderbookStatsDB
+from orderbook.db.statsparquet import STATS_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+# (start, end, columns, markets, tickers), list arguments sorted so equal queries share a key
+QueryKey = Tuple[str, str, Optional[tuple], Optional[tuple], Optional[tuple]]
+
+BATCH_ROWS = 65536
+
+
+def _ndjson(batch: pa.RecordBatch) -> bytes:
+    """Newline delimited JSON records of a batch, dates as YYYY-MM-DD and nulls as null."""
+    columns = [pc.cast(col, pa.string()) if pa.types.is_date(col.type) else col for col in batch.columns]
+    df = pa.RecordBatch.from_arrays(columns, names=batch.schema.names).to_pandas()
+    lines = df.to_json(orient='records', lines=True, double_precision=15)
+    return (lines if lines.endswith('\n') else lines + '\n').encode()
+
+
+class ReaderPool:
+    """Fixed set of read handles, each used by one query at a time on a worker thread."""
+
+    def __init__(self, stats_db: OrderbookStatsDB, size: int = 4):
+        self._readers = [stats_db.open_reader() for _ in range(size)]
+        self._free: asyncio.Queue = asyncio.Queue()
+        for r in self._readers:
+            self._free.put_nowait(r)
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='stats-reader')
+
+    async def read_batches(self, *args):
+        """Yields record batches of ``read_stats_batches``, each read on a worker thread."""
+        reader = await self._free.get()
+        loop = asyncio.get_running_loop()
+        batches = None
+        try:
+            batches = await loop.run_in_executor(self._executor, lambda: iter(reader.read_stats_batches(*args)))
+            while True:
+                batch = await loop.run_in_executor(self._executor, next, batches, None)
+                if batch is None:
+                    break
+                yield batch
+        finally:
+            if batches is not None and hasattr(batches, 'close'):
+                batches.close()
+            self._free.put_nowait(reader)
+
+    def close(self):
+        self._executor.shutdown()
+        for r in self._readers:
+            if hasattr(r, 'close'):
+                r.close()
+
+
+class StatsResultCache:
+    """In-memory LRU of query results as Arrow tables, bounded by bytes and entry age."""
+
+    def __init__(self, max_bytes: int = 512 * 2**20, ttl: Optional[float] = 60.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[QueryKey, Tuple[float, pa.Table]] = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: QueryKey) -> Optional[pa.Table]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created, table = entry
+        if self.ttl is not None and time.monotonic() - created > self.ttl:
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return table
+
+    def put(self, key: QueryKey, table: pa.Table):
+        if table.nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self._pop(key)
+        self._entries[key] = (time.monotonic(), table)
+        self._bytes += table.nbytes
+        while self._bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: QueryKey):
+        _, table = self._entries.pop(key)
+        self._bytes -= table.nbytes
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+
+class StreamedResult:
+    """Record batches of one query in read order, shared by every request for it.
+
+    The load appends batches as they are read and requests iterate them from the first,
+    so a request joining a running load still gets the whole result.
+    """
+
+    def __init__(self, schema: pa.Schema):
+        self.batches: List[pa.RecordBatch] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._schema = schema
+        self._changed = asyncio.Condition()
+
+    @classmethod
+    def from_table(cls, table: pa.Table) -> "StreamedResult":
+        result = cls(table.schema)
+        result.batches = table.to_batches(max_chunksize=BATCH_ROWS)
+        result.done = True
+        return result
+
+    @property
+    def schema(self) -> pa.Schema:
+        """Schema of the read batches, the requested columns of STATS_SCHEMA before any arrived."""
+        return self.batches[0].schema if self.batches else self._schema
+
+    async def append(self, batch: pa.RecordBatch):
+        async with self._changed:
+            self.batches.append(batch)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def wait_started(self):
+        """Waits for the first batch or the end of the load, raises if it failed before any batch."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.batches or self.done)
+        if not self.batches and self.error is not None:
+            raise self.error
+
+    async def iter_batches(self):
+        """Yields all batches, waiting for the load to append more until it is done."""
+        i = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: i < len(self.batches) or self.done)
+                pending, done, error = self.batches[i:], self.done, self.error
+            for batch in pending:
+                yield batch
+            i += len(pending)
+            if done and i == len(self.batches):
+                if error is not None:
+                    raise error
+                return
+
+    async def to_table(self) -> pa.Table:
+        return pa.Table.from_batches([b async for b in self.iter_batches()], schema=self.schema)
+
+
+class StatsQueryService:
+    """Local asyncio query service over an OrderbookStatsDB.
+
+    Queries run on a pool of read handles, identical queries in flight are coalesced into a
+    single read, and results are kept in a shared cache. Served over HTTP on localhost:
+
+        GET /stats?start=2025-03-01&end=2025-03-31[&tickers=A,B][&markets=M][&columns=c1,c2][&format=arrow|json]
+        GET /health
+
+    Results are streamed in batches with chunked transfer encoding, as an Arrow IPC stream
+    or as newline delimited JSON records. Batches are sent as the reader produces them, so
+    a response starts before the whole result is read.
+
+    Attributes
+    ----------
+    pool : ReaderPool
+        Read handles the queries run on.
+    cache : StatsResultCache
+        Shared results of recent queries.
+    counters : dict
+        Number of cache hits, coalesced and loaded queries.
+    """
+
+    def __init__(
+        self,
+        stats_db: OrderbookStatsDB,
+        readers: int = 4,
+        cache_bytes: int = 512 * 2**20,
+        cache_ttl: Optional[float] = 60.0,
+    ):
+        self.stats_db = stats_db
+        self.readers = readers
+        self.cache = StatsResultCache(max_bytes=cache_bytes, ttl=cache_ttl)
+        self.pool: Optional[ReaderPool] = None
+        self.counters: Dict[str, int] = {'hits': 0, 'coalesced': 0, 'loads': 0, 'errors': 0}
+        self._inflight: Dict[QueryKey, StreamedResult] = {}
+        self._loads: set = set()
+
+    @staticmethod
+    def make_key(
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> QueryKey:
+        return (
+            start.strftime('%Y-%m-%d'),
+            end.strftime('%Y-%m-%d'),
+            tuple(columns) if columns else None,
+            tuple(sorted(markets)) if markets else None,
+            tuple(sorted(tickers)) if tickers else None,
+        )
+
+    async def stream(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> StreamedResult:
+        """Returns the stats batches from the cache, an identical running query or a new read."""
+        key = self.make_key(start, end, columns, markets, tickers)
+        table = self.cache.get(key)
+        if table is not None:
+            self.counters['hits'] += 1
+            return StreamedResult.from_table(table)
+        result = self._inflight.get(key)
+        if result is not None:
+            self.counters['coalesced'] += 1
+            return result
+        result = self._inflight[key] = StreamedResult(pa.schema([STATS_SCHEMA.field(c) for c in columns]) if columns else STATS_SCHEMA)
+        # the load runs on its own, a client going away must not cancel the read others are waiting on
+        load = asyncio.ensure_future(self._load(key, result))
+        self._loads.add(load)
+        load.add_done_callback(self._loads.discard)
+        return result
+
+    async def query(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> pa.Table:
+        """Returns stats as an Arrow table, see stream."""
+        result = await self.stream(start, end, columns, markets, tickers)
+        return await result.to_table()
+
+    async def _load(self, key: QueryKey, result: StreamedResult):
+        start, end, columns, markets, tickers = key
+        self.counters['loads'] += 1
+        if self.pool is None:
+            self.pool = ReaderPool(self.stats_db, self.readers)
+        try:
+            # batches are handed over without waiting on clients, slow ones don't hold the read open
+            async for batch in self.pool.read_batches(
+                datetime.strptime(start, '%Y-%m-%d'), datetime.strptime(end, '%Y-%m-%d'),
+                list(columns) if columns else None,
+                list(markets) if markets else None,
+                list(tickers) if tickers else None,
+                BATCH_ROWS,
+            ):
+                await result.append(batch)
+        except Exception as e:
+            await result.finish(e)
+        else:
+            await result.finish()
+            self.cache.put(key, pa.Table.from_batches(result.batches, schema=result.schema))
+        finally:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _parse_params(query: str) -> dict:
+        params = {k: v[-1] for k, v in parse_qs(query).items()}
+
+        def as_list(name: str) -> Optional[List[str]]:
+            value = params.get(name)
+            return [v for v in value.split(',') if v] if value else None
+
+        if 'start' not in params or 'end' not in params:
+            raise ValueError("start and end are required")
+        columns = as_list('columns')
+        if columns is not None:
+            unknown = set(columns) - set(STATS_SCHEMA.names)
+            if unknown:
+                raise ValueError(f"Unknown columns: {sorted(unknown)}")
+        fmt = params.get('format', 'json')
+        if fmt not in ('json', 'arrow'):
+            raise ValueError(f"Unknown format: {fmt}")
+        return {
+            'start': datetime.strptime(params['start'], '%Y-%m-%d'),
+            'end': datetime.strptime(params['end'], '%Y-%m-%d'),
+            'columns': columns,
+            'markets': as_list('markets'),
+            'tickers': as_list('tickers'),
+            'format': fmt,
+        }
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves one HTTP request per connection."""
+        try:
+            request_line = (await reader.readline()).decode('latin-1')
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.split()
+            if len(parts) < 2 or parts[0] != 'GET':
+                await self._respond(writer, 405, {'error': 'only GET is supported'})
+                return
+            url = urlsplit(parts[1])
+            if url.path == '/health':
+                await self._respond(writer, 200, {'inflight': len(self._inflight), 'cached': len(self.cache._entries), **self.counters})
+            elif url.path == '/stats':
+                try:
+                    params = self._parse_params(url.query)
+                except ValueError as e:
+                    await self._respond(writer, 400, {'error': str(e)})
+                    return
+                fmt = params.pop('format')
+                result = await self.stream(**params)
+                # a read failing before its first batch still gets an error response
+                await result.wait_started()
+                await self._stream(writer, result, fmt)
+            else:
+                await self._respond(writer, 404, {'error': f'unknown path {url.path}'})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            self.counters['errors'] += 1
+            logger.exception(f"Stats query failed: {e}")
+            try:
+                await self._respond(writer, 500, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload
+        )
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter, result: StreamedResult, fmt: str):
+        content_type = 'application/vnd.apache.arrow.stream' if fmt == 'arrow' else 'application/x-ndjson'
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nTransfer-Encoding: chunked\r\n"
+            f"Connection: close\r\n\r\n".encode()
+        )
+
+        async def send(chunk: bytes):
+            if chunk:
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+
+        try:
+            if fmt == 'arrow':
+                buf = io.BytesIO()
+                with pa.ipc.new_stream(buf, result.schema) as ipc_writer:
+                    async for batch in result.iter_batches():
+                        ipc_writer.write_batch(batch)
+                        await send(buf.getvalue())
+                        buf.seek(0)
+                        buf.truncate()
+                await send(buf.getvalue())
+            else:
+                async for batch in result.iter_batches():
+                    # encoded off the event loop so other clients are still served
+                    await send(await asyncio.to_thread(_ndjson, batch))
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # the status line is out, dropping the connection without the last chunk marks the body incomplete
+            self.counters['errors'] += 1
+            logger.exception(f"Stats query failed mid-stream: {e}")
+            writer.transport.abort()
+            return
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765) -> asyncio.AbstractServer:
+        """Starts listening and returns the server, with port 0 on a free port, see server.sockets."""
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info(f"Stats query service listening on {host}:{server.sockets[0].getsockname()[1]}")
+        return server
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765):
+        server = await self.start(host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+
+def main():
+    import argparse
+    from orderbook.db.base import make_stats_db
+    from orderbook.utils import setup_logs
+    parser = argparse.ArgumentParser(description="Local query service over the orderbook stats database.")
+    parser.add_argument("--stats-backend", default="sqlite", choices=["sqlite", "parquet"])
+    parser.add_argument("--stats-path", default=None, help="Defaults to orderbook_stats.db for sqlite, orderbook_stats/ for parquet")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--readers", type=int, default=4, help="Read connections in the pool")
+    parser.add_argument("--cache-mb", type=int, default=512)
+    parser.add_argument("--cache-ttl", type=float, default=60.0, help="Seconds a cached result is served")
+    args = parser.parse_args()
+    setup_logs()
+
+    stats_db = make_stats_db(path=args.stats_path, backend=args.stats_backend)
+    service = StatsQueryService(stats_db, readers=args.readers, cache_bytes=args.cache_mb * 2**20, cache_ttl=args.cache_ttl)
+    asyncio.run(service.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
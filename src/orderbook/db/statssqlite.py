@@ -1,8 +1,12 @@
 import sqlite3
+from pathlib import Path
 import pandas as pd
 from orderbook.db.base import OrderbookStatsDB
 from datetime import datetime
-from typing import List, Optional
+from typing import TYPE_CHECKING, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import pyarrow as pa
 
 
 class SqliteContext:
@@ -18,10 +22,121 @@ class SqliteContext:
             self._conn.close()
 
 
+def _stats_query(
+    start: datetime,
+    end: datetime,
+    columns: Optional[List[str]] = None,
+    markets: Optional[List[str]] = None,
+    tickers: Optional[List[str]] = None,
+) -> tuple[str, list]:
+    select = ', '.join('"' + c.replace('"', '""') + '"' for c in columns) if columns else '*'
+    query = f"SELECT {select} FROM orderbook_stats WHERE date BETWEEN ? AND ?"
+    params = [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]
+    if markets:
+        query += f" AND market IN ({', '.join('?' * len(markets))})"
+        params += list(markets)
+    if tickers:
+        query += f" AND orderbookcode IN ({', '.join('?' * len(tickers))})"
+        params += list(tickers)
+    return query + " ORDER BY date, market, orderbookcode", params
+
+
+def _read_stats(
+    conn: sqlite3.Connection,
+    start: datetime,
+    end: datetime,
+    columns: Optional[List[str]] = None,
+    markets: Optional[List[str]] = None,
+    tickers: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    query, params = _stats_query(start, end, columns, markets, tickers)
+    df = pd.read_sql_query(query, conn, params=params)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date']).dt.date
+    return df
+
+
+def _read_stats_batches(
+    conn: sqlite3.Connection,
+    start: datetime,
+    end: datetime,
+    columns: Optional[List[str]] = None,
+    markets: Optional[List[str]] = None,
+    tickers: Optional[List[str]] = None,
+    batch_rows: int = 65536,
+) -> Iterator["pa.RecordBatch"]:
+    """Same rows as _read_stats as Arrow record batches typed by STATS_SCHEMA, fetched batch_rows at a time."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from orderbook.db.statsparquet import STATS_SCHEMA
+    cur = conn.execute(*_stats_query(start, end, columns, markets, tickers))
+    try:
+        names = [d[0] for d in cur.description]
+        schema = pa.schema([STATS_SCHEMA.field(n) for n in names])
+        while True:
+            rows = cur.fetchmany(batch_rows)
+            if not rows:
+                break
+            arrays = []
+            for i, field in enumerate(schema):
+                values = pa.array([row[i] for row in rows])
+                if field.name == 'date':
+                    # DATE columns hold ISO text, with a time part when written from datetimes
+                    values = pc.utf8_slice_codeunits(values, 0, 10)
+                arrays.append(values.cast(field.type))
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+    finally:
+        cur.close()
+
+
+class SqliteStatsReader:
+    """Read-only connection to the stats database, used by one thread at a time."""
+
+    def __init__(self, db_path: str):
+        uri = Path(db_path).absolute().as_uri() + '?mode=ro'
+        self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def read_stats(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        return _read_stats(self._conn, start, end, columns, markets, tickers)
+
+    def read_stats_batches(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+        batch_rows: int = 65536,
+    ) -> Iterator["pa.RecordBatch"]:
+        return _read_stats_batches(self._conn, start, end, columns, markets, tickers, batch_rows)
+
+    def close(self):
+        self._conn.close()
+
+
 class OrderbookStatsSqlite(OrderbookStatsDB):
 
-    def __init__(self, db_path: str = 'orderbook_stats.db'):
+    def __init__(self, db_path: str = 'orderbook_stats.db', wal: bool = False):
+        """
+        Parameters
+        ----------
+        db_path : str
+            Path to the SQLite database file.
+        wal : bool
+            Switches the database to write-ahead logging, so readers don't block the writer and
+            the writer doesn't block readers. The mode is stored in the database file and WAL
+            needs every connection on the same host, so leave it off for a database shared
+            over a network filesystem. Defaults to False, the journal mode is left as it is.
+        """
         self._db_path = db_path
+        self.wal = wal
         self._init_table()
 
     @property
@@ -32,6 +147,8 @@ class OrderbookStatsSqlite(OrderbookStatsDB):
     def _init_table(self):
         with self.db_context as conn:
             cur = conn.cursor()
+            if self.wal:
+                cur.execute("PRAGMA journal_mode=WAL")
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS orderbook_stats (
                     date DATE NOT NULL,
@@ -47,9 +164,13 @@ class OrderbookStatsSqlite(OrderbookStatsDB):
                     buy_5_depth REAL,
                     sell_5_depth REAL,
                     imbalance REAL,
+                    provisional INTEGER NOT NULL DEFAULT 0,
                     PRIMARY KEY (date, market, orderbookcode)
                 )
             """)
+            # tables created before intraday stats lack the column, their rows are final
+            if 'provisional' not in {row[1] for row in cur.execute("PRAGMA table_info(orderbook_stats)")}:
+                cur.execute("ALTER TABLE orderbook_stats ADD COLUMN provisional INTEGER NOT NULL DEFAULT 0")
             cur.execute("""
                 CREATE INDEX IF NOT EXISTS idx_orderbook_stats_date ON orderbook_stats (date);
             """)
@@ -62,7 +183,7 @@ class OrderbookStatsSqlite(OrderbookStatsDB):
     def get_max_date(self) -> datetime:
         with self.db_context as conn:
             cur = conn.cursor()
-            cur.execute("SELECT MAX(date) FROM orderbook_stats")
+            cur.execute("SELECT MAX(date) FROM orderbook_stats WHERE provisional = 0")
             max_date = cur.fetchone()[0]
             cur.close()
             if max_date is None:
@@ -74,7 +195,7 @@ class OrderbookStatsSqlite(OrderbookStatsDB):
             cur = conn.cursor()
             cur.execute("""
                 SELECT DISTINCT date FROM orderbook_stats
-                WHERE date BETWEEN ? AND ?
+                WHERE date BETWEEN ? AND ? AND provisional = 0
                 ORDER BY date
             """, (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
             dates = cur.fetchall()
@@ -84,13 +205,68 @@ class OrderbookStatsSqlite(OrderbookStatsDB):
     def get_date_exists(self, date: datetime) -> bool:
         with self.db_context as conn:
             cur = conn.cursor()
-            cur.execute("SELECT EXISTS(SELECT 1 FROM orderbook_stats WHERE date = ?)", (date.strftime('%Y-%m-%d'),))
+            cur.execute(
+                "SELECT EXISTS(SELECT 1 FROM orderbook_stats WHERE date = ? AND provisional = 0)",
+                (date.strftime('%Y-%m-%d'),),
+            )
             exists = cur.fetchone()[0]
             cur.close()
             return bool(exists)
 
+    def read_stats(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """Reads stats between dates, ordered by date, market and orderbookcode."""
+        with self.db_context as conn:
+            return _read_stats(conn, start, end, columns, markets, tickers)
+
+    def read_stats_batches(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        markets: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+        batch_rows: int = 65536,
+    ) -> Iterator["pa.RecordBatch"]:
+        with self.db_context as conn:
+            yield from _read_stats_batches(conn, start, end, columns, markets, tickers, batch_rows)
+
+    def open_reader(self) -> SqliteStatsReader:
+        return SqliteStatsReader(self._db_path)
+
     def write_stats_df(self, df: pd.DataFrame):
-        """Write a DataFrame of orderbook stats to the database."""
+        """
+        Write a DataFrame of orderbook stats to the database. Provisional intraday rows of the
+        same dates and markets are replaced in the same transaction.
+        """
+        if df.empty:
+            return
         with self.db_context as conn:
+            days = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+            conn.executemany(
+                "DELETE FROM orderbook_stats WHERE date = ? AND market = ? AND provisional = 1",
+                set(zip(days, df['market'])),
+            )
             df.to_sql('orderbook_stats', conn, if_exists='append', index=False)
             conn.commit()
+
+    def upsert_stats_df(self, df: pd.DataFrame):
+        """Write a DataFrame of orderbook stats, replacing rows with the same primary key."""
+        if df.empty:
+            return
+        df = df.copy()
+        df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+        cols = list(df.columns)
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        with self.db_context as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO orderbook_stats ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                rows,
+            )
+            conn.commit()
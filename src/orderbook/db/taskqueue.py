@@ -0,0 +1,217 @@
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+STATUSES = ('pending', 'running', 'done', 'failed')
+
+
+@dataclass
+class Task:
+    id: int
+    kind: str
+    key: str
+    payload: dict
+    attempts: int
+
+
+class SqliteTaskQueue:
+    """Task table in a sqlite file shared by a coordinator and any number of workers.
+
+    Every unit of work is a row with a unique (kind, key). Workers claim a task inside an
+    immediate (write locked) transaction, which gives them a lease until ``lease_expires``.
+    A running worker extends its lease with heartbeats; when a worker dies its lease runs
+    out and the task is claimed again. Failed tasks are retried after a backoff until
+    ``max_attempts`` is reached.
+
+    The file can live on a shared volume for several hosts, as long as the volume supports
+    file locks. WAL is deliberately not used, it requires all connections on one host.
+
+    Lease deadlines and retry times are wall clock timestamps taken on whichever host runs
+    the claim or heartbeat, so the hosts' clocks must be kept in sync, e.g. with NTP. A host
+    running ahead by more than the lease takes over tasks whose workers are still alive.
+
+    Attributes
+    ----------
+    path : str
+        Path to the sqlite file.
+    lease_seconds : float
+        How long a claim or heartbeat keeps a task reserved for its worker.
+    max_attempts : int
+        Claims of a task before it is marked failed.
+    retry_backoff : float
+        Seconds to wait before retrying, multiplied by the attempts so far.
+    clock : Callable[[], float]
+        Source of the timestamps, time.time unless replaced, e.g. in tests.
+    """
+
+    def __init__(
+        self,
+        path: str = 'orderbook_tasks.db',
+        lease_seconds: float = 300.0,
+        max_attempts: int = 3,
+        retry_backoff: float = 30.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.clock = clock
+        self._init_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        # autocommit, transactions are opened explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def _init_table(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    heartbeat_at REAL,
+                    last_error TEXT,
+                    updated_at REAL,
+                    UNIQUE (kind, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, available_at)")
+        finally:
+            conn.close()
+
+    def enqueue(self, kind: str, tasks: Iterable[Tuple[str, dict]]) -> int:
+        """Adds (key, payload) tasks of a kind, skipping keys already queued. Returns the number added."""
+        now = self.clock()
+        rows = [(kind, key, json.dumps(payload), now) for key, payload in tasks]
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (kind, key, payload, updated_at) VALUES (?, ?, ?, ?)", rows
+            )
+            conn.execute("COMMIT")
+            return conn.total_changes - before
+        finally:
+            conn.close()
+
+    def claim(self, worker_id: str, kinds: Optional[List[str]] = None) -> Optional[Task]:
+        """
+        Leases the oldest available task to the worker: a pending task due for a try, or a
+        running task whose lease has expired. Returns None if there is nothing to do.
+        """
+        now = self.clock()
+        kind_filter = f"AND kind IN ({', '.join('?' * len(kinds))})" if kinds else ""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # tasks whose worker died on the last allowed attempt are not retried
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', last_error = coalesce(last_error, 'lease expired'), updated_at = ? "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = conn.execute(
+                f"""
+                SELECT id, kind, key, payload, attempts FROM tasks
+                WHERE ((status = 'pending' AND available_at <= ?) OR (status = 'running' AND lease_expires < ?))
+                {kind_filter}
+                ORDER BY id LIMIT 1
+                """,
+                (now, now, *(kinds or [])),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                "lease_expires = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                (worker_id, now + self.lease_seconds, now, now, row[0]),
+            )
+            conn.execute("COMMIT")
+            return Task(id=row[0], kind=row[1], key=row[2], payload=json.loads(row[3]), attempts=row[4] + 1)
+        finally:
+            # closing an open transaction rolls it back
+            conn.close()
+
+    def _update_owned(self, task_id: int, worker_id: str, sql: str, params: tuple) -> bool:
+        """Runs an update on a task still leased by the worker. Returns False if the lease was lost."""
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                sql + " WHERE id = ? AND status = 'running' AND lease_owner = ?", (*params, task_id, worker_id)
+            )
+            return cur.rowcount == 1
+        finally:
+            conn.close()
+
+    def heartbeat(self, task_id: int, worker_id: str) -> bool:
+        """Extends the lease. Returns False if the task was reclaimed by another worker."""
+        now = self.clock()
+        return self._update_owned(
+            task_id, worker_id, "UPDATE tasks SET lease_expires = ?, heartbeat_at = ?", (now + self.lease_seconds, now)
+        )
+
+    def complete(self, task_id: int, worker_id: str) -> bool:
+        return self._update_owned(
+            task_id, worker_id, "UPDATE tasks SET status = 'done', lease_owner = NULL, lease_expires = NULL, updated_at = ?",
+            (self.clock(),),
+        )
+
+    def fail(self, task_id: int, worker_id: str, error: str, attempts: int) -> bool:
+        """Puts the task back for a retry after a backoff, or marks it failed after max_attempts."""
+        now = self.clock()
+        status = 'failed' if attempts >= self.max_attempts else 'pending'
+        return self._update_owned(
+            task_id, worker_id,
+            "UPDATE tasks SET status = ?, available_at = ?, last_error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?",
+            (status, now + self.retry_backoff * attempts, error[-2000:], now),
+        )
+
+    def counts(self, kind: Optional[str] = None) -> Dict[str, int]:
+        """Number of tasks per status."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT status, count(*) FROM tasks " + ("WHERE kind = ? " if kind else "") + "GROUP BY status",
+                (kind,) if kind else (),
+            ).fetchall()
+        finally:
+            conn.close()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(dict(rows))
+        return counts
+
+    def failed(self, kind: Optional[str] = None) -> List[Tuple[str, str, str]]:
+        """(kind, key, last_error) of tasks that ran out of attempts."""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT kind, key, last_error FROM tasks WHERE status = 'failed' " + ("AND kind = ? " if kind else "") + "ORDER BY id",
+                (kind,) if kind else (),
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def retry_failed(self, kind: Optional[str] = None) -> int:
+        """Puts failed tasks back to pending with fresh attempts. Returns the number reset."""
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "UPDATE tasks SET status = 'pending', attempts = 0, available_at = 0, updated_at = ? WHERE status = 'failed' "
+                + ("AND kind = ?" if kind else ""),
+                (self.clock(), kind) if kind else (self.clock(),),
+            )
+            return cur.rowcount
+        finally:
+            conn.close()
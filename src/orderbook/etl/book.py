@@ -0,0 +1,172 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# events after which the order no longer rests in the book
+REMOVE_EVENTS = {'CAME', 'CAMO', 'EXPI', 'FILL', 'REMA', 'REMO', 'REMH', 'REME'}
+# reporting schema uses BUYI for the buy side
+SIDES = {'BUY': 'BUY', 'BUYI': 'BUY', 'SELL': 'SELL'}
+
+
+def _to_float(val) -> float:
+    """Parses csv text values, missing values and 'nan' as NaN."""
+    if val is None:
+        return math.nan
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+@lru_cache(maxsize=65536)
+def valid_until(validity_dt: str) -> Optional[datetime]:
+    """Parses an order's validity date time as naive UTC, None when it has none."""
+    if not isinstance(validity_dt, str) or not validity_dt or validity_dt == 'nan':
+        return None
+    try:
+        ts = datetime.fromisoformat(validity_dt)
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+class OrderBookState:
+    """Resting orders and aggregated price levels of a single orderbook.
+
+    Every event is applied in O(1) through dict updates; sorting of price levels is
+    deferred to ``top_levels``, which is only called when a snapshot is taken.
+
+    Attributes
+    ----------
+    orders : dict
+        orderidcode -> (side, price, qty, validityperiod, validityperiodandtime)
+    levels : dict
+        side -> {price: aggregated remaining qty}
+    """
+
+    def __init__(self):
+        self.orders: Dict[str, Tuple[str, float, float, str, str]] = {}
+        self.levels: Dict[str, Dict[float, float]] = {'BUY': defaultdict(float), 'SELL': defaultdict(float)}
+        self.last_seqnum: int = -1
+
+    def _remove(self, oid: str):
+        side, price, qty, _, _ = self.orders.pop(oid)
+        level = self.levels[side]
+        level[price] -= qty
+        if level[price] <= 1e-9:
+            del level[price]
+
+    def _add(self, oid: str, side: str, price: float, qty: float, validity: str, validity_dt: str):
+        self.orders[oid] = (side, price, qty, validity, validity_dt)
+        self.levels[side][price] += qty
+
+    def apply(self, event: dict):
+        """Applies one orderbook event row (csv text values) to the book."""
+        oid = event['orderidcode']
+        if oid in self.orders:
+            self._remove(oid)
+        self.last_seqnum = int(event['seqnum'])
+        if event['orderevent'] in REMOVE_EVENTS:
+            return
+        side = SIDES.get(event['buysellind'])
+        price = _to_float(event['limitprice'])
+        qty = _to_float(event['remainingqtyinclhidden'])
+        # market and unpriced orders don't rest at a level
+        if side is None or math.isnan(price) or math.isnan(qty) or qty <= 0:
+            return
+        self._add(oid, side, price, qty, event.get('validityperiod') or '', event.get('validityperiodandtime') or '')
+
+    def expire(self, ts: datetime) -> int:
+        """Removes orders whose validity date time is at or before ``ts`` (naive UTC), returns how many."""
+        expired = [
+            oid for oid, (_, _, _, _, validity_dt) in self.orders.items()
+            if (until := valid_until(validity_dt)) is not None and until <= ts
+        ]
+        for oid in expired:
+            self._remove(oid)
+        return len(expired)
+
+    def top_levels(self, side: str, n: int = 5) -> list[tuple[float, float]]:
+        """Returns the n best (price, qty) levels of a side."""
+        level = self.levels[side]
+        return sorted(level.items(), reverse=(side == 'BUY'))[:n]
+
+    def book_stats(self, depth: int = 5) -> dict:
+        """Top of book spread, depth of the best ``depth`` levels per side and depth imbalance."""
+        bids = self.top_levels('BUY', depth)
+        asks = self.top_levels('SELL', depth)
+        top_spread = asks[0][0] - bids[0][0] if bids and asks else math.nan
+        buy_depth = float(sum(q for _, q in bids))
+        sell_depth = float(sum(q for _, q in asks))
+        total = buy_depth + sell_depth
+        imbalance = (buy_depth - sell_depth) / total if total > 0 else math.nan
+        return {
+            'top_spread': top_spread,
+            f'buy_{depth}_depth': buy_depth,
+            f'sell_{depth}_depth': sell_depth,
+            'imbalance': imbalance,
+        }
+
+    def to_records(self) -> list[dict]:
+        return [
+            {'orderidcode': oid, 'buysellind': side, 'limitprice': price, 'remainingqtyinclhidden': qty,
+             'validityperiod': validity, 'validityperiodandtime': validity_dt}
+            for oid, (side, price, qty, validity, validity_dt) in self.orders.items()
+        ]
+
+    @classmethod
+    def from_records(cls, records: list[dict], last_seqnum: int = -1) -> "OrderBookState":
+        book = cls()
+        for r in records:
+            book._add(r['orderidcode'], SIDES[r['buysellind']], float(r['limitprice']), float(r['remainingqtyinclhidden']),
+                      r.get('validityperiod') or '', r.get('validityperiodandtime') or '')
+        book.last_seqnum = last_seqnum
+        return book
+
+
+class TradeStats:
+    """Running OHLC, volume and trade count of a single orderbook, O(1) per event."""
+
+    def __init__(self):
+        self.open = math.nan
+        self.high = math.nan
+        self.low = math.nan
+        self.close = math.nan
+        self.volume = 0
+        self.trade_count = 0
+        self._trade_ids = set()
+
+    def apply(self, event: dict):
+        qty = _to_float(event.get('tradedquantity'))
+        if math.isnan(qty) or qty <= 0:
+            return
+        # both sides of an execution are reported; count each venue transaction once
+        trade_id = event.get('tradingvenuetransactionidcode')
+        if isinstance(trade_id, str) and trade_id and trade_id != 'nan':
+            if trade_id in self._trade_ids:
+                return
+            self._trade_ids.add(trade_id)
+        price = _to_float(event.get('transactionprice'))
+        if math.isnan(price) or price <= 0:
+            return
+        if math.isnan(self.open):
+            self.open = self.high = self.low = price
+        self.high = max(self.high, price)
+        self.low = min(self.low, price)
+        self.close = price
+        self.volume += int(qty)
+        self.trade_count += 1
+
+    def as_dict(self) -> dict:
+        return {
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume': self.volume,
+            'trade_count': self.trade_count,
+        }
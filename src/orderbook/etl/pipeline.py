@@ -1,91 +1,218 @@
 import logging
-from orderbook.utils import setup_logs
-setup_logs()
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta
-import pandas as pd
-from orderbook.db.csvreader import OrderbookCSVA
-from orderbook.db.statssqlite import OrderbookStatsSqlite
-import orderbook.etl.orderbookstats as orderbookstats
+from typing import Optional, TYPE_CHECKING
+from orderbook.db.base import OrderbookDB, OrderbookStatsDB, make_orderbook_db, make_stats_db
 from orderbook.MarketTypes import MARKET
 
+if TYPE_CHECKING:
+    import pandas as pd
+    from orderbook.db.taskqueue import SqliteTaskQueue
+
 logger = logging.getLogger(__name__)
 
-source_db = OrderbookCSVA(path="data_20250616/")
-stats_db = OrderbookStatsSqlite(db_path='orderbook_stats.db')
+# first day of the orderbook dataset, earlier dates have no source files
+DATASET_START = datetime(2025, 3, 17)
 
-def process_new_files(market: MARKET):
-    """Process new files for the given market and update the stats database."""
-    max_filedate = source_db.get_max_date(market)
-    last_stats_date = stats_db.get_max_date()
-    if last_stats_date is None:
-        last_stats_date = datetime(2025, 3, 17)
-    next_stats_date = last_stats_date + timedelta(days=1)
-    process_date_range(market, next_stats_date, max_filedate)
-
-
-def process_date_range(market: MARKET, start_date: datetime, end_date: datetime):
-    next_stats_date = start_date
-    logger.info(f"Processing date range from {start_date} to {end_date} for market: {market}")    
-    while next_stats_date <= end_date:
-        try:
-            process_date(market, next_stats_date)
-        except Exception as e:
-            logger.exception(f"Failed to update stats for {market} on {next_stats_date}: {e}")
-        finally:
-            next_stats_date += timedelta(days=1)
+
+@dataclass
+class PipelineConfig:
+    """
+    Where the stats pipeline reads orderbook events from and writes stats to.
+    stats_path defaults to the stats backend's location in base.STATS_PATHS. parse_workers > 1
+    gives the csv source an intra-day parse pool, leave it at 1 in task queue workers.
+    """
+    source_path: str = "data_20250616/"
+    source_backend: str = "csv"
+    stats_path: Optional[str] = None
+    stats_backend: str = "sqlite"
+    parse_workers: int = 1
 
 
-def extract_date(market: MARKET, date: datetime) -> pd.DataFrame:
-    try:
-        data = source_db.fetch_filtered_orderbook_data(
-            start=date,
-            end=date,
-            market=market,
+class StatsPipeline:
+    """Extracts orderbook events per date, computes daily stats and loads them into the stats database.
+
+    Attributes
+    ----------
+    source_db : OrderbookDB
+        Source of orderbook events.
+    stats_db : OrderbookStatsDB
+        Destination of the daily stats.
+
+    Methods
+    -------
+    from_config(config):
+        Builds the source and stats databases described by a PipelineConfig.
+    process_new_files(market):
+        Processes dates after the last stats date up to the last source file.
+    process_date_range(market, start_date, end_date, queue=None):
+        Processes every date in the range, or enqueues them for workers.
+    process_date(market, date, raise_errors=False):
+        Processes a single date.
+    close():
+        Releases worker processes held by the source database.
+    """
+
+    def __init__(self, source_db: OrderbookDB, stats_db: OrderbookStatsDB):
+        self.source_db = source_db
+        self.stats_db = stats_db
+
+    @classmethod
+    def from_config(cls, config: PipelineConfig) -> "StatsPipeline":
+        return cls(
+            source_db=make_orderbook_db(path=config.source_path, backend=config.source_backend, parse_workers=config.parse_workers),
+            stats_db=make_stats_db(path=config.stats_path, backend=config.stats_backend),
         )
-        if data.empty:
+
+    def close(self):
+        self.source_db.close()
+
+    def process_new_files(self, market: MARKET):
+        """Process new files for the given market and update the stats database."""
+        max_filedate = self.source_db.get_max_date(market)
+        last_stats_date = self.stats_db.get_max_date()
+        if last_stats_date is None:
+            last_stats_date = DATASET_START
+        next_stats_date = last_stats_date + timedelta(days=1)
+        self.process_date_range(market, next_stats_date, max_filedate)
+
+    def process_date_range(self, market: MARKET, start_date: datetime, end_date: datetime, queue: Optional["SqliteTaskQueue"] = None):
+        """
+        Process every date in the range. With a queue, (market, date) tasks are enqueued for
+        workers (see orderbook.etl.workqueue) instead of processed here. Dates before
+        DATASET_START are skipped.
+        """
+        if start_date < DATASET_START:
+            logger.warning(f"Skipping dates before the start of the dataset {DATASET_START:%Y-%m-%d}")
+            start_date = DATASET_START
+        if queue is not None:
+            from orderbook.etl.workqueue import stats_date_tasks
+            added = queue.enqueue('stats_date', stats_date_tasks(market, start_date, end_date))
+            logger.info(f"Enqueued {added} dates from {start_date} to {end_date} for market {market} to {queue.path}")
+            return
+        next_stats_date = start_date
+        logger.info(f"Processing date range from {start_date} to {end_date} for market: {market}")
+        while next_stats_date <= end_date:
+            try:
+                self.process_date(market, next_stats_date)
+            except Exception as e:
+                logger.exception(f"Failed to update stats for {market} on {next_stats_date}: {e}")
+            finally:
+                next_stats_date += timedelta(days=1)
+
+    def extract_date(self, market: MARKET, date: datetime) -> Optional["pd.DataFrame"]:
+        try:
+            data = self.source_db.fetch_filtered_orderbook_data(
+                start=date,
+                end=date,
+                market=market,
+            )
+            if data.empty:
+                logger.warning(f"No data found for {market} on {date}")
+                return
+            return data
+        except FileNotFoundError:
             logger.warning(f"No data found for {market} on {date}")
             return
-        return data
-    except FileNotFoundError:
-        logger.warning(f"No data found for {market} on {date}")
-        return
-
-def transform_data(market: MARKET, data: pd.DataFrame) -> pd.DataFrame:
-    try:
-        daily_stats = orderbookstats.get_daily_stats(data)
-        if daily_stats.empty:
-            logger.warning(f"No daily stats computed for {market} on {data['dateandtime'].iloc[0]}")
+
+    def transform_data(self, market: MARKET, data: "pd.DataFrame", raise_errors: bool = False) -> "pd.DataFrame":
+        import pandas as pd
+        import orderbook.etl.orderbookstats as orderbookstats
+        try:
+            daily_stats = orderbookstats.get_daily_stats(data)
+            if daily_stats.empty:
+                logger.warning(f"No daily stats computed for {market} on {data['dateandtime'].iloc[0]}")
+                return pd.DataFrame()
+        except Exception as e:
+            logger.exception(f"Failed to compute daily stats for {market} on {data['dateandtime'].iloc[0]}: {e}")
+            if raise_errors:
+                raise
             return pd.DataFrame()
-    except Exception as e:
-        logger.exception(f"Failed to compute daily stats for {market} on {data['dateandtime'].iloc[0]}: {e}")
-        return pd.DataFrame()
 
-    daily_stats['date'] = pd.to_datetime(data['dateandtime'].iloc[0]).date()
-    daily_stats['market'] = market
-    return daily_stats
+        daily_stats['date'] = pd.to_datetime(data['dateandtime'].iloc[0]).date()
+        daily_stats['market'] = market
+        return daily_stats
+
+    def load_data(self, market: MARKET, daily_stats: "pd.DataFrame", raise_errors: bool = False):
+        try:
+            self.stats_db.write_stats_df(daily_stats)
+            logger.info(f"Processed and inserted stats for {market} on {daily_stats['date'].iloc[0]}")
+        except Exception as e:
+            logger.exception(f"Failed to insert stats for {market} on {daily_stats['date'].iloc[0]}: {e}")
+            if raise_errors:
+                raise
+
+    def process_date(self, market: MARKET, date: datetime, raise_errors: bool = False):
+        """
+        Process a specific date for the given market. Transform and insert errors are logged,
+        with raise_errors they are raised as well, e.g. so a task queue retries the date.
+        """
+        logger.info(f"Processing date {date} for market {market}")
+        assert date >= DATASET_START, "Date must be after the start of the dataset"
+        if self.stats_db.get_date_exists(date):
+            logger.info(f"Stats for {market} on {date} already exist, skipping.")
+            return
+        logger.info(f"Extracting data for {market} on {date}")
+        data = self.extract_date(market, date)
+        if data is None:
+            return
+        logger.info(f"Transforming data for {market} on {date}")
+        daily_stats = self.transform_data(market, data, raise_errors=raise_errors)
+        if daily_stats.empty:
+            return
+        self.load_data(market, daily_stats, raise_errors=raise_errors)
 
-def load_data(market: MARKET, daily_stats: pd.DataFrame):
-    try:
-        stats_db.write_stats_df(daily_stats)
-        logger.info(f"Processed and inserted stats for {market} on {daily_stats['date'].iloc[0]}")
-    except Exception as e:
-        logger.exception(f"Failed to insert stats for {market} on {daily_stats['date'].iloc[0]}: {e}")
 
+# module level functions run on a default pipeline, built from _default_config on first use
+_default_config = PipelineConfig()
+_default_pipeline: Optional[StatsPipeline] = None
+
+
+def get_pipeline() -> StatsPipeline:
+    """Returns the default pipeline, building it on first use."""
+    global _default_pipeline
+    if _default_pipeline is None:
+        _default_pipeline = StatsPipeline.from_config(_default_config)
+    return _default_pipeline
+
+
+def close():
+    """Closes the default pipeline if it was built, it is rebuilt on next use."""
+    global _default_pipeline
+    if _default_pipeline is not None:
+        _default_pipeline.close()
+        _default_pipeline = None
+
+
+def configure(config: PipelineConfig):
+    """Replaces the default pipeline configuration, the pipeline is rebuilt on next use."""
+    global _default_config
+    close()
+    _default_config = config
 
-def process_date(market: MARKET, date: datetime):
-    """Process a specific date for the given market."""
-    logger.info(f"Processing date {date} for market {market}")
-    assert date >= datetime(2025, 3, 17), "Date must be after the start of the dataset"
-    if stats_db.get_date_exists(date):
-        logger.info(f"Stats for {market} on {date} already exist, skipping.")
-        return
-    logger.info(f"Extracting data for {market} on {date}")
-    data = extract_date(market, date)
-    if data is None:
-        return
-    logger.info(f"Transforming data for {market} on {date}")
-    daily_stats = transform_data(market, data)
-    if daily_stats.empty:
-        return
-    load_data(market, daily_stats)
 
+def use_source_backend(backend: str, path: str = "data_20250616/"):
+    """Switches the source orderbook database backend, 'csv' or 'duckdb'."""
+    configure(replace(_default_config, source_path=path, source_backend=backend))
+
+
+def use_stats_backend(backend: str, path: Optional[str] = None):
+    """
+    Switches the stats database backend, 'sqlite' or 'parquet'. Without a path the backend's
+    default is used, 'orderbook_stats.db' for sqlite and 'orderbook_stats/' for parquet.
+    """
+    configure(replace(_default_config, stats_path=path, stats_backend=backend))
+
+
+def process_new_files(market: MARKET):
+    """Process new files for the given market and update the stats database."""
+    get_pipeline().process_new_files(market)
+
+
+def process_date_range(market: MARKET, start_date: datetime, end_date: datetime, queue: Optional["SqliteTaskQueue"] = None):
+    get_pipeline().process_date_range(market, start_date, end_date, queue=queue)
+
+
+def process_date(market: MARKET, date: datetime, raise_errors: bool = False):
+    """Process a specific date for the given market."""
+    get_pipeline().process_date(market, date, raise_errors=raise_errors)
@@ -0,0 +1,279 @@
+import logging
+import csv
+import gzip
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, Optional
+import pandas as pd
+from orderbook.MarketTypes import MARKET
+from orderbook.db.base import OrderbookStatsDB, orderbook_cols
+from orderbook.etl.book import OrderBookState, TradeStats
+
+logger = logging.getLogger(__name__)
+
+STATS_COLS = ['date', 'market', 'orderbookcode', 'open', 'high', 'low', 'close', 'volume', 'trade_count',
+              'top_spread', 'buy_5_depth', 'sell_5_depth', 'imbalance']
+
+
+def replay_day_file(path: str, speed: Optional[float] = None) -> Iterator[dict]:
+    """
+    Replays an ORK_Orders day file in seqnum order.
+
+    Parameters
+    ----------
+    path : str
+        Path to a csv or csv.gz orders file.
+    speed : float, optional
+        Replay speed relative to the event timestamps, e.g. 10.0 is ten times real time.
+        Defaults to None, as fast as possible.
+    """
+    events = pd.read_csv(path, usecols=orderbook_cols, dtype=str, engine="c", keep_default_na=False)
+    events['seqnum'] = events['seqnum'].astype(int)
+    events = events.sort_values('seqnum')
+    if speed is None:
+        yield from events.to_dict(orient='records')
+        return
+    ts = pd.to_datetime(events['dateandtime'], utc=True, format='ISO8601')
+    wall_start = time.monotonic()
+    first_ts = ts.iloc[0]
+    for event, event_ts in zip(events.to_dict(orient='records'), ts):
+        delay = (event_ts - first_ts).total_seconds() / speed - (time.monotonic() - wall_start)
+        if delay > 0:
+            time.sleep(delay)
+        yield event
+
+
+def tail_file(path: str, poll_interval: float = 0.5, stop: Optional[threading.Event] = None) -> Iterator[Optional[dict]]:
+    """
+    Follows a growing csv file with a header row, yielding rows as they are appended and
+    None after each idle poll, so the consumer can run time based flushes.
+    Stops when ``stop`` is set, otherwise runs forever.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='') as f:
+        header = None
+        buffer = ''
+        while stop is None or not stop.is_set():
+            line = f.readline()
+            if not line:
+                time.sleep(poll_interval)
+                yield None
+                continue
+            buffer += line
+            # partially written line, wait for the rest
+            if not buffer.endswith('\n'):
+                continue
+            row = next(csv.reader([buffer]))
+            buffer = ''
+            if header is None:
+                header = row
+                continue
+            yield dict(zip(header, row))
+
+
+def unix_socket_events(socket_path: str, stop: Optional[threading.Event] = None, idle_timeout: float = 1.0) -> Iterator[Optional[dict]]:
+    """
+    Listens on a Unix socket and yields csv rows sent by a single producer connection, and
+    None whenever nothing arrived for ``idle_timeout`` seconds. The first line sent is the
+    header. Ends when the producer closes the connection.
+    """
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(socket_path)
+        server.listen(1)
+        conn, _ = server.accept()
+        conn.settimeout(idle_timeout)
+        with conn:
+            header = None
+            buffer = b''
+            while stop is None or not stop.is_set():
+                try:
+                    chunk = conn.recv(1 << 16)
+                except socket.timeout:
+                    yield None
+                    continue
+                if not chunk:
+                    break
+                # keep a partially received line for the next chunk
+                *lines, buffer = (buffer + chunk).split(b'\n')
+                for row in csv.reader(line.decode('utf8') for line in lines):
+                    if header is None:
+                        header = row
+                        continue
+                    yield dict(zip(header, row))
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class StreamingStats:
+    """Incremental daily stats per orderbookcode.
+
+    Each event costs O(1): trade stats are running aggregates and the book only updates
+    dicts. Spread, depth and imbalance are derived from the book when a snapshot is taken.
+
+    A stream crossing midnight starts a new day on the first event of the next date: the
+    ``on_day_end`` callback gets the finished day, then books, trade stats and the seqnum
+    order, which restarts every day, are reset.
+
+    Attributes
+    ----------
+    market : MARKET
+        Market the events belong to, written to the ``market`` column.
+    books : dict
+        orderbookcode -> OrderBookState
+    trades : dict
+        orderbookcode -> TradeStats
+    on_day_end : Callable, optional
+        Called with the stats before they are reset for a new day.
+    """
+
+    def __init__(self, market: MARKET, on_day_end: Optional[Callable[["StreamingStats"], None]] = None):
+        self.market = market
+        self.on_day_end = on_day_end
+        self.date = None
+        self._day = None
+        self.last_seqnum = -1
+        self.books: Dict[str, OrderBookState] = {}
+        self.trades: Dict[str, TradeStats] = {}
+
+    def _start_day(self, day: str):
+        if self.date is not None and self.on_day_end is not None:
+            self.on_day_end(self)
+        self._day = day
+        self.date = datetime.strptime(day, '%Y-%m-%d').date()
+        self.last_seqnum = -1
+        self.books = {}
+        self.trades = {}
+
+    def apply(self, event: dict) -> bool:
+        """Applies an event, returns False if it was dropped as out of seqnum or date order."""
+        # ISO dates compare as text, parsed only when the day changes
+        day = str(event['dateandtime'])[:10]
+        if day != self._day:
+            if self._day is not None and day < self._day:
+                logger.warning(f"Dropping event of {day} after the stream moved on to {self._day}")
+                return False
+            self._start_day(day)
+        seqnum = int(event['seqnum'])
+        if seqnum <= self.last_seqnum:
+            logger.warning(f"Dropping out of order event seqnum {seqnum} after {self.last_seqnum}")
+            return False
+        self.last_seqnum = seqnum
+        code = event['orderbookcode']
+        book = self.books.get(code)
+        if book is None:
+            book = self.books[code] = OrderBookState()
+            self.trades[code] = TradeStats()
+        book.apply(event)
+        self.trades[code].apply(event)
+        return True
+
+    def snapshot(self) -> pd.DataFrame:
+        """Returns current stats in the orderbook_stats table layout."""
+        rows = []
+        for code, book in self.books.items():
+            row = {'date': self.date, 'market': self.market, 'orderbookcode': code}
+            row.update(self.trades[code].as_dict())
+            row.update(book.book_stats(depth=5))
+            rows.append(row)
+        return pd.DataFrame(rows, columns=STATS_COLS)
+
+
+def run_stream(
+    events: Iterable[dict],
+    market: MARKET,
+    stats_db: Optional[OrderbookStatsDB] = None,
+    flush_every_events: Optional[int] = 100000,
+    flush_every_seconds: Optional[float] = 60.0,
+) -> pd.DataFrame:
+    """
+    Consumes events and periodically flushes rolling snapshots to the stats database.
+
+    Snapshots are written with ``upsert_stats_df`` as provisional rows, so each flush
+    replaces the previous one for the day and the batch pipeline later replaces them all. A day is flushed once more when the stream moves on to the next date,
+    and a final flush is done when the source is exhausted. Sources yield None while idle,
+    so time based flushes also happen when no events arrive.
+
+    Returns
+    -------
+    pd.DataFrame
+        The final end of day stats of the last day.
+    """
+    on_day_end = None
+    if stats_db is not None:
+        on_day_end = lambda finished: _flush(finished, stats_db)
+    stats = StreamingStats(market, on_day_end=on_day_end)
+    n_since_flush = 0
+    last_flush = time.monotonic()
+    for event in events:
+        if event is not None:
+            if not stats.apply(event):
+                continue
+            n_since_flush += 1
+        due_events = flush_every_events is not None and n_since_flush >= flush_every_events
+        due_time = flush_every_seconds is not None and time.monotonic() - last_flush >= flush_every_seconds
+        if stats_db is not None and n_since_flush > 0 and (due_events or due_time):
+            _flush(stats, stats_db)
+            n_since_flush = 0
+            last_flush = time.monotonic()
+    final = stats.snapshot()
+    if stats_db is not None and not final.empty:
+        _flush(stats, stats_db, final)
+    return final
+
+
+def _flush(stats: StreamingStats, stats_db: OrderbookStatsDB, snapshot: Optional[pd.DataFrame] = None):
+    snapshot = stats.snapshot() if snapshot is None else snapshot
+    if snapshot.empty:
+        return
+    try:
+        # the batch pipeline still processes the day and replaces these rows
+        stats_db.upsert_stats_df(snapshot.assign(provisional=True))
+        logger.info(f"Flushed stats snapshot for {stats.market} on {stats.date} at seqnum {stats.last_seqnum}")
+    except Exception as e:
+        logger.exception(f"Failed to flush stats snapshot for {stats.market} on {stats.date}: {e}")
+
+
+def replay_daily_stats(orders: pd.DataFrame, market: MARKET) -> pd.DataFrame:
+    """
+    Runs the streaming accumulator over a fetched day of orderbook events, e.g. to backfill
+    stats for past days. It shares the code path of the stream, so it is not a check on it.
+    """
+    events = orders.sort_values('seqnum').astype({'seqnum': int}).to_dict(orient='records')
+    return run_stream(events, market, stats_db=None)
+
+
+def main():
+    import argparse
+    from orderbook.db.base import make_stats_db
+    from orderbook.utils import setup_logs
+    parser = argparse.ArgumentParser(description="Incremental orderbook stats from a live event stream.")
+    parser.add_argument("source", choices=["replay", "tail", "socket"])
+    parser.add_argument("path", help="Day file to replay or tail, or Unix socket path")
+    parser.add_argument("--market", default="INET_MainMarket")
+    parser.add_argument("--speed", type=float, default=None, help="Replay speed multiple, default as fast as possible")
+    parser.add_argument("--stats-backend", default="sqlite", choices=["sqlite", "parquet"])
+    parser.add_argument("--stats-path", default=None, help="Defaults to orderbook_stats.db for sqlite, orderbook_stats/ for parquet")
+    parser.add_argument("--flush-seconds", type=float, default=60.0)
+    args = parser.parse_args()
+    setup_logs()
+
+    if args.source == "replay":
+        events = replay_day_file(args.path, speed=args.speed)
+    elif args.source == "tail":
+        events = tail_file(args.path)
+    else:
+        events = unix_socket_events(args.path)
+    stats_db = make_stats_db(path=args.stats_path, backend=args.stats_backend)
+    run_stream(events, args.market, stats_db=stats_db, flush_every_seconds=args.flush_seconds)
+
+
+if __name__ == "__main__":
+    main()
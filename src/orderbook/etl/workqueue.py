@@ -0,0 +1,305 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from orderbook.MarketTypes import MARKET
+from orderbook.db.taskqueue import SqliteTaskQueue, Task
+
+logger = logging.getLogger(__name__)
+
+
+def stats_date_tasks(market: MARKET, start: datetime, end: datetime) -> List[Tuple[str, dict]]:
+    """One task per (market, date), the unit of pipeline.process_date. Dates before the dataset starts are left out."""
+    from orderbook.etl.pipeline import DATASET_START
+    if start < DATASET_START:
+        logger.warning(f"Not enqueueing dates before the start of the dataset {DATASET_START:%Y-%m-%d}")
+        start = DATASET_START
+    tasks = []
+    date = start
+    while date <= end:
+        tasks.append((f"{market}/{date:%Y-%m-%d}", {'market': market, 'date': date.strftime('%Y-%m-%d')}))
+        date += timedelta(days=1)
+    return tasks
+
+
+def xml_period_tasks(
+    start: datetime,
+    end: datetime,
+    path: str = 'xml_output',
+    backend: str = "csv",
+    tickers: Optional[List[str]] = None,
+) -> List[Tuple[str, dict]]:
+    """One task per (instrument, month), the months adhoc_pipe.convert_period converts."""
+    import pandas as pd
+    from orderbook.xmlgen.adhoc_pipe import INSTRUMENT_PATHS
+    ms = pd.date_range(start=start, end=end, freq='MS')
+    me = pd.date_range(start=start, end=end, freq='ME')
+    return [
+        (f"{ticker}/{s:%Y-%m-%d}/{e:%Y-%m-%d}",
+         {'ticker': ticker, 'start': s.strftime('%Y-%m-%d'), 'end': e.strftime('%Y-%m-%d'), 'path': path, 'backend': backend})
+        for s, e in zip(ms, me)
+        for ticker in (tickers or INSTRUMENT_PATHS)
+    ]
+
+
+def _run_stats_date(payload: dict, still_leased: Callable[[], bool]):
+    from orderbook.etl import pipeline
+    # a date whose stats failed to compute or insert must fail the task, not complete it
+    pipeline.process_date(payload['market'], datetime.strptime(payload['date'], '%Y-%m-%d'), raise_errors=True)
+
+
+def _run_xml_period(payload: dict, still_leased: Callable[[], bool]):
+    """
+    Converts into a staging folder of the task and publishes the files to the output folder
+    only while still holding the lease, once per task: a done marker, created atomically,
+    makes a reclaimed or rerun task skip its period. A worker dying while it moves the
+    files leaves the period partly published, its marker says so.
+    """
+    from orderbook.xmlgen import adhoc_pipe
+    from orderbook.xmlgen.converter import _reserve
+    path = payload['path']
+    task_dir = path.rstrip('/\\') + '_tasks'
+    task_name = f"{payload['ticker']}_{payload['start']}_{payload['end']}"
+    done_marker = os.path.join(task_dir, 'done', task_name)
+    if os.path.exists(done_marker):
+        logger.info(f"XML for {task_name} was already published, skipping")
+        return
+    # leftovers of an attempt that died are written again
+    staging = os.path.join(task_dir, 'staging', task_name) + os.sep
+    shutil.rmtree(staging, ignore_errors=True)
+    period = (datetime.strptime(payload['start'], '%Y-%m-%d'), datetime.strptime(payload['end'], '%Y-%m-%d'))
+    try:
+        adhoc_pipe._convert_period(period, path=staging, backend=payload['backend'], tickers=[payload['ticker']], publish_path=path)
+        if not still_leased():
+            logger.warning(f"Lost the lease on {task_name} before publishing, leaving it to its new worker")
+            return
+        os.makedirs(os.path.dirname(done_marker), exist_ok=True)
+        if not _reserve(done_marker):
+            logger.info(f"XML for {task_name} was published by another worker")
+            return
+        files = sorted(os.listdir(staging)) if os.path.isdir(staging) else []
+        with open(done_marker, 'w') as f:
+            f.write('publishing\n' + ''.join(name + '\n' for name in files))
+        os.makedirs(path, exist_ok=True)
+        for name in files:
+            os.replace(os.path.join(staging, name), os.path.join(path, name))
+        with open(done_marker, 'a') as f:
+            f.write('published\n')
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+# task kind -> function run by the worker with the task payload and a callable that renews
+# the lease, returning False once another worker took the task over
+HANDLERS: Dict[str, Callable[[dict, Callable[[], bool]], None]] = {
+    'stats_date': _run_stats_date,
+    'xml_period': _run_xml_period,
+}
+
+
+def _heartbeat(queue: SqliteTaskQueue, task: Task, worker_id: str, done: threading.Event):
+    while not done.wait(queue.lease_seconds / 3):
+        if not queue.heartbeat(task.id, worker_id):
+            logger.warning(f"Worker {worker_id} lost the lease on task {task.kind} {task.key}")
+            return
+
+
+def run_task(queue: SqliteTaskQueue, task: Task, worker_id: str) -> bool:
+    """Runs a claimed task while heartbeating its lease, then marks it done or failed."""
+    done = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(queue, task, worker_id, done), daemon=True)
+    heartbeat.start()
+    try:
+        logger.info(f"Worker {worker_id} running {task.kind} {task.key}, attempt {task.attempts}")
+        HANDLERS[task.kind](task.payload, lambda: queue.heartbeat(task.id, worker_id))
+    except Exception as e:
+        logger.exception(f"Task {task.kind} {task.key} failed on attempt {task.attempts}: {e}")
+        queue.fail(task.id, worker_id, traceback.format_exc(), task.attempts)
+        return False
+    finally:
+        done.set()
+        heartbeat.join()
+    if not queue.complete(task.id, worker_id):
+        logger.warning(f"Task {task.kind} {task.key} finished after its lease was taken over")
+    return True
+
+
+def run_worker(
+    queue: SqliteTaskQueue,
+    kinds: Optional[List[str]] = None,
+    worker_id: Optional[str] = None,
+    poll_interval: float = 5.0,
+    exit_when_idle: bool = False,
+    stop: Optional[threading.Event] = None,
+) -> int:
+    """
+    Claims and runs tasks until stopped.
+
+    Parameters
+    ----------
+    queue : SqliteTaskQueue
+        Shared task table.
+    kinds : List[str], optional
+        Task kinds this worker takes. Defaults to None, all kinds with a handler.
+    worker_id : str, optional
+        Lease owner name. Defaults to host:pid.
+    exit_when_idle : bool
+        Return once no task is pending or running instead of polling forever.
+
+    Returns
+    -------
+    int
+        Number of tasks completed by this worker.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    kinds = kinds or list(HANDLERS)
+    completed = 0
+    while stop is None or not stop.is_set():
+        task = queue.claim(worker_id, kinds)
+        if task is None:
+            if exit_when_idle:
+                counts = queue.counts()
+                # running tasks may still come back if their worker dies
+                if counts['pending'] == 0 and counts['running'] == 0:
+                    break
+            time.sleep(poll_interval)
+            continue
+        completed += run_task(queue, task, worker_id)
+    logger.info(f"Worker {worker_id} stopping after {completed} tasks")
+    return completed
+
+
+def _close_pipeline():
+    from orderbook.etl import pipeline
+    pipeline.close()
+
+
+def _worker_process(queue_args: dict, kinds: Optional[List[str]], poll_interval: float, exit_when_idle: bool, setup: Optional[Callable[[], None]]):
+    if setup is not None:
+        setup()
+    try:
+        run_worker(SqliteTaskQueue(**queue_args), kinds=kinds, poll_interval=poll_interval, exit_when_idle=exit_when_idle)
+    finally:
+        _close_pipeline()
+
+
+def run_local_workers(
+    queue: SqliteTaskQueue,
+    processes: int,
+    kinds: Optional[List[str]] = None,
+    poll_interval: float = 5.0,
+    exit_when_idle: bool = True,
+    setup: Optional[Callable[[], None]] = None,
+):
+    """
+    Starts worker processes on this host against the queue and waits for them. Stats tasks
+    need the sqlite stats backend here, the parquet store takes a single writer process.
+    """
+    queue_args = {'path': queue.path, 'lease_seconds': queue.lease_seconds,
+                  'max_attempts': queue.max_attempts, 'retry_backoff': queue.retry_backoff}
+    workers = [
+        multiprocessing.Process(target=_worker_process, args=(queue_args, kinds, poll_interval, exit_when_idle, setup))
+        for _ in range(processes)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
+def wait_for_queue(queue: SqliteTaskQueue, kind: Optional[str] = None, poll_interval: float = 30.0) -> Dict[str, int]:
+    """Coordinator side: logs progress until no task of the kind is pending or running."""
+    while True:
+        counts = queue.counts(kind)
+        logger.info(f"Task queue {queue.path}: {counts}")
+        if counts['pending'] == 0 and counts['running'] == 0:
+            return counts
+        time.sleep(poll_interval)
+
+
+def _configure_pipeline(source_backend: Optional[str], source_path: Optional[str], stats_backend: Optional[str], stats_path: Optional[str]):
+    from orderbook.etl import pipeline
+    overrides = {'source_backend': source_backend, 'source_path': source_path, 'stats_backend': stats_backend, 'stats_path': stats_path}
+    pipeline.configure(pipeline.PipelineConfig(**{k: v for k, v in overrides.items() if v is not None}))
+
+
+def main():
+    import argparse
+    import functools
+    from orderbook.utils import setup_logs
+    parser = argparse.ArgumentParser(description="Coordinator and workers for backfills and exports over a shared task table.")
+    parser.add_argument("--queue", default="orderbook_tasks.db", help="Task sqlite file, on a shared volume for several hosts")
+    parser.add_argument("--lease-seconds", type=float, default=300.0)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    stats = sub.add_parser("enqueue-stats", help="Enqueue (market, date) stats tasks")
+    stats.add_argument("market")
+    stats.add_argument("start", type=datetime.fromisoformat)
+    stats.add_argument("end", type=datetime.fromisoformat)
+
+    xml = sub.add_parser("enqueue-xml", help="Enqueue (instrument, month) XML export tasks")
+    xml.add_argument("start", type=datetime.fromisoformat)
+    xml.add_argument("end", type=datetime.fromisoformat)
+    xml.add_argument("--path", default="xml_output")
+    xml.add_argument("--backend", default="csv", choices=["csv", "duckdb"])
+    xml.add_argument("--tickers", nargs="*", default=None)
+
+    worker = sub.add_parser("worker", help="Run workers on this host")
+    worker.add_argument("--processes", type=int, default=1)
+    worker.add_argument("--kinds", nargs="*", default=None, choices=list(HANDLERS))
+    worker.add_argument("--poll-interval", type=float, default=5.0)
+    worker.add_argument("--exit-when-idle", action="store_true")
+    worker.add_argument("--source-backend", default=None, choices=["csv", "duckdb"])
+    worker.add_argument("--source-path", default=None)
+    worker.add_argument("--stats-backend", default=None, choices=["sqlite", "parquet"],
+                        help="parquet takes a single writer, run stats_date tasks on one worker process and host")
+    worker.add_argument("--stats-path", default=None)
+
+    sub.add_parser("status", help="Print task counts and failures")
+    sub.add_parser("wait", help="Wait until all tasks are done or failed")
+    sub.add_parser("retry-failed", help="Reset failed tasks to pending")
+    args = parser.parse_args()
+    if (args.command == "worker" and args.processes > 1 and args.stats_backend == "parquet"
+            and (args.kinds is None or 'stats_date' in args.kinds)):
+        parser.error("the parquet stats backend takes a single writer, run stats_date tasks with --processes 1 or on sqlite")
+    setup_logs()
+
+    queue = SqliteTaskQueue(args.queue, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+    if args.command == "enqueue-stats":
+        print(f"Enqueued {queue.enqueue('stats_date', stats_date_tasks(args.market, args.start, args.end))} tasks")
+    elif args.command == "enqueue-xml":
+        tasks = xml_period_tasks(args.start, args.end, path=args.path, backend=args.backend, tickers=args.tickers)
+        print(f"Enqueued {queue.enqueue('xml_period', tasks)} tasks")
+    elif args.command == "worker":
+        setup = None
+        if any(v is not None for v in (args.source_backend, args.source_path, args.stats_backend, args.stats_path)):
+            setup = functools.partial(_configure_pipeline, args.source_backend, args.source_path, args.stats_backend, args.stats_path)
+        if args.processes > 1:
+            run_local_workers(queue, args.processes, kinds=args.kinds, poll_interval=args.poll_interval,
+                              exit_when_idle=args.exit_when_idle, setup=setup)
+        else:
+            if setup is not None:
+                setup()
+            try:
+                run_worker(queue, kinds=args.kinds, poll_interval=args.poll_interval, exit_when_idle=args.exit_when_idle)
+            finally:
+                _close_pipeline()
+    elif args.command == "status":
+        print(queue.counts())
+        for kind, key, error in queue.failed():
+            print(f"failed {kind} {key}: {(error or '').strip().splitlines()[-1:]}")
+    elif args.command == "wait":
+        print(wait_for_queue(queue))
+    elif args.command == "retry-failed":
+        print(f"Reset {queue.retry_failed()} failed tasks")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
-from lxml import etree
 import hashlib
 import os
 import logging
 
+# src/schemas, next to the orderbook package, so schemas load from any working directory
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schemas")
+
 # HASH_SECRET_KEY = secrets.token_hex(16)
 # print(f"Hash secret key: {HASH_SECRET_KEY}")
 # a09bf31a8152d8b1accc73c646253dc5
@@ -17,12 +19,18 @@ def anonymize_hash(val: str) -> str:
     h.update(val.encode('utf8'))
     return h.hexdigest().upper()[:32]
 
-def check_create_master_schema():
-    if os.path.exists("schemas/master_schema.xsd"):
-        xsd_doc = etree.parse("schemas/master_schema.xsd")
+def check_create_master_schema(schema_dir: str = SCHEMA_DIR):
+    """
+    Returns the master XMLSchema. master_schema.xsd ships in schema_dir; without it the
+    master is built in memory, resolving its imports in schema_dir, and nothing is written
+    there, the package folder may be read-only.
+    """
+    from lxml import etree
+    master_path = os.path.join(schema_dir, "master_schema.xsd")
+    if os.path.exists(master_path):
+        xsd_doc = etree.parse(master_path)
         return etree.XMLSchema(xsd_doc)
 
-    os.makedirs("schemas", exist_ok=True)
     master_schema = etree.fromstring(
     """<?xml version="1.0" encoding="UTF-8"?>
     <xs:schema
@@ -39,11 +47,11 @@ def check_create_master_schema():
     <xs:include schemaLocation="head.003.001.01.xsd"/>
 
     </xs:schema>
-    """.encode('utf-8')
+    """.encode('utf-8'),
+        # relative schemaLocations resolve against the would-be file
+        base_url=master_path,
     )
-    etree.ElementTree(master_schema).write("schemas/master_schema.xsd", encoding='utf-8', xml_declaration=True, pretty_print=True)
-    xsd_doc = etree.parse("schemas/master_schema.xsd")
-    return etree.XMLSchema(xsd_doc)
+    return etree.XMLSchema(etree.ElementTree(master_schema))
 
 def setup_logs():
     logging.basicConfig(
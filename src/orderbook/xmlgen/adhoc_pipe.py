@@ -1,40 +1,55 @@
 import pandas as pd
 from datetime import datetime
+from typing import List, Optional, TYPE_CHECKING
 import time
 import concurrent.futures
 from functools import partial
 from orderbook.xmlgen.converter import split_and_write_xml
-from orderbook.db.csvreader import OrderbookCSVA
+from orderbook.db.base import make_orderbook_db
 import numpy as np
 
+if TYPE_CHECKING:
+    from orderbook.db.taskqueue import SqliteTaskQueue
 
-def _convert_period(period: tuple[datetime, datetime], path: str) -> int:
-    """Made to work on adhoc folders"""
+
+# ticker -> adhoc folder holding its files
+INSTRUMENT_PATHS = {
+    'SAB1L': "data/LT0000102253/",
+    'NTU1L': "data/LT0000131872/",
+}
+
+
+def _convert_period(period: tuple[datetime, datetime], path: str, backend: str = "csv", tickers: Optional[List[str]] = None, publish_path: Optional[str] = None) -> int:
+    """Made to work on adhoc folders. publish_path is passed to split_and_write_xml when path is a staging folder."""
     start_date, end_date = period
-    # SAB1L
-    db = OrderbookCSVA("data/LT0000102253/")
-    orders = db.fetch_filtered_orderbook_data(
-        market="INET_MainMarket",
-        start=start_date,
-        end=end_date,
-        tickers=['SAB1L'],
-    )
-    # NTU1L
-    db = OrderbookCSVA("data/LT0000131872/")
-    orders2 = db.fetch_filtered_orderbook_data(
-        market="INET_MainMarket",
-        start=start_date,
-        end=end_date,
-        tickers=['NTU1L'],
-    )
-    orders = pd.concat([orders, orders2], axis=0, ignore_index=True)
+    all_orders = []
+    for ticker in tickers or INSTRUMENT_PATHS:
+        db = make_orderbook_db(INSTRUMENT_PATHS[ticker], backend=backend)
+        try:
+            all_orders.append(db.fetch_filtered_orderbook_data(
+                market="INET_MainMarket",
+                start=start_date,
+                end=end_date,
+                tickers=[ticker],
+            ))
+        finally:
+            db.close()
+    orders = pd.concat(all_orders, axis=0, ignore_index=True)
     if orders.shape[0] > 0:
-        split_and_write_xml(orders, path=path, ver='001', cap=250000)
+        split_and_write_xml(orders, path=path, ver='001', cap=250000, publish_path=publish_path)
         return orders.shape[0]
     return 0
 
-def convert_period(start: datetime, end: datetime, path: str = 'xml_output') -> str:
-    """Create monthly XML files"""
+def convert_period(start: datetime, end: datetime, path: str = 'xml_output', backend: str = "csv", queue: Optional["SqliteTaskQueue"] = None) -> str:
+    """
+    Create monthly XML files. With a queue, (instrument, month) tasks are enqueued for
+    workers (see orderbook.etl.workqueue) instead of converted here.
+    """
+    if queue is not None:
+        from orderbook.etl.workqueue import xml_period_tasks
+        added = queue.enqueue('xml_period', xml_period_tasks(start, end, path=path, backend=backend))
+        print(f"Enqueued {added} instrument month conversions to {queue.path}.")
+        return
     ms = pd.date_range(start=start, end=end, freq='MS')
     me = pd.date_range(start=start, end=end, freq='ME')
     start_ts = time.time()
@@ -43,7 +58,7 @@ def convert_period(start: datetime, end: datetime, path: str = 'xml_output') ->
     chunksize = max(1, int(np.ceil(date_idx.shape[0] / n_threads)))
     print(f"Using {n_threads} threads with chunksize {1} for processing {date_idx.shape[0]} dates.")
     with concurrent.futures.ProcessPoolExecutor(max_workers=n_threads) as executor:
-        res = executor.map(partial(_convert_period, path=path), zip(ms, me), chunksize=1)
+        res = executor.map(partial(_convert_period, path=path, backend=backend), zip(ms, me), chunksize=1)
         res = [r for r in res if r is not None]
 
     end_ts = time.time()
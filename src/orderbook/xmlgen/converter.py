@@ -1,12 +1,16 @@
 from lxml import etree
 import zipfile
+import concurrent.futures
+from collections import deque
 import secrets
-import numpy as np
-from typing import Optional
+import functools
+from typing import List, Optional
 from datetime import datetime, timezone
 import pandas as pd
 import os
 from orderbook.utils import anonymize_hash, check_create_master_schema
+from orderbook.xmlgen.prevalidate import split_valid_orders
+from orderbook.xmlgen.splitting import ALIGN, plan_splits
 QName = etree.QName
 
 
@@ -28,7 +32,12 @@ ENCRYPT_PARAMS = {
     "nonexecutingbroker": True,
 }
 
-MASTER_SCHEMA = check_create_master_schema()
+
+@functools.lru_cache(maxsize=None)
+def get_master_schema() -> etree.XMLSchema:
+    """Compiles the master XSD on first use, once per process."""
+    return check_create_master_schema()
+
 
 def create_orderbook_xml(orders: pd.DataFrame) -> etree.ElementTree:
     assert orders.shape[0] > 1, "Orders DataFrame must contain more than one row to create an XML document."
@@ -226,16 +235,16 @@ def create_orderbook_xml(orders: pd.DataFrame) -> etree.ElementTree:
             lmt_price_mntry_val = etree.SubElement(lmt_price, QName(BOOK_NAMESPACE, "MntryVal"))
             lmt_price_mntry_val_amt = etree.SubElement(lmt_price_mntry_val, QName(BOOK_NAMESPACE, "Amt"), Ccy="EUR")
             lmt_price_mntry_val_amt.text = order['limitprice']
-        if order['additionallimitprice'] != 'nan':
-            additional_lmt_price = etree.SubElement(order_price, QName(BOOK_NAMESPACE, "AddtlLmtPric"))
-            additional_lmt_price_mntry_val = etree.SubElement(additional_lmt_price, QName(BOOK_NAMESPACE, "MntryVal"))
-            additional_lmt_price_amt = etree.SubElement(additional_lmt_price_mntry_val, QName(BOOK_NAMESPACE, "Amt"), Ccy="EUR")
-            additional_lmt_price_amt.text = order['additionallimitprice']
         if order['stopprice'] != 'nan':
             stop_price = etree.SubElement(order_price, QName(BOOK_NAMESPACE, "StopPric"))
             stop_price_mntry_val = etree.SubElement(stop_price, QName(BOOK_NAMESPACE, "MntryVal"))
             stop_price_mntry_val_amt = etree.SubElement(stop_price_mntry_val, QName(BOOK_NAMESPACE, "Amt"), Ccy="EUR")
             stop_price_mntry_val_amt.text = order['stopprice']
+        if order['additionallimitprice'] != 'nan':
+            additional_lmt_price = etree.SubElement(order_price, QName(BOOK_NAMESPACE, "AddtlLmtPric"))
+            additional_lmt_price_mntry_val = etree.SubElement(additional_lmt_price, QName(BOOK_NAMESPACE, "MntryVal"))
+            additional_lmt_price_amt = etree.SubElement(additional_lmt_price_mntry_val, QName(BOOK_NAMESPACE, "Amt"), Ccy="EUR")
+            additional_lmt_price_amt.text = order['additionallimitprice']
         if order['peggedlimitprice'] != 'nan':
             pegged_limit_price = etree.SubElement(order_price, QName(BOOK_NAMESPACE, "PggdPric"))
             pegged_limit_price_mntry_val = etree.SubElement(pegged_limit_price, QName(BOOK_NAMESPACE, "MntryVal"))
@@ -274,9 +283,11 @@ def create_orderbook_xml(orders: pd.DataFrame) -> etree.ElementTree:
         if order['minimumexecutablesize'] != 'nan':
             min_executable = etree.SubElement(instr_data, QName(BOOK_NAMESPACE, "MinExctbl"))
             min_executable_sz = etree.SubElement(min_executable, QName(BOOK_NAMESPACE, "Sz"))
-            min_executable_sz.text = order['minimumexecutablesize']
-            min_executable_frst_only = etree.SubElement(min_executable_sz, QName(BOOK_NAMESPACE, "FrstExctnOnly"))
-            min_executable_frst_only.text = order['mesfirstexeconly']
+            min_executable_sz_unit = etree.SubElement(min_executable_sz, QName(BOOK_NAMESPACE, "Unit"))
+            min_executable_sz_unit.text = order['minimumexecutablesize']
+            if order['mesfirstexeconly'] != 'nan':
+                min_executable_frst_only = etree.SubElement(min_executable, QName(BOOK_NAMESPACE, "FrstExctnOnly"))
+                min_executable_frst_only.text = order['mesfirstexeconly'].lower()
         if order['passiveonly'] != 'nan':
             passive_only = etree.SubElement(instr_data, QName(BOOK_NAMESPACE, "PssvOnlyInd"))
             passive_only.text = order['passiveonly'].lower()
@@ -314,22 +325,100 @@ def validate_schema(xml_element: etree.ElementBase) -> bool:
     bool
         True if the XML element is valid according to the master schema, False otherwise.
     """
-    schema_valid = MASTER_SCHEMA.validate(xml_element)
+    master_schema = get_master_schema()
+    schema_valid = master_schema.validate(xml_element)
     if not schema_valid:
         print("XML is not valid according to the master schema.")
-        for error in MASTER_SCHEMA.error_log:
+        for error in master_schema.error_log:
             print(f"Error: {error.message} at line {error.line}, column {error.column}")
     return schema_valid
 
 
+def _serialize_xml(orders: pd.DataFrame) -> bytes:
+    """Serializes orders the way split_and_write_xml writes them, used to calibrate split sizes."""
+    return etree.tostring(create_orderbook_xml(orders), encoding='utf-8', xml_declaration=True, pretty_print=True)
+
+
+def _write_zip(xml_tree: etree.ElementBase, zip_path: str, xml_name: str, compress_level: Optional[int] = None):
+    """
+    Serializes the tree straight into a deflated zip member. The zip is written under a
+    temporary name and renamed once complete, so a failed write leaves no file behind.
+    """
+    tmp_path = zip_path + '.tmp'
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=compress_level) as zipf:
+            with zipf.open(xml_name, 'w') as xml_file:
+                etree.ElementTree(xml_tree).write(xml_file, encoding='utf-8', xml_declaration=True, pretty_print=True)
+        os.replace(tmp_path, zip_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _reserve(fname: str) -> bool:
+    """Creates the file if it doesn't exist yet. Atomic, so concurrent writers never claim the same name."""
+    try:
+        os.close(os.open(fname, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _reserve_number(folder: str) -> int:
+    """
+    Reserves the next document number of a folder by creating its marker file in
+    ``<folder>_numbers``, kept outside the folder. Atomic, so concurrent exports never get
+    the same number, and a number is not handed out again when its file failed to be written.
+    """
+    numbers_path = folder.rstrip('/\\') + '_numbers'
+    os.makedirs(numbers_path, exist_ok=True)
+    # a starting guess; folders numbered before the markers existed hold a file per number
+    number = len(os.listdir(numbers_path))
+    if os.path.isdir(folder):
+        number = max(number, len(os.listdir(folder)))
+    while True:
+        number += 1
+        if _reserve(os.path.join(numbers_path, str(number).zfill(6))):
+            return number
+
+
+def _wait_written(write: tuple[concurrent.futures.Future, str, int]) -> str:
+    """Waits for a submitted write, re-raising its error, and returns the zip path."""
+    future, zip_path, n_orders = write
+    future.result()
+    print(f"Written XML file: {os.path.basename(zip_path)[:-4]} with {n_orders} orders.")
+    return zip_path
+
+
 def split_and_write_xml(
         orders: pd.DataFrame, 
         path: Optional[str] = None,
         ver: Optional[str] = "001", 
         cap: Optional[int] = 250000, 
-    ) -> str:
+        prevalidate: bool = True,
+        max_bytes: Optional[int] = None,
+        compressed: bool = False,
+        align: Optional[ALIGN] = None,
+        compress_level: Optional[int] = None,
+        writers: int = 1,
+        publish_path: Optional[str] = None,
+    ) -> Optional[List[str]]:
     """
     Splits the orders DataFrame into smaller chunks and writes each chunk to an XML file.
+    Returns the paths of the written zip files in split order, None if none was written.
+    With prevalidate, rows failing the schema value domains are written to a quarantine
+    csv in ``<path>_quarantine`` and left out of the XML instead of failing a whole split.
+    With max_bytes, files are sized by estimated XML bytes (zip bytes if compressed) instead
+    of cap rows alone; align keeps whole days or instruments in one file where they fit.
+    Serialization and deflate (compress_level 0-9, None for the zlib default) run on
+    ``writers`` threads while the next split is built; at most ``writers`` finished splits
+    wait for a writer. writers=0 writes on the calling thread. A failed write is raised once
+    the splits before it are written.
+
+    Document numbers are reserved per folder, so exports writing to the same folder at the
+    same time never share one. An export writing to a staging ``path`` passes the folder the
+    files are published to as ``publish_path``, it is numbered and quarantined there.
     """
     
     if path is None:
@@ -338,28 +427,60 @@ def split_and_write_xml(
     if not os.path.exists(path):
         os.makedirs(path)
 
+    now_dt = datetime.now(timezone.utc).strftime("%y%m%d")
+    if prevalidate:
+        orders, quarantined, violations = split_valid_orders(orders, encrypt_params=ENCRYPT_PARAMS)
+        if quarantined.shape[0] > 0:
+            # kept outside the output folder, its file count drives the report numbering
+            quarantine_path = (publish_path or path).rstrip('/\\') + '_quarantine'
+            os.makedirs(quarantine_path, exist_ok=True)
+            QUARANTINE_FNAME = f"QUARANTINE_XLIT-{now_dt}-{ver}_{str(_reserve_number(quarantine_path)).zfill(6)}.csv"
+            q_file = os.path.join(quarantine_path, QUARANTINE_FNAME)
+            quarantined.to_csv(q_file + '.tmp', index_label='index')
+            os.replace(q_file + '.tmp', q_file)
+            print(f"Quarantined {quarantined.shape[0]} orders failing schema pre-validation to {QUARANTINE_FNAME}:")
+            print(violations.groupby(['column', 'rule']).size().to_string())
+        if orders.shape[0] < 2:
+            print("Not enough valid orders left to write XML.")
+            return None
+
     start_dt, end_dt = pd.to_datetime(orders['dateandtime']).aggregate(lambda x: [x.min(), x.max()])
     start_dt_fmt = start_dt.strftime("%Y%m%d")
     end_dt_fmt = end_dt.strftime("%Y%m%d")
-    now_dt = datetime.now(timezone.utc).strftime("%y%m%d")
 
-    n_splits = int(np.ceil(orders.shape[0] / cap))
-    splits_idxs = np.array_split(orders.index, n_splits)
-    for i, s_idx in enumerate(splits_idxs, start=1):
-        subset_orders = orders.loc[s_idx]
-        xml_tree = create_orderbook_xml(subset_orders)
-        schema_valid = validate_schema(xml_tree)
-        if not schema_valid:
-            print(f"XML is not valid against the schema for split {i}. Skipping writing to file. {end_dt_fmt}")
-            continue
-        # <Sender>_<FileType>_XESMA_<Key1>_<Key2>_<Document ID>_<Year>
-        incr = len(os.listdir(path))  # Ensure the path exists
-        OUT_FNAME = f"NCALT_DATORD_XESMA_XLIT-{end_dt_fmt}-{now_dt}-{ver}_{str(i).zfill(2)}Z{str(n_splits).zfill(2)}_{str(incr+1).zfill(6)}_{now_dt[:2]}"
-        with zipfile.ZipFile(f"{path}" + OUT_FNAME + '.zip', 'w', zipfile.ZIP_DEFLATED) as zipf:
-            with zipf.open(OUT_FNAME + ".xml", 'w') as xml_file:
-                etree.ElementTree(xml_tree).write(xml_file, encoding='utf-8', xml_declaration=True, pretty_print=True)
-        print(f"Written XML file: {OUT_FNAME} with {subset_orders.shape[0]} orders.")
-    return OUT_FNAME
+    splits_idxs = plan_splits(
+        orders, cap=cap, max_bytes=max_bytes, compressed=compressed, align=align,
+        encrypt_params=ENCRYPT_PARAMS, build_xml=_serialize_xml, compress_level=compress_level,
+    )
+    n_splits = len(splits_idxs)
+    pending = deque()
+    written = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(writers, 1), thread_name_prefix='xml-writer') as executor:
+        for i, s_idx in enumerate(splits_idxs, start=1):
+            subset_orders = orders.loc[s_idx]
+            xml_tree = create_orderbook_xml(subset_orders)
+            schema_valid = validate_schema(xml_tree)
+            if not schema_valid:
+                print(f"XML is not valid against the schema for split {i}. Skipping writing to file. {end_dt_fmt}")
+                continue
+            # <Sender>_<FileType>_XESMA_<Key1>_<Key2>_<Document ID>_<Year>
+            incr = _reserve_number(publish_path or path)
+            OUT_FNAME = f"NCALT_DATORD_XESMA_XLIT-{end_dt_fmt}-{now_dt}-{ver}_{str(i).zfill(2)}Z{str(n_splits).zfill(2)}_{str(incr).zfill(6)}_{now_dt[:2]}"
+            zip_path = f"{path}" + OUT_FNAME + '.zip'
+            if writers == 0:
+                _write_zip(xml_tree, zip_path, OUT_FNAME + ".xml", compress_level)
+                print(f"Written XML file: {OUT_FNAME} with {subset_orders.shape[0]} orders.")
+                written.append(zip_path)
+                continue
+            # bounded buffer, wait for the oldest write before building more trees
+            while len(pending) >= writers:
+                written.append(_wait_written(pending.popleft()))
+            future = executor.submit(_write_zip, xml_tree, zip_path, OUT_FNAME + ".xml", compress_level)
+            pending.append((future, zip_path, subset_orders.shape[0]))
+            del xml_tree
+        while pending:
+            written.append(_wait_written(pending.popleft()))
+    return written or None
 
 
 
@@ -0,0 +1,228 @@
+"""
+Vectorized checks of orders against the value domains of auth.anonym.113.001.01.xsd,
+run per column before any XML is built, so that bad rows can be reported and quarantined
+instead of failing schema validation of a whole split.
+
+Rules follow how converter.create_orderbook_xml maps columns to elements: columns always
+written to the XML are required, optional ones are only checked when present.
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+ORDER_EVENT_CODES = ['CAME', 'CAMO', 'CHME', 'CHMO', 'EXPI', 'FILL', 'NEWO', 'PARF', 'REMA', 'REMO', 'REMH', 'REME', 'TRIG', 'RFQS', 'RFQR']
+VALIDITY_PERIOD_CODES = ['FOKV', 'GADV', 'GASV', 'GATV', 'DAVY', 'GTCV', 'GTDV', 'GTSV', 'GTTV', 'IOCV']
+TRADING_CAPACITY_CODES = ['MTCH', 'DEAL', 'AOTC']
+ORDER_TYPE_CODES = ['LMTO', 'STOP']
+SIDE_CODES = ['BUYI', 'SELL']
+PASSIVE_AGGRESSIVE_CODES = ['AGRE', 'PASV']
+BOOLEAN_VALUES = ['true', 'false', '1', '0']
+
+ISIN_PATTERN = r'[A-Z]{2}[A-Z0-9]{9}[0-9]'
+ISO_DATE_PATTERN = r'\d{4}-\d{2}-\d{2}(?:Z|[+-]\d{2}:\d{2})?'
+ISO_DATETIME_PATTERN = r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:\d{2})?'
+EXACT4_ALNUM_PATTERN = r'[a-zA-Z0-9]{4}'
+DECIMAL_PATTERN = r'([+-]?)0*(\d*)(?:\.(\d*?)0*)?'
+
+
+def _missing(s: pd.Series) -> pd.Series:
+    """
+    Missing as the converter sees it after astype(str): only NaN, which becomes 'nan'.
+    None becomes the text 'None' and is written to the XML, so it is checked as a value.
+    """
+    return s.astype(str) == 'nan'
+
+
+def _pattern_invalid(pattern: str) -> Callable[[pd.Series], pd.Series]:
+    return lambda s: ~s.astype(str).str.fullmatch(pattern)
+
+
+def _date_invalid(s: pd.Series) -> pd.Series:
+    """ISODate: the pattern, and a real calendar date once the optional zone is dropped."""
+    s = s.astype(str)
+    parsed = pd.to_datetime(s.str[:10], format='%Y-%m-%d', errors='coerce')
+    return _pattern_invalid(ISO_DATE_PATTERN)(s) | parsed.isna()
+
+
+def _datetime_invalid(s: pd.Series) -> pd.Series:
+    """ISODateTime: the pattern, and date and time fields in range, e.g. no month 13 or hour 99."""
+    s = s.astype(str)
+    invalid = _pattern_invalid(ISO_DATETIME_PATTERN)(s)
+    # values failing the pattern aren't parsed, mixed zones are compared in UTC
+    parsed = pd.to_datetime(s.where(~invalid), format='ISO8601', utc=True, errors='coerce')
+    return invalid | parsed.isna()
+
+
+def _codes_invalid(codes: List[str], lower: bool = False) -> Callable[[pd.Series], pd.Series]:
+    def check(s: pd.Series) -> pd.Series:
+        s = s.astype(str)
+        return ~(s.str.lower() if lower else s).isin(codes)
+    return check
+
+
+def _length_invalid(max_length: int, min_length: int = 1) -> Callable[[pd.Series], pd.Series]:
+    def check(s: pd.Series) -> pd.Series:
+        lengths = s.astype(str).str.len()
+        return (lengths < min_length) | (lengths > max_length)
+    return check
+
+
+def _decimal_invalid(fraction_digits: int, total_digits: int, min_inclusive: Optional[float] = None) -> Callable[[pd.Series], pd.Series]:
+    """xs:decimal with fractionDigits, totalDigits and optional minInclusive facets."""
+    def check(s: pd.Series) -> pd.Series:
+        s = s.astype(str)
+        parts = s.str.fullmatch(DECIMAL_PATTERN)
+        extracted = s.str.extract(f'^{DECIMAL_PATTERN}$')
+        int_digits = extracted[1].fillna('').str.len()
+        frac_digits = extracted[2].fillna('').str.len()
+        has_digits = s.str.contains(r'\d', regex=True)
+        invalid = ~(parts & has_digits)
+        invalid |= frac_digits > fraction_digits
+        invalid |= (int_digits + frac_digits) > total_digits
+        if min_inclusive is not None:
+            invalid |= pd.to_numeric(s, errors='coerce').lt(min_inclusive).fillna(False).astype(bool)
+        return invalid
+    return check
+
+
+@dataclass
+class ColumnRule:
+    """A value domain check on one column.
+
+    Attributes
+    ----------
+    column : str
+        Orders DataFrame column.
+    name : str
+        Rule name reported for violations.
+    invalid : Callable
+        Vectorized check returning True for invalid values. Only called on present values.
+    required : bool
+        Missing values are violations if True, otherwise skipped.
+    when : Callable, optional
+        Vectorized row filter on the whole frame, the rule applies only where True.
+    """
+    column: str
+    name: str
+    invalid: Callable[[pd.Series], pd.Series]
+    required: bool = False
+    when: Optional[Callable[[pd.DataFrame], pd.Series]] = field(default=None)
+
+
+AMOUNT_13 = _decimal_invalid(13, 18, 0)
+AMOUNT_5 = _decimal_invalid(5, 18, 0)
+DECIMAL_NUMBER = _decimal_invalid(17, 18)
+
+ORDER_RULES: List[ColumnRule] = [
+    ColumnRule('orderbookcode', 'Max20Text', _length_invalid(20), required=True),
+    ColumnRule('seqnum', 'Max50PositiveNumber', _length_invalid(50), required=True),
+    ColumnRule('prioritytimestamp', 'ISODateTime', _datetime_invalid),
+    ColumnRule('dateandtime', 'ISODateTime', _datetime_invalid, required=True),
+    ColumnRule('financialinstrumentidcode', 'ISINOct2015Identifier', _pattern_invalid(ISIN_PATTERN), required=True),
+    ColumnRule('orderidcode', 'Max50Text', _length_invalid(50), required=True),
+    ColumnRule('dateofreceipt', 'ISODate', _date_invalid, required=True),
+    ColumnRule('validityperiod', 'ValidityPeriodType1Code', _codes_invalid(VALIDITY_PERIOD_CODES), required=True),
+    ColumnRule('validityperiodandtime', 'ISODateTime', _datetime_invalid),
+    ColumnRule('orderevent', 'OrderEventType1Code or Exact4AlphaNumericText',
+               lambda s: ~s.astype(str).isin(ORDER_EVENT_CODES) & _pattern_invalid(EXACT4_ALNUM_PATTERN)(s), required=True),
+    ColumnRule('tradingphases', 'Max50Text', _length_invalid(50)),
+    ColumnRule('indicativeauctionprice', 'ActiveCurrencyAndAmount', AMOUNT_5),
+    ColumnRule('indicativeauctionvolume', 'DecimalNumber', DECIMAL_NUMBER),
+    ColumnRule('dea', 'TrueFalseIndicator', _codes_invalid(BOOLEAN_VALUES, lower=True), required=True),
+    # written as LEI for 20 chars, otherwise as a person id, both Max140Text in the schema
+    ColumnRule('clientidcode', 'Max140Text', _length_invalid(140), required=True),
+    ColumnRule('investmentdecisionwithinfirm', 'Max140Text', _length_invalid(140)),
+    ColumnRule('execwithinfirm', 'Max140Text', _length_invalid(140)),
+    ColumnRule('nonexecutingbroker', 'Max140Text', _length_invalid(140)),
+    ColumnRule('tradingcapacity', 'RegulatoryTradingCapacity1Code', _codes_invalid(TRADING_CAPACITY_CODES), required=True),
+    ColumnRule('liquidityprovisionactivity', 'TrueFalseIndicator', _codes_invalid(BOOLEAN_VALUES, lower=True), required=True),
+    ColumnRule('ordertype', 'Max50Text', _length_invalid(50), required=True),
+    ColumnRule('ordertypeclass', 'OrderType3Code', _codes_invalid(ORDER_TYPE_CODES), required=True),
+    ColumnRule('limitprice', 'ActiveCurrencyAnd13DecimalAmount', AMOUNT_13),
+    ColumnRule('additionallimitprice', 'ActiveCurrencyAnd13DecimalAmount', AMOUNT_13),
+    ColumnRule('stopprice', 'ActiveCurrencyAnd13DecimalAmount', AMOUNT_13),
+    ColumnRule('peggedlimitprice', 'ActiveCurrencyAnd13DecimalAmount', AMOUNT_13),
+    ColumnRule('buysellind', 'Side6Code', _codes_invalid(SIDE_CODES), required=True),
+    ColumnRule('initialqty', 'DecimalNumber', DECIMAL_NUMBER, required=True),
+    ColumnRule('remainingqtyinclhidden', 'DecimalNumber', DECIMAL_NUMBER, required=True),
+    ColumnRule('displayedqty', 'DecimalNumber', DECIMAL_NUMBER),
+    ColumnRule('minacceptableqty', 'DecimalNumber', DECIMAL_NUMBER),
+    ColumnRule('minimumexecutablesize', 'DecimalNumber', DECIMAL_NUMBER),
+    ColumnRule('mesfirstexeconly', 'TrueFalseIndicator', _codes_invalid(BOOLEAN_VALUES, lower=True),
+               when=lambda df: ~_missing(df['minimumexecutablesize'])),
+    ColumnRule('passiveonly', 'TrueFalseIndicator', _codes_invalid(BOOLEAN_VALUES, lower=True)),
+    ColumnRule('selfexecutionprevention', 'TrueFalseIndicator', _codes_invalid(BOOLEAN_VALUES), required=True,
+               when=lambda df: ~_missing(df['strategylinkedorderid'])),
+    ColumnRule('tradedquantity', 'DecimalNumber', DECIMAL_NUMBER, required=True),
+    ColumnRule('transactionprice', 'ActiveCurrencyAnd13DecimalAmount', AMOUNT_13, required=True,
+               when=lambda df: df['tradedquantity'].astype(str) != '0'),
+    ColumnRule('passiveoraggressive', 'PassiveOrAgressiveType1Code', _codes_invalid(PASSIVE_AGGRESSIVE_CODES),
+               when=lambda df: df['tradedquantity'].astype(str) != '0'),
+]
+
+
+def validate_orders(
+    orders: pd.DataFrame,
+    rules: Optional[List[ColumnRule]] = None,
+    encrypt_params: Optional[Dict[str, bool]] = None,
+) -> pd.DataFrame:
+    """
+    Checks orders column by column against the reporting schema value domains.
+
+    Parameters
+    ----------
+    orders : pd.DataFrame
+        Orders as passed to split_and_write_xml.
+    rules : List[ColumnRule], optional
+        Rules to apply. Defaults to ORDER_RULES.
+    encrypt_params : Dict[str, bool], optional
+        Columns replaced by a fixed length hash in the XML; only their presence is checked.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per violation with columns 'index', 'column', 'rule' and 'value'. Empty if all rows are valid.
+    """
+    rules = ORDER_RULES if rules is None else rules
+    encrypt_params = encrypt_params or {}
+    violations = []
+    for rule in rules:
+        if rule.column not in orders.columns:
+            if rule.required:
+                violations.append(pd.DataFrame({'index': orders.index, 'column': rule.column, 'rule': 'required', 'value': None}))
+            continue
+        s = orders[rule.column]
+        applies = np.ones(len(s), dtype=bool) if rule.when is None else np.asarray(rule.when(orders), dtype=bool)
+        missing = np.asarray(_missing(s), dtype=bool)
+        bad_missing = applies & missing if rule.required else np.zeros(len(s), dtype=bool)
+        present = applies & ~missing
+        bad_value = np.zeros(len(s), dtype=bool)
+        if present.any() and not encrypt_params.get(rule.column, False):
+            bad_value[present] = np.asarray(rule.invalid(s[present]), dtype=bool)
+        if bad_missing.any():
+            violations.append(pd.DataFrame({'index': orders.index[bad_missing], 'column': rule.column, 'rule': 'required', 'value': None}))
+        if bad_value.any():
+            violations.append(pd.DataFrame({'index': orders.index[bad_value], 'column': rule.column, 'rule': rule.name,
+                                            'value': s[bad_value].astype(str).values}))
+    if not violations:
+        return pd.DataFrame(columns=['index', 'column', 'rule', 'value'])
+    return pd.concat(violations, ignore_index=True).sort_values('index', kind='stable', ignore_index=True)
+
+
+def split_valid_orders(
+    orders: pd.DataFrame,
+    encrypt_params: Optional[Dict[str, bool]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Returns (valid orders, quarantined orders, violations). Quarantined rows carry
+    a 'violations' column listing the failed rules.
+    """
+    violations = validate_orders(orders, encrypt_params=encrypt_params)
+    if violations.empty:
+        return orders, orders.iloc[0:0], violations
+    bad_idx = violations['index'].unique()
+    reasons = (violations['column'] + ':' + violations['rule']).groupby(violations['index']).agg('; '.join)
+    quarantined = orders.loc[bad_idx].copy()
+    quarantined['violations'] = reasons.reindex(quarantined.index).values
+    return orders.drop(index=bad_idx), quarantined, violations
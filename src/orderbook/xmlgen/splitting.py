@@ -0,0 +1,405 @@
+"""
+Plans XML report splits by estimated serialized size instead of a fixed row count.
+
+Per-order bytes are estimated from the prepared columns: value lengths plus the tag and
+indentation overhead of every element create_orderbook_xml emits for that row. The estimate
+can be calibrated against a real serialization of a small sample, which also gives the
+deflate ratio used for compressed budgets and the bytes of the report envelope around the
+orders. The envelope, one ISIN line per instrument and, for compressed budgets, the zip
+container are held back from every file's budget.
+"""
+import zlib
+from typing import Callable, Dict, List, Literal, Optional
+import numpy as np
+import pandas as pd
+
+ALIGN = Literal['day', 'instrument']
+
+# create_orderbook_xml nests order fields under BizData/Pyld/Document/OrdrBookRpt/OrdrRpt/New/Ordr
+ORDR_DEPTH = 6
+# and lists the file's instruments under BizData/Pyld/Document/OrdrBookRpt/RptHdr/ISIN
+ISIN_DEPTH = 5
+INDENT = 2
+HASH_LENGTH = 32
+# estimates are within a few tenths of a percent, keep some room under max_bytes
+SIZE_HEADROOM = 0.98
+# zip local header, central directory entry and end record, with the ~80 char member name twice
+ZIP_OVERHEAD = 30 + 46 + 22 + 2 * 80
+
+
+def _leaf(depth: int, name: str, attrs: str = '') -> int:
+    """Bytes of an indented leaf element line, excluding its text."""
+    return INDENT * depth + len(f"<{name}{attrs}>") + len(f"</{name}>") + 1
+
+
+def _wrap(depth: int, *names: str) -> int:
+    """Bytes of the open and close lines of nested wrapper elements starting at depth."""
+    return sum(2 * INDENT * (depth + i) + 2 * len(name) + 7 for i, name in enumerate(names))
+
+
+def _amount(depth: int, wrapper: str) -> int:
+    """<wrapper><MntryVal><Amt Ccy="EUR">...</Amt></MntryVal></wrapper>"""
+    return _wrap(depth, wrapper, 'MntryVal') + _leaf(depth + 2, 'Amt', ' Ccy="EUR"')
+
+
+def _unit(depth: int, wrapper: str) -> int:
+    return _wrap(depth, wrapper) + _leaf(depth + 1, 'Unit')
+
+
+D_ID = ORDR_DEPTH + 2  # children of OrdrIdData, AuctnData, OrdrData
+D_INSTR = D_ID + 1     # children of OrdrPrics and InstrData
+
+# overhead of elements written for every order, text excluded
+FIXED_OVERHEAD = (
+    _wrap(ORDR_DEPTH, 'Ordr')
+    + _wrap(ORDR_DEPTH + 1, 'OrdrIdData')
+    + _leaf(D_ID, 'OrdrBookId') + _leaf(D_ID, 'SeqNb') + _leaf(D_ID, 'TmStmp') + _leaf(D_ID, 'TradVn') + len('XLIT')
+    + _wrap(D_ID, 'FinInstrm') + _leaf(D_ID + 1, 'Id')
+    + _leaf(D_ID, 'OrdrId') + _leaf(D_ID, 'DtOfRct')
+    + _wrap(D_ID, 'VldtyPrd') + _leaf(D_ID + 1, 'VldtyPrdCd')
+    + _wrap(D_ID, 'EvtTp')
+    + _wrap(ORDR_DEPTH + 1, 'AuctnData') + _leaf(D_ID, 'TradgPhs')
+    + _wrap(ORDR_DEPTH + 1, 'OrdrData')
+    + _leaf(D_ID, 'SubmitgNtty') + len('XLIT') + _leaf(D_ID, 'DrctElctrncAccs')
+    + _wrap(D_ID, 'ClntId')
+    + _leaf(D_ID, 'TradgCpcty') + _leaf(D_ID, 'LqdtyPrvsnActvty')
+    + _wrap(D_ID, 'OrdrClssfctn') + _leaf(D_INSTR, 'OrdrTp') + _leaf(D_INSTR, 'OrdrTpClssfctn')
+    + _wrap(D_ID, 'OrdrPrics')
+    + _wrap(D_ID, 'InstrData') + _leaf(D_INSTR, 'BuySellInd')
+    + _unit(D_INSTR, 'InitlQty') + _unit(D_INSTR, 'RmngQty')
+)
+
+# text columns of always present elements
+FIXED_TEXT_COLS = [
+    'orderbookcode', 'seqnum', 'dateandtime', 'financialinstrumentidcode', 'orderidcode', 'dateofreceipt',
+    'validityperiod', 'tradingphases', 'dea', 'tradingcapacity', 'liquidityprovisionactivity', 'ordertype',
+    'ordertypeclass', 'buysellind', 'initialqty', 'remainingqtyinclhidden',
+]
+
+# column -> overhead when the optional element is present; text length is added separately
+OPTIONAL_OVERHEAD: Dict[str, int] = {
+    'prioritytimestamp': _wrap(D_ID, 'Prty') + _leaf(D_ID + 1, 'TmStmp'),
+    'validityperiodandtime': _leaf(D_ID, 'VldtyDtTm'),
+    'indicativeauctionprice': _amount(D_ID, 'IndctvAuctnPric'),
+    'indicativeauctionvolume': _unit(D_ID, 'IndctvAuctnVol'),
+    'investmentdecisionwithinfirm': _wrap(D_ID, 'InvstmtDcsnPrsn', 'Prsn') + _leaf(D_ID + 2, 'Id'),
+    'nonexecutingbroker': _leaf(D_ID, 'NonExctgBrkr'),
+    'limitprice': _amount(D_INSTR, 'LmtPric'),
+    'additionallimitprice': _amount(D_INSTR, 'AddtlLmtPric'),
+    'stopprice': _amount(D_INSTR, 'StopPric'),
+    'peggedlimitprice': _amount(D_INSTR, 'PggdPric'),
+    'displayedqty': _unit(D_INSTR, 'DispdQty'),
+    'minacceptableqty': _unit(D_INSTR, 'MinAccptblQty'),
+    'minimumexecutablesize': _wrap(D_INSTR, 'MinExctbl') + _unit(D_INSTR + 1, 'Sz'),
+    'passiveonly': _leaf(D_INSTR, 'PssvOnlyInd'),
+}
+
+EVENT_CODES = ['CAME', 'CAMO', 'CHME', 'CHMO', 'EXPI', 'FILL', 'NEWO', 'PARF', 'REMA', 'REMO', 'REMH', 'REME', 'TRIG', 'RFQS', 'RFQR']
+STATUS_LEAF = _leaf(D_INSTR, 'OrdrSts') + 4
+VALIDITY_STATUS_LEAF = _leaf(D_INSTR, 'OrdrVldtySts') + 4
+
+
+def estimate_order_bytes(orders: pd.DataFrame, encrypt_params: Optional[Dict[str, bool]] = None) -> np.ndarray:
+    """
+    Estimates uncompressed pretty-printed XML bytes of every order, vectorized over columns.
+
+    Parameters
+    ----------
+    orders : pd.DataFrame
+        Orders as passed to split_and_write_xml.
+    encrypt_params : Dict[str, bool], optional
+        Columns written as a fixed length hash.
+
+    Returns
+    -------
+    np.ndarray
+        Estimated bytes per order, aligned with orders rows.
+    """
+    encrypt_params = encrypt_params or {}
+    text = orders.astype(str)
+
+    def text_len(col: str) -> np.ndarray:
+        if encrypt_params.get(col, False):
+            return np.full(len(text), HASH_LENGTH)
+        return text[col].str.len().to_numpy()
+
+    def present(col: str) -> np.ndarray:
+        return (text[col] != 'nan').to_numpy()
+
+    est = np.full(len(orders), FIXED_OVERHEAD, dtype=np.int64)
+    for col in FIXED_TEXT_COLS:
+        est += text_len(col)
+
+    for col, overhead in OPTIONAL_OVERHEAD.items():
+        mask = present(col)
+        est += np.where(mask, overhead + text_len(col), 0)
+    # MinExctbl also carries mesfirstexeconly when present
+    first_only = present('minimumexecutablesize') & present('mesfirstexeconly')
+    est += np.where(first_only, _leaf(D_INSTR + 1, 'FrstExctnOnly') + text['mesfirstexeconly'].str.len().to_numpy(), 0)
+
+    # event type is a code or a proprietary id with issuer
+    is_code = text['orderevent'].isin(EVENT_CODES).to_numpy()
+    est += np.where(is_code, _leaf(D_ID + 1, 'Cd'),
+                    _wrap(D_ID + 1, 'Prtry') + _leaf(D_ID + 2, 'Id') + _leaf(D_ID + 2, 'Issr') + len('XLIT'))
+
+    # client id is a LEI for 20 char codes, otherwise a person id
+    is_lei = (text['clientidcode'].str.len() == 20).to_numpy()
+    est += text_len('clientidcode')
+    est += np.where(is_lei, _leaf(D_ID + 1, 'LEI'), _wrap(D_ID + 1, 'Prsn') + _leaf(D_ID + 2, 'Id'))
+
+    execwithinfirm = text['execwithinfirm']
+    est += np.where(execwithinfirm == 'NORE', _wrap(D_ID, 'ExctgPrsn') + _leaf(D_ID + 1, 'Clnt') + 4, 0)
+    exec_person = ((execwithinfirm != 'nan') & (execwithinfirm != 'NORE')).to_numpy()
+    est += np.where(exec_person, _wrap(D_ID, 'ExctgPrsn', 'Prsn') + _leaf(D_ID + 2, 'Id') + text_len('execwithinfirm'), 0)
+
+    est += np.where(present('strategylinkedorderid'), _leaf(D_INSTR, 'SlfExctnPrvntn') + text['selfexecutionprevention'].str.len().to_numpy(), 0)
+
+    statuses = text['orderstatus']
+    for code in ['FIRM', 'IMPL', 'INDI', 'ROUT']:
+        est += np.where(statuses.str.contains(code, regex=False).to_numpy(), STATUS_LEAF, 0)
+    for code in ['ACTI', 'INAC', 'SUSP']:
+        est += np.where(statuses.str.contains(code, regex=False).to_numpy(), VALIDITY_STATUS_LEAF, 0)
+
+    traded = (text['tradedquantity'] != '0').to_numpy()
+    tx = (
+        _wrap(D_ID, 'TxData') + _wrap(D_INSTR, 'TxPric', 'Pric', 'MntryVal') + _leaf(D_INSTR + 3, 'Amt', ' Ccy="EUR"')
+        + _unit(D_INSTR, 'TraddQty')
+    )
+    est += np.where(traded, tx + text['transactionprice'].str.len().to_numpy() + text['tradedquantity'].str.len().to_numpy(), 0)
+    est += np.where(traded & present('passiveoraggressive'), _leaf(D_INSTR, 'PssvOrAggrssvInd') + 4, 0)
+    return est
+
+
+def isin_line_bytes(encrypt_params: Optional[Dict[str, bool]] = None, isin_length: int = 12) -> int:
+    """Bytes of one ISIN element in the report header."""
+    text = HASH_LENGTH if (encrypt_params or {}).get('financialinstrumentidcode', False) else isin_length
+    return _leaf(ISIN_DEPTH, 'ISIN') + text
+
+
+def calibrate(
+    orders: pd.DataFrame,
+    build_xml: Callable[[pd.DataFrame], bytes],
+    encrypt_params: Optional[Dict[str, bool]] = None,
+    sample_size: int = 2000,
+    compress_level: Optional[int] = None,
+) -> tuple[float, float, int]:
+    """
+    Serializes a sample and returns (actual / estimated order bytes, compressed / actual bytes,
+    envelope bytes). The envelope is everything around the Ordr elements except the ISIN lines.
+    The sample is deflated at ``compress_level``, as the zip member will be.
+    """
+    if orders.shape[0] < 2:
+        return 1.0, 1.0, 0
+    n = min(sample_size, orders.shape[0])
+    sample = orders.iloc[np.linspace(0, orders.shape[0] - 1, n).astype(int)]
+    xml_bytes = build_xml(sample)
+    # orders are written one after another, from the first <Ordr> line to the last </Ordr> line
+    first = xml_bytes.rfind(b'\n', 0, xml_bytes.find(b'<Ordr>')) + 1
+    last = xml_bytes.rfind(b'</Ordr>') + len(b'</Ordr>\n')
+    order_bytes = last - first
+    isin_bytes = sum(len(line) + 1 for line in xml_bytes[:first].split(b'\n') if b'<ISIN>' in line)
+    envelope = len(xml_bytes) - order_bytes - isin_bytes
+    estimated = estimate_order_bytes(sample, encrypt_params).sum()
+    size_factor = order_bytes / max(estimated, 1)
+    level = -1 if compress_level is None else compress_level
+    compress_ratio = len(zlib.compress(xml_bytes, level)) / max(len(xml_bytes), 1)
+    return size_factor, compress_ratio, envelope
+
+
+def _group_keys(orders: pd.DataFrame, align: Optional[ALIGN]) -> Optional[pd.Series]:
+    if align is None:
+        return None
+    if align == 'day':
+        return orders['dateandtime'].astype(str).str[:10]
+    if align == 'instrument':
+        return orders['financialinstrumentidcode'].astype(str)
+    raise ValueError(f"Unknown split alignment: {align}")
+
+
+def _cut(weights: np.ndarray, start: int, stop: int, budget: float, cap: int) -> List[int]:
+    """Greedy cut points in [start, stop) so each piece stays within budget and cap rows."""
+    cum = np.cumsum(weights[start:stop])
+    cuts = []
+    offset, base = 0, 0.0
+    while offset < stop - start:
+        end = int(np.searchsorted(cum, base + budget, side='right'))
+        end = max(offset + 1, min(end, offset + cap, stop - start))
+        cuts.append(start + end)
+        base = cum[end - 1]
+        offset = end
+    return cuts
+
+
+def plan_splits(
+    orders: pd.DataFrame,
+    cap: int = 250000,
+    max_bytes: Optional[int] = None,
+    compressed: bool = False,
+    align: Optional[ALIGN] = None,
+    encrypt_params: Optional[Dict[str, bool]] = None,
+    build_xml: Optional[Callable[[pd.DataFrame], bytes]] = None,
+    compress_level: Optional[int] = None,
+) -> List[pd.Index]:
+    """
+    Returns orders index chunks, one per output file, each with at least two orders
+    unless there is only one.
+
+    Parameters
+    ----------
+    orders : pd.DataFrame
+        Orders to split.
+    cap : int
+        Maximum rows per file.
+    max_bytes : int, optional
+        Target file size. Defaults to None, splitting by cap only.
+    compressed : bool
+        Whether max_bytes is the deflated size rather than the XML size.
+    align : 'day' or 'instrument', optional
+        Only cut files at day or instrument boundaries, unless a single group exceeds the budget.
+    build_xml : Callable, optional
+        Serializes a sample to calibrate the byte estimate, the compression ratio and the
+        envelope size.
+    compress_level : int, optional
+        zlib level the files are deflated at, used to calibrate the compression ratio.
+    """
+    if max_bytes is None and align is None:
+        n_splits = int(np.ceil(orders.shape[0] / cap))
+        return np.array_split(orders.index, n_splits)
+
+    keys = _group_keys(orders, align)
+    if keys is not None:
+        # stable so seqnum order is kept within a group
+        orders = orders.iloc[np.argsort(keys.to_numpy(), kind='stable')]
+        keys = keys.loc[orders.index]
+
+    if max_bytes is None:
+        weights = np.ones(orders.shape[0])
+        budget = float(cap)
+    else:
+        weights = estimate_order_bytes(orders, encrypt_params).astype(float)
+        size_factor, compress_ratio, envelope = (1.0, 1.0, 0)
+        if build_xml is not None:
+            size_factor, compress_ratio, envelope = calibrate(orders, build_xml, encrypt_params, compress_level=compress_level)
+        weights *= size_factor
+        # every file repeats the envelope and lists its instruments, all of them at most
+        n_isins = orders['financialinstrumentidcode'].nunique()
+        header = envelope + n_isins * isin_line_bytes(encrypt_params)
+        ratio = 1.0
+        if compressed:
+            ratio = compress_ratio
+            if build_xml is not None:
+                ratio = _file_compress_ratio(orders, weights, header, ratio, max_bytes, build_xml, compress_level)
+        weights *= ratio
+        header = header * ratio + (ZIP_OVERHEAD if compressed else 0)
+        budget = max_bytes * SIZE_HEADROOM - header
+        if budget <= 0:
+            raise ValueError(f"max_bytes {max_bytes} leaves no room for orders after the {header:.0f} byte report header")
+
+    n = orders.shape[0]
+    if keys is None:
+        cuts = _cut(weights, 0, n, budget, cap)
+    else:
+        cuts = _aligned_cuts(weights, keys.to_numpy(), budget, cap)
+    cuts = _fix_single_order_pieces(cuts, weights, budget, cap)
+
+    pieces = []
+    prev = 0
+    for c in cuts:
+        pieces.append(orders.index[prev:c])
+        prev = c
+    return pieces
+
+
+def _file_compress_ratio(
+    orders: pd.DataFrame,
+    xml_weights: np.ndarray,
+    header: float,
+    ratio: float,
+    max_bytes: int,
+    build_xml: Callable[[pd.DataFrame], bytes],
+    compress_level: Optional[int] = None,
+    sample_size: int = 2000,
+    rounds: int = 5,
+    slices: int = 3,
+) -> float:
+    """
+    Deflate ratio of files of the planned size. Small files compress worse than the
+    calibration sample, so when a file holds fewer orders than the sample the ratio is
+    measured again on ``slices`` file sized runs of orders spread over the frame, until the
+    planned row count settles. The worst ratio is used, plus the spread between the runs as
+    a margin for files that compress worse than any measured run.
+    """
+    level = -1 if compress_level is None else compress_level
+    n = orders.shape[0]
+    cum = np.cumsum(xml_weights)
+    measured_rows = None
+    for _ in range(rounds):
+        room = (max_bytes * SIZE_HEADROOM - ZIP_OVERHEAD) / ratio - header
+        rows = max(int(np.searchsorted(cum, room, side='right')), 2)
+        if rows >= min(sample_size, n) or rows == measured_rows:
+            break
+        ratios = []
+        for start in np.linspace(0, n - rows, slices).astype(int):
+            xml_bytes = build_xml(orders.iloc[start:start + rows])
+            ratios.append(len(zlib.compress(xml_bytes, level)) / max(len(xml_bytes), 1))
+        ratio = 2 * max(ratios) - min(ratios)
+        measured_rows = rows
+    return ratio
+
+
+def _fix_single_order_pieces(cuts: List[int], weights: np.ndarray, budget: float, cap: int) -> List[int]:
+    """
+    A report needs more than one order. A single order piece is merged into a neighbour
+    where the result stays within budget and cap, keeping groups whole, otherwise it takes
+    the nearest order of a neighbour with orders to spare.
+    """
+    bounds = [0] + list(cuts)
+    cum = np.concatenate([[0.0], np.cumsum(weights)])
+
+    def fits(lo: int, hi: int) -> bool:
+        return hi - lo <= cap and cum[hi] - cum[lo] <= budget
+
+    i = 0
+    while len(bounds) > 2 and i < len(bounds) - 1:
+        lo, hi = bounds[i], bounds[i + 1]
+        if hi - lo >= 2:
+            i += 1
+            continue
+        has_prev, has_next = i > 0, i + 2 < len(bounds)
+        if has_next and fits(lo, bounds[i + 2]):
+            del bounds[i + 1]
+        elif has_prev and fits(bounds[i - 1], hi):
+            del bounds[i]
+            i -= 1
+        elif has_prev and lo - bounds[i - 1] > 2:
+            bounds[i] -= 1
+        elif has_next and bounds[i + 2] - hi > 2:
+            bounds[i + 1] += 1
+        elif has_prev:
+            # neighbours of two orders too large to take a third, nothing fits
+            del bounds[i]
+            i -= 1
+        else:
+            del bounds[i + 1]
+    return bounds[1:]
+
+
+def _aligned_cuts(weights: np.ndarray, codes: np.ndarray, budget: float, cap: int) -> List[int]:
+    """Greedy cut points on group boundaries, cutting inside a group only if it alone is over budget."""
+    n = len(weights)
+    bounds = list(np.flatnonzero(codes[1:] != codes[:-1]) + 1) + [n]
+    cum = np.concatenate([[0.0], np.cumsum(weights)])
+    cuts = []
+    start = 0
+    for i, b in enumerate(bounds):
+        nxt = bounds[i + 1] if i + 1 < len(bounds) else None
+        if nxt is not None and cum[nxt] - cum[start] <= budget and nxt - start <= cap:
+            continue
+        if cum[b] - cum[start] <= budget and b - start <= cap:
+            cuts.append(b)
+            start = b
+        else:
+            # single group over budget, cut inside it
+            cuts += _cut(weights, start, b, budget, cap)
+            start = b
+    return cuts
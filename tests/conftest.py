@@ -0,0 +1,52 @@
+import os
+import sys
+from datetime import datetime, timedelta
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+MARKET = "INET_MainMarket"
+DAY = datetime(2025, 3, 17)
+CODES = ["SAB1L", "NTU1L"]
+
+
+def write_day(root: str, day: datetime = DAY, n: int = 200):
+    """Writes ORK_* orders, trading phases and equilibrium prices files for one day."""
+    import pandas as pd
+    from orderbook.db.base import orderbook_cols
+    rows = []
+    for i in range(n):
+        code = CODES[i % len(CODES)]
+        price = f'{10 + i % 9 * 0.01:.3f}'
+        ts = (day + timedelta(hours=10, seconds=i)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        row = dict.fromkeys(orderbook_cols, '')
+        row.update(
+            submittingentityid='XLIT', dea='false', clientidcode=f'C{i % 7:03d}', tradingcapacity='DEAL',
+            liquidityprovisionactivity='false', dateandtime=ts, validityperiod='DAVY', seqnum=i + 1, mic='XLIT',
+            orderbookcode=code, financialinstrumentidcode='LT0000102253', dateofreceipt=ts,
+            orderidcode=f'{day:%Y%m%d}{i:06d}', orderevent='NEWO' if i % 5 else 'FILL', ordertype='LMT',
+            ordertypeclass='LMTO', buysellind='BUYI' if i % 2 else 'SELL', limitprice=price,
+            initialqty=str(100 + i), remainingqtyinclhidden=str(100 + i), pricenotation='MONE', quantitynotation='UNIT',
+            passiveonly='false', orderstatus='ACTI,FIRM',
+            transactionprice='NOAP' if i % 5 else price, tradedquantity='0' if i % 5 else str(10 + i),
+            # sparse optional columns, empty on most rows; fills come in pairs per code sharing a venue transaction id
+            prioritytimestamp=ts if i % 10 == 0 else '', passiveoraggressive='PASV' if i % 5 == 0 else '',
+            tradingvenuetransactionidcode='' if i % 5 else f'T{i // 20}',
+        )
+        rows.append(row)
+    stem = f"{MARKET}_INET_FSALT_{day:%Y%m%d}.csv.gz"
+    pd.DataFrame(rows)[orderbook_cols].to_csv(os.path.join(root, f"ORK_Orders_{stem}"), index=False, compression='gzip')
+    phases = [dict(date=f'{day:%Y%m%d}', seqnum=s, orderbookcode=c, tradingphases=p)
+              for c in CODES for s, p in ((0, 'Opening Auction'), (20, 'Continuous Trading'), (180, 'Closing Auction'))]
+    pd.DataFrame(phases).to_csv(os.path.join(root, f"ORK_Trading_Phases_{stem}"), index=False, compression='gzip')
+    prices = [dict(date=f'{day:%Y%m%d}', seqnum=5, orderbookcode=c, indicativeauctionprice='10.000', indicativeauctionvolume='100')
+              for c in CODES]
+    pd.DataFrame(prices).to_csv(os.path.join(root, f"ORK_Equilibrium_Prices_{stem}"), index=False, compression='gzip')
+
+
+@pytest.fixture
+def orders_dir(tmp_path):
+    root = tmp_path / "orders"
+    root.mkdir()
+    write_day(str(root))
+    return str(root) + os.sep
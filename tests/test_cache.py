@@ -0,0 +1,32 @@
+import os
+import pyarrow as pa
+from conftest import DAY, MARKET
+from orderbook.db.cache import OrderbookResultCache
+from orderbook.db.csvreader import OrderbookCSVA
+
+
+def test_cached_fetch_equals_fresh_fetch(orders_dir, tmp_path):
+    fresh = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    cache = OrderbookResultCache(str(tmp_path / "cache"))
+    db = OrderbookCSVA(orders_dir, cache=cache)
+    db.fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    assert len(os.listdir(cache.root)) == 1
+
+    cached = db.fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    assert fresh['prioritytimestamp'].isna().any()
+    assert cached.equals(fresh)
+    # equals() treats None and NaN alike, the xml converter tells them apart through astype(str)
+    assert cached.astype(str).equals(fresh.astype(str))
+
+
+def test_get_closes_the_memory_map(orders_dir, tmp_path, monkeypatch):
+    fresh = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    cache = OrderbookResultCache(str(tmp_path / "cache"))
+    cache.put("key", fresh)
+    opened = []
+    memory_map = pa.memory_map
+    monkeypatch.setattr(pa, "memory_map", lambda *args: opened.append(memory_map(*args)) or opened[-1])
+    cached = cache.get("key")
+    assert len(opened) == 1 and opened[0].closed
+    # the frame stays readable after the handle is closed
+    assert cached.astype(str).equals(fresh.astype(str))
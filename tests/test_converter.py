@@ -0,0 +1,155 @@
+import os
+import re
+import shutil
+import time
+import zipfile
+import numpy as np
+import pytest
+from conftest import DAY, MARKET, write_day
+from orderbook.db.csvreader import OrderbookCSVA
+from orderbook.xmlgen import converter
+
+
+@pytest.fixture
+def report_orders(orders_dir):
+    orders = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    orders['dateofreceipt'] = orders['dateofreceipt'].str[:10]
+    return orders
+
+
+def test_concurrent_exports_get_distinct_file_numbers(report_orders, tmp_path, monkeypatch):
+    out = str(tmp_path / "xml_output") + os.sep
+    os.makedirs(out)
+    # both exports count the folder before either has written, as concurrent workers do
+    monkeypatch.setattr(converter.os, "listdir", lambda path: [])
+    for code in ('SAB1L', 'NTU1L'):
+        orders = report_orders.loc[report_orders['orderbookcode'] == code]
+        assert converter.split_and_write_xml(orders, path=out, writers=0) is not None
+    monkeypatch.undo()
+
+    zips = sorted(os.listdir(out))
+    assert [z.rsplit('_', 2)[1] for z in zips] == ['000001', '000002']
+    for z in zips:
+        with zipfile.ZipFile(out + z) as zipf:
+            assert zipf.namelist() == [z[:-4] + '.xml']
+
+
+def test_failed_write_leaves_no_file_and_its_number_unused(report_orders, tmp_path, monkeypatch):
+    out = str(tmp_path / "xml_output") + os.sep
+    orders = report_orders.loc[report_orders['orderbookcode'] == 'SAB1L']
+
+    def failing_tree(*args, **kwargs):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(converter.etree, "ElementTree", failing_tree)
+        with pytest.raises(OSError):
+            converter.split_and_write_xml(orders, path=out, writers=0)
+    assert os.listdir(out) == []
+    converter.split_and_write_xml(orders, path=out, writers=0)
+    assert [z.rsplit('_', 2)[1] for z in os.listdir(out)] == ['000002']
+    assert sorted(os.listdir(str(tmp_path / "xml_output_numbers"))) == ['000001', '000002']
+
+
+def read_xml(zip_path):
+    """The zipped XML without the creation time and the random report id."""
+    with zipfile.ZipFile(zip_path) as zipf:
+        xml = zipf.read(zipf.namelist()[0])
+    return re.sub(rb'<(\w+:)?(CreDt|RptId)>[^<]*<', b'', xml)
+
+
+def test_writer_threads_keep_split_order(report_orders, tmp_path, monkeypatch):
+    serial = converter.split_and_write_xml(report_orders, path=str(tmp_path / "serial") + os.sep, cap=40, writers=0)
+    write_zip = converter._write_zip
+
+    def slow_early_splits(xml_tree, zip_path, xml_name, compress_level=None):
+        # earlier splits finish last
+        split = int(xml_name.split('_')[-3].split('Z')[0])
+        time.sleep(0.05 * (len(serial) - split))
+        write_zip(xml_tree, zip_path, xml_name, compress_level)
+
+    monkeypatch.setattr(converter, "_write_zip", slow_early_splits)
+    threaded = converter.split_and_write_xml(report_orders, path=str(tmp_path / "threaded") + os.sep, cap=40, writers=3)
+    assert len(serial) == len(threaded) == 5
+    assert [p.split('_')[-3] for p in threaded] == [f"{i:02d}Z05" for i in range(1, 6)]
+    assert [read_xml(p) for p in threaded] == [read_xml(p) for p in serial]
+
+
+def test_failed_writer_is_raised_after_earlier_splits(report_orders, tmp_path, monkeypatch):
+    out = str(tmp_path / "xml_output") + os.sep
+    write_zip = converter._write_zip
+
+    def fail_second_split(xml_tree, zip_path, xml_name, compress_level=None):
+        if '_02Z' in xml_name:
+            raise OSError("disk full")
+        write_zip(xml_tree, zip_path, xml_name, compress_level)
+
+    monkeypatch.setattr(converter, "_write_zip", fail_second_split)
+    with pytest.raises(OSError, match="disk full"):
+        converter.split_and_write_xml(report_orders, path=out, cap=40, writers=1)
+    # the writer buffer holds one split, nothing after the failed one was built
+    assert [z.split('_')[-3] for z in os.listdir(out)] == ['01Z05']
+
+
+def test_nothing_written_returns_none(report_orders, tmp_path, monkeypatch):
+    monkeypatch.setattr(converter, "validate_schema", lambda xml: False)
+    out = str(tmp_path / "xml_output") + os.sep
+    assert converter.split_and_write_xml(report_orders, path=out, cap=40, writers=2) is None
+    assert os.listdir(out) == []
+
+
+@pytest.mark.parametrize("compressed, compress_level, max_bytes", [
+    (False, None, 300_000), (True, 1, 30_000), (True, 9, 30_000), (True, None, 30_000),
+])
+def test_files_stay_within_max_bytes(tmp_path, compressed, compress_level, max_bytes):
+    root = tmp_path / "orders"
+    root.mkdir()
+    write_day(str(root), n=1000)
+    orders = OrderbookCSVA(str(root) + os.sep).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    orders['dateofreceipt'] = orders['dateofreceipt'].str[:10]
+    # the fixture's values repeat every few rows and deflate 30 fold, real order ids, clients,
+    # prices and sizes don't
+    rng = np.random.default_rng(0)
+    n = len(orders)
+    orders['orderidcode'] = rng.integers(10**11, 10**12, n).astype(str)
+    orders['clientidcode'] = rng.integers(10**5, 10**6, n).astype(str)
+    orders['limitprice'] = (rng.integers(900, 1100, n) / 100).astype(str)
+    orders['initialqty'] = rng.integers(1, 5000, n).astype(str)
+    orders['remainingqtyinclhidden'] = orders['initialqty']
+    out = str(tmp_path / "xml_output") + os.sep
+    converter.split_and_write_xml(orders, path=out, max_bytes=max_bytes, compressed=compressed,
+                                  compress_level=compress_level, writers=0)
+    sizes = []
+    for z in sorted(os.listdir(out)):
+        with zipfile.ZipFile(out + z) as zipf:
+            sizes.append(os.path.getsize(out + z) if compressed else zipf.infolist()[0].file_size)
+    assert len(sizes) > 2
+    assert max(sizes) <= max_bytes
+    # not just within budget, files are filled up to it bar the last one
+    assert min(sorted(sizes)[1:]) > 0.8 * max_bytes
+
+
+def test_aligned_files_with_header_stay_within_max_bytes(report_orders, tmp_path):
+    out = str(tmp_path / "xml_output") + os.sep
+    # one instrument per orderbook, so each file lists up to two ISINs
+    report_orders['financialinstrumentidcode'] = report_orders['orderbookcode'].map({'SAB1L': 'LT0000102253', 'NTU1L': 'LT0000101446'})
+    converter.split_and_write_xml(report_orders, path=out, max_bytes=40_000, align='instrument', writers=0)
+    for z in os.listdir(out):
+        with zipfile.ZipFile(out + z) as zipf:
+            assert zipf.infolist()[0].file_size <= 40_000
+
+
+
+def test_missing_master_schema_is_built_without_writing(report_orders, tmp_path):
+    from orderbook.utils import SCHEMA_DIR, check_create_master_schema
+    schema_dir = tmp_path / "schemas"
+    schema_dir.mkdir()
+    for name in os.listdir(SCHEMA_DIR):
+        if name != "master_schema.xsd":
+            shutil.copy(os.path.join(SCHEMA_DIR, name), schema_dir)
+    built = check_create_master_schema(str(schema_dir))
+    assert "master_schema.xsd" not in os.listdir(schema_dir)
+    xml = converter.create_orderbook_xml(report_orders.iloc[:2])
+    assert built.validate(xml) and converter.get_master_schema().validate(xml)
+    xml.find('.//{*}CreDt').text = 'yesterday'
+    assert not built.validate(xml)
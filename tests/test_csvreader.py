@@ -0,0 +1,29 @@
+import logging
+import re
+from conftest import DAY, MARKET
+from orderbook.db.base import make_orderbook_db
+from orderbook.db.csvreader import OrderbookCSVA
+
+
+def test_parse_pool_is_opt_in(orders_dir):
+    db = make_orderbook_db(orders_dir)
+    db.fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    assert db.parse_workers == 1
+    assert db._parse_pool is None
+
+
+def test_parallel_parse_equals_serial_parse(orders_dir, caplog):
+    serial = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    db = make_orderbook_db(orders_dir, parse_workers=2)
+    # the fixture is far below the default size, split it anyway
+    db.min_parallel_bytes = 0
+    try:
+        with caplog.at_level(logging.DEBUG, logger="orderbook.db.csvparallel"):
+            parallel = db.fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+        assert db._parse_pool is not None
+    finally:
+        db.close()
+    assert db._parse_pool is None
+    ranges = [int(n) for n in re.findall(r"in (\d+) ranges", caplog.text)]
+    assert len(ranges) == 1 and ranges[0] > 1
+    assert parallel.astype(str).equals(serial.astype(str))
@@ -0,0 +1,45 @@
+import os
+from datetime import timedelta
+import pandas as pd
+from conftest import DAY, MARKET, write_day
+from orderbook.db.csvreader import OrderbookCSVA
+from orderbook.db.duckdbreader import OrderbookDuckDB
+
+
+def test_duckdb_fetch_equals_csv_fetch(orders_dir):
+    csv_df = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    duck_df = OrderbookDuckDB(orders_dir, threads=1).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    assert csv_df['prioritytimestamp'].isna().any()
+    assert duck_df.equals(csv_df)
+    # equals() treats None and NaN alike, the xml converter tells them apart through astype(str)
+    assert duck_df.astype(str).equals(csv_df.astype(str))
+
+
+def test_duckdb_fetch_equals_csv_fetch_filtered(orders_dir):
+    kwargs = dict(market=MARKET, start=DAY, end=DAY, tickers=['NTU1L'], phases=['Continuous Trading'])
+    csv_df = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(**kwargs)
+    duck_df = OrderbookDuckDB(orders_dir, threads=1).fetch_filtered_orderbook_data(**kwargs)
+    assert not csv_df.empty
+    assert duck_df.astype(str).equals(csv_df.astype(str))
+
+
+def test_duckdb_skips_days_without_prices_like_csv(orders_dir):
+    next_day = DAY + timedelta(days=1)
+    write_day(orders_dir, next_day)
+    os.remove(os.path.join(orders_dir, f"ORK_Equilibrium_Prices_{MARKET}_INET_FSALT_{next_day:%Y%m%d}.csv.gz"))
+    csv_df = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=next_day)
+    duck_df = OrderbookDuckDB(orders_dir, threads=1).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=next_day)
+    assert set(csv_df['dateandtime'].str[:10]) == {f"{DAY:%Y-%m-%d}"}
+    assert duck_df.astype(str).equals(csv_df.astype(str))
+
+
+def test_duckdb_reads_pandas_na_strings_as_missing(orders_dir):
+    path = os.path.join(orders_dir, f"ORK_Orders_{MARKET}_INET_FSALT_{DAY:%Y%m%d}.csv.gz")
+    orders = pd.read_csv(path, dtype=str, keep_default_na=False)
+    orders.loc[::3, 'prioritysize'] = 'NA'
+    orders.loc[1::3, 'prioritysize'] = 'NULL'
+    orders.to_csv(path, index=False, compression='gzip')
+    csv_df = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    duck_df = OrderbookDuckDB(orders_dir, threads=1).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    assert csv_df['prioritysize'].isna().all()
+    assert duck_df.astype(str).equals(csv_df.astype(str))
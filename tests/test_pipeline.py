@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+from orderbook.etl import pipeline
+
+
+def test_use_stats_backend_defaults_path_per_backend(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, "_default_config", pipeline.PipelineConfig())
+    monkeypatch.setattr(pipeline, "_default_pipeline", None)
+    # an existing sqlite stats file must not get in the way of the parquet store
+    pipeline.use_stats_backend("sqlite")
+    pipeline.get_pipeline()
+    assert os.path.isfile("orderbook_stats.db")
+
+    pipeline.use_stats_backend("parquet")
+    stats_db = pipeline.get_pipeline().stats_db
+    assert type(stats_db).__name__ == "OrderbookStatsParquet"
+    assert os.path.isdir("orderbook_stats")
+
+
+def test_imports_load_no_heavy_libraries_and_write_nothing(tmp_path):
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    probe = (
+        "import sys, orderbook, orderbook.db.base, orderbook.etl.pipeline, orderbook.etl.workqueue; "
+        "print(','.join(m for m in ('pandas', 'duckdb', 'pyarrow', 'lxml') if m in sys.modules))"
+    )
+    env = dict(os.environ, PYTHONPATH=src)
+    # a fresh interpreter, this one already imported them
+    out = subprocess.run([sys.executable, "-c", probe], cwd=tmp_path, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+    assert os.listdir(tmp_path) == []
+
+
+class ClosingDB:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_configure_replaces_the_default_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "_default_config", pipeline.PipelineConfig())
+    old_source = ClosingDB()
+    monkeypatch.setattr(pipeline, "_default_pipeline", pipeline.StatsPipeline(old_source, None))
+
+    config = pipeline.PipelineConfig(source_path=str(tmp_path) + os.sep, source_backend="duckdb",
+                                     stats_path=str(tmp_path / "stats"), stats_backend="parquet")
+    pipeline.configure(config)
+    assert old_source.closed
+    built = pipeline.get_pipeline()
+    assert type(built.source_db).__name__ == "OrderbookDuckDB" and built.source_db.root == config.source_path
+    assert type(built.stats_db).__name__ == "OrderbookStatsParquet" and built.stats_db.root == config.stats_path
+    assert pipeline.get_pipeline() is built
+    pipeline.close()
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+from conftest import DAY, MARKET
+from orderbook.db.csvreader import OrderbookCSVA
+from orderbook.xmlgen import converter
+from orderbook.xmlgen.prevalidate import ORDER_RULES, split_valid_orders, validate_orders
+
+# (column, invalid value, rule name, row, other values set on the row); row 0 is a fill, row 1 a new order
+CASES = [
+    ('orderbookcode', 'X' * 21, 'Max20Text', 1, {}),
+    ('seqnum', '1' * 51, 'Max50PositiveNumber', 1, {}),
+    ('prioritytimestamp', '2025-13-45T99:99:99Z', 'ISODateTime', 0, {}),
+    ('dateandtime', '2025-03-17 10:00:00', 'ISODateTime', 1, {}),
+    ('financialinstrumentidcode', 'LT00001022', 'ISINOct2015Identifier', 1, {}),
+    ('orderidcode', 'O' * 51, 'Max50Text', 1, {}),
+    ('dateofreceipt', '2025-02-30', 'ISODate', 1, {}),
+    ('validityperiod', 'XXXX', 'ValidityPeriodType1Code', 1, {}),
+    ('validityperiodandtime', '2025-03-17T24:61:00Z', 'ISODateTime', 1, {}),
+    ('orderevent', 'TOOLONG', 'OrderEventType1Code or Exact4AlphaNumericText', 1, {}),
+    ('tradingphases', 'P' * 51, 'Max50Text', 1, {}),
+    ('indicativeauctionprice', '10.1234567', 'ActiveCurrencyAndAmount', 1, {}),
+    ('indicativeauctionvolume', '1e5', 'DecimalNumber', 1, {}),
+    ('dea', 'yes', 'TrueFalseIndicator', 1, {}),
+    ('clientidcode', 'C' * 141, 'Max140Text', 1, {}),
+    ('investmentdecisionwithinfirm', 'P' * 141, 'Max140Text', 1, {}),
+    ('execwithinfirm', 'E' * 141, 'Max140Text', 1, {}),
+    ('nonexecutingbroker', 'B' * 141, 'Max140Text', 1, {}),
+    ('tradingcapacity', 'XXXX', 'RegulatoryTradingCapacity1Code', 1, {}),
+    ('liquidityprovisionactivity', 'maybe', 'TrueFalseIndicator', 1, {}),
+    ('ordertype', 'T' * 51, 'Max50Text', 1, {}),
+    ('ordertypeclass', 'MKTO', 'OrderType3Code', 1, {}),
+    ('limitprice', '-1', 'ActiveCurrencyAnd13DecimalAmount', 1, {}),
+    ('additionallimitprice', 'abc', 'ActiveCurrencyAnd13DecimalAmount', 1, {}),
+    ('stopprice', '1.12345678901234', 'ActiveCurrencyAnd13DecimalAmount', 1, {}),
+    # the converter writes None as the text 'None'
+    ('peggedlimitprice', None, 'ActiveCurrencyAnd13DecimalAmount', 1, {}),
+    ('buysellind', 'BUY', 'Side6Code', 1, {}),
+    ('initialqty', '1.2.3', 'DecimalNumber', 1, {}),
+    ('remainingqtyinclhidden', '1' * 19, 'DecimalNumber', 1, {}),
+    ('displayedqty', 'x', 'DecimalNumber', 1, {}),
+    ('minacceptableqty', 'x', 'DecimalNumber', 1, {}),
+    ('minimumexecutablesize', 'x', 'DecimalNumber', 1, {}),
+    ('mesfirstexeconly', 'maybe', 'TrueFalseIndicator', 1, {'minimumexecutablesize': '100'}),
+    ('passiveonly', 'y', 'TrueFalseIndicator', 1, {}),
+    ('selfexecutionprevention', 'maybe', 'TrueFalseIndicator', 1, {'strategylinkedorderid': 'S1'}),
+    # a None link id is written, so the prevention flag it requires must be there
+    ('selfexecutionprevention', np.nan, 'required', 1, {'strategylinkedorderid': None}),
+    ('tradedquantity', 'x', 'DecimalNumber', 0, {}),
+    ('transactionprice', '-5', 'ActiveCurrencyAnd13DecimalAmount', 0, {}),
+    ('passiveoraggressive', 'XXXX', 'PassiveOrAgressiveType1Code', 0, {}),
+]
+
+
+@pytest.fixture
+def valid_orders(orders_dir):
+    """A fill and a new order that has every optional element set, both valid."""
+    orders = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY).iloc[:2].copy()
+    orders['dateofreceipt'] = orders['dateofreceipt'].str[:10]
+    optional = dict(
+        validityperiodandtime='2025-03-18T16:00:00Z', indicativeauctionprice='10.000', indicativeauctionvolume='100',
+        investmentdecisionwithinfirm='P1', execwithinfirm='NORE', nonexecutingbroker='B1',
+        additionallimitprice='10.5', stopprice='9.5', peggedlimitprice='10.25', displayedqty='50', minacceptableqty='10',
+        minimumexecutablesize='20', mesfirstexeconly='TRUE', strategylinkedorderid='S1', selfexecutionprevention='false',
+    )
+    for column, value in optional.items():
+        orders[column] = orders[column].astype(object)
+        orders.iloc[1, orders.columns.get_loc(column)] = value
+    return orders
+
+
+def schema_rejects(orders) -> bool:
+    try:
+        return not converter.validate_schema(converter.create_orderbook_xml(orders))
+    except Exception:
+        # e.g. dateandtime that can't be parsed for the report period
+        return True
+
+
+@pytest.fixture
+def plain_ids(monkeypatch):
+    # rules check the values as written; hashed ids always fit the schema
+    monkeypatch.setattr(converter, "ENCRYPT_PARAMS", {})
+
+
+def test_valid_rows_pass_and_are_schema_valid(valid_orders, plain_ids):
+    assert validate_orders(valid_orders).empty
+    assert not schema_rejects(valid_orders)
+
+
+def test_cases_cover_every_rule():
+    assert {(r.column, r.name) for r in ORDER_RULES} <= {(c[0], c[2]) for c in CASES}
+
+
+@pytest.mark.parametrize("column, value, rule, row, others", CASES, ids=[f"{c[0]}-{c[2]}" for c in CASES])
+def test_invalid_value_is_quarantined_and_schema_invalid(valid_orders, plain_ids, column, value, rule, row, others):
+    orders = valid_orders.astype(object)
+    for c, v in {**others, column: value}.items():
+        orders.iloc[row, orders.columns.get_loc(c)] = v
+
+    valid, quarantined, violations = split_valid_orders(orders)
+    assert list(quarantined.index) == [orders.index[row]]
+    assert list(valid.index) == [orders.index[1 - row]]
+    assert violations[['column', 'rule']].values.tolist() == [[column, rule]]
+    # the rule agrees with the schema on what the converter writes
+    assert schema_rejects(orders)
+    assert not schema_rejects(orders.loc[[orders.index[1 - row]] * 2])
+
+
+@pytest.mark.parametrize("column", sorted({r.column for r in ORDER_RULES if r.required and r.when is None}))
+def test_missing_required_value_is_quarantined(valid_orders, column):
+    orders = valid_orders.astype(object)
+    orders.iloc[1, orders.columns.get_loc(column)] = np.nan
+    _, quarantined, violations = split_valid_orders(orders)
+    assert list(quarantined.index) == [orders.index[1]]
+    assert violations[['column', 'rule']].values.tolist() == [[column, 'required']]
+
+
+def test_encrypted_columns_are_only_checked_for_presence(valid_orders):
+    orders = valid_orders.astype(object)
+    orders.iloc[1, orders.columns.get_loc('clientidcode')] = 'C' * 141
+    assert validate_orders(orders, encrypt_params=converter.ENCRYPT_PARAMS).empty
@@ -0,0 +1,96 @@
+import logging
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from conftest import CODES, DAY, MARKET, write_day
+from orderbook.db.csvreader import OrderbookCSVA
+from orderbook.db.snapshots import BookSnapshotStore
+from orderbook.etl.book import OrderBookState
+
+
+class CountingDB(OrderbookCSVA):
+    fetches = 0
+
+    def fetch_filtered_orderbook_data(self, *args, **kwargs):
+        self.fetches += 1
+        return super().fetch_filtered_orderbook_data(*args, **kwargs)
+
+
+def full_replay(orders: pd.DataFrame, code: str, ts: datetime) -> OrderBookState:
+    times = pd.to_datetime(orders['dateandtime'], utc=True, format='ISO8601').dt.tz_localize(None)
+    book = OrderBookState()
+    rows = orders.loc[(orders['orderbookcode'] == code) & np.asarray(times <= ts)].sort_values('seqnum')
+    for event in rows.to_dict(orient='records'):
+        book.apply(event)
+    return book
+
+
+def test_book_at_reads_events_file_and_matches_full_replay(orders_dir, tmp_path):
+    source = CountingDB(orders_dir)
+    store = BookSnapshotStore(source, path=str(tmp_path / "snapshots"), every_events=30)
+    store.build_day(MARKET, DAY)
+    assert source.fetches == 1
+
+    orders = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    for seconds in (0, 45, 61, 150, 199):
+        ts = DAY + timedelta(hours=10, seconds=seconds)
+        for code in CODES:
+            book, expected = store.book_at(MARKET, code, ts), full_replay(orders, code, ts)
+            assert {oid: o[:3] for oid, o in book.orders.items()} == {oid: o[:3] for oid, o in expected.orders.items()}
+            assert book.levels == expected.levels
+    assert source.fetches == 1
+
+
+def test_load_carry_over_warns_on_skipped_business_days(orders_dir, tmp_path, caplog):
+    store = BookSnapshotStore(OrderbookCSVA(orders_dir), path=str(tmp_path / "snapshots"))
+    # no source files for the 18th, an empty day is still built and carried over
+    store.build_day(MARKET, DAY)
+    store.build_day(MARKET, DAY + timedelta(days=1))
+    with caplog.at_level(logging.WARNING, logger="orderbook.db.snapshots"):
+        store.load_carry_over(MARKET, DAY + timedelta(days=2))
+        assert "not built" not in caplog.text
+        store.load_carry_over(MARKET, DAY + timedelta(days=6))
+    assert "2025-03-19, 2025-03-20, 2025-03-21" in caplog.text
+
+
+def test_two_day_book_matches_full_replay(orders_dir, tmp_path):
+    next_day = DAY + timedelta(days=1)
+    write_day(orders_dir, next_day)
+    # day one orders with validities that do and don't carry over, and a GTD expiring mid next day
+    stem = os.path.join(orders_dir, f"ORK_Orders_{MARKET}_INET_FSALT_{DAY:%Y%m%d}.csv.gz")
+    day_one = pd.read_csv(stem, dtype=str, keep_default_na=False)
+    validity = ['DAVY', 'GTCV', 'GTDV', 'GTTV', 'GASV', 'GADV']
+    day_one['validityperiod'] = [validity[i % len(validity)] for i in range(len(day_one))]
+    gtd = day_one['validityperiod'] == 'GTDV'
+    day_one.loc[gtd, 'validityperiodandtime'] = f'{next_day:%Y-%m-%d}T10:00:30.000000Z'
+    day_one.to_csv(stem, index=False, compression='gzip')
+
+    store = BookSnapshotStore(OrderbookCSVA(orders_dir), path=str(tmp_path / "snapshots"), every_events=30)
+    store.build_day(MARKET, DAY)
+    store.build_day(MARKET, next_day)
+
+    source = OrderbookCSVA(orders_dir)
+    first = source.fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    second = source.fetch_filtered_orderbook_data(market=MARKET, start=next_day, end=next_day)
+    carried_validities = set()
+    for seconds in (0, 29, 31, 150):
+        ts = next_day + timedelta(hours=10, seconds=seconds)
+        for code in CODES:
+            expected = full_replay(first, code, next_day)
+            # day only orders end with the day; GTTV is good till a time of that day
+            for oid, (_, _, _, validity, _) in list(expected.orders.items()):
+                if validity in ('DAVY', 'GTTV'):
+                    expected._remove(oid)
+            carried_validities |= {o[3] for o in expected.orders.values()}
+            for event in second.loc[second['orderbookcode'] == code].sort_values('seqnum').to_dict(orient='records'):
+                if pd.Timestamp(event['dateandtime']).tz_localize(None) <= ts:
+                    expected.apply(event)
+            if ts >= next_day + timedelta(hours=10, seconds=30):
+                for oid, (_, _, _, validity, _) in list(expected.orders.items()):
+                    if validity == 'GTDV':
+                        expected._remove(oid)
+            book = store.book_at(MARKET, code, ts)
+            assert {oid: o[:3] for oid, o in book.orders.items()} == {oid: o[:3] for oid, o in expected.orders.items()}
+            assert book.levels == expected.levels
+    assert carried_validities == {'GTCV', 'GTDV', 'GASV', 'GADV'}
@@ -0,0 +1,31 @@
+import pandas as pd
+from orderbook.xmlgen.splitting import plan_splits
+
+
+def day_orders(counts):
+    times = [f"2025-03-{17 + day}T10:00:{i:02d}.000000Z" for day, n in enumerate(counts) for i in range(n)]
+    return pd.DataFrame({'dateandtime': times, 'seqnum': range(len(times))})
+
+
+def test_single_order_pieces_are_folded():
+    # the first day alone is a single order and can't share a file with the full second day
+    for counts in ([1, 3], [1, 3, 1], [3, 1], [2, 1, 3]):
+        orders = day_orders(counts)
+        pieces = plan_splits(orders, cap=3, align='day')
+        assert all(len(p) >= 2 for p in pieces), counts
+        assert sorted(i for p in pieces for i in p) == list(orders.index)
+
+
+def test_single_order_pieces_stay_within_cap():
+    for counts in ([3, 1], [1, 3], [1, 3, 1], [3, 1, 3], [1, 1, 1, 1, 1]):
+        orders = day_orders(counts)
+        pieces = plan_splits(orders, cap=3, align='day')
+        assert all(2 <= len(p) <= 3 for p in pieces), (counts, pieces)
+        assert [i for p in pieces for i in p] == list(orders.index)
+
+
+def test_single_order_pieces_keep_days_whole_where_they_fit():
+    # the lone order of the 18th fits with the 19th, no day is split
+    orders = day_orders([3, 1, 1])
+    pieces = plan_splits(orders, cap=3, align='day')
+    assert [list(p) for p in pieces] == [[0, 1, 2], [3, 4]]
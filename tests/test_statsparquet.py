@@ -0,0 +1,56 @@
+from datetime import date, datetime
+import pandas as pd
+from orderbook.db.statsparquet import OrderbookStatsParquet
+from orderbook.etl.streaming import STATS_COLS
+
+
+def stats_frame(day: date, close: float) -> pd.DataFrame:
+    rows = [dict.fromkeys(STATS_COLS, 1.0) | {'date': day, 'market': 'INET_MainMarket', 'orderbookcode': code, 'close': close}
+            for code in ('SAB1L', 'NTU1L')]
+    df = pd.DataFrame(rows, columns=STATS_COLS)
+    return df.astype({'volume': 'int64', 'trade_count': 'int64'})
+
+
+def test_rewritten_day_replaces_rows(tmp_path):
+    store = OrderbookStatsParquet(str(tmp_path / "stats"), compact_threshold=100)
+    store.write_stats_df(stats_frame(date(2025, 3, 17), close=1.0))
+    store.write_stats_df(stats_frame(date(2025, 3, 18), close=1.0))
+    store.write_stats_df(stats_frame(date(2025, 3, 17), close=2.0))
+
+    stats = store.read_stats(datetime(2025, 3, 17), datetime(2025, 3, 18))
+    assert len(stats) == 4
+    assert stats.set_index(['date', 'orderbookcode'])['close'].to_dict() == {
+        (date(2025, 3, 17), 'SAB1L'): 2.0, (date(2025, 3, 17), 'NTU1L'): 2.0,
+        (date(2025, 3, 18), 'SAB1L'): 1.0, (date(2025, 3, 18), 'NTU1L'): 1.0,
+    }
+    # a column subset without the key columns is de-duplicated as well
+    assert len(store.read_stats(datetime(2025, 3, 17), datetime(2025, 3, 17), columns=['close'])) == 2
+
+
+def test_compaction_keeps_newest_row_per_key(tmp_path):
+    store = OrderbookStatsParquet(str(tmp_path / "stats"), compact_threshold=100)
+    for close in (1.0, 2.0, 3.0):
+        store.write_stats_df(stats_frame(date(2025, 3, 17), close=close))
+    partition = store._partitions()[0]
+    store.compact(partition)
+    assert len(store._part_files(partition)) == 1
+    # no de-duplication at read time, the compacted file itself holds one row per key
+    stats = store._scan([partition], ['orderbookcode', 'close']).to_pandas()
+    assert sorted(stats['orderbookcode']) == ['NTU1L', 'SAB1L']
+    assert (stats['close'] == 3.0).all()
+
+
+def test_batch_write_replaces_provisional_rows(tmp_path):
+    store = OrderbookStatsParquet(str(tmp_path / "stats"), compact_threshold=100)
+    streamed = stats_frame(date(2025, 3, 17), close=1.0)
+    # a stream that died mid-day, with a ticker the batch run doesn't produce
+    streamed.loc[1, 'orderbookcode'] = 'TEL1L'
+    store.upsert_stats_df(streamed.assign(provisional=True))
+    assert not store.get_date_exists(datetime(2025, 3, 17))
+    assert store.get_max_date() is None
+
+    store.write_stats_df(stats_frame(date(2025, 3, 17), close=2.0))
+    assert store.get_date_exists(datetime(2025, 3, 17))
+    stats = store.read_stats(datetime(2025, 3, 17), datetime(2025, 3, 17))
+    assert sorted(stats['orderbookcode']) == ['NTU1L', 'SAB1L']
+    assert (stats['close'] == 2.0).all() and not stats['provisional'].any()
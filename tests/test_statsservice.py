@@ -0,0 +1,193 @@
+import asyncio
+import json
+import threading
+from datetime import date, datetime, timedelta
+import pyarrow as pa
+import pytest
+from orderbook.db import statsservice
+from orderbook.db.statssqlite import OrderbookStatsSqlite
+from orderbook.db.statsservice import StatsQueryService, StatsResultCache
+from test_statsparquet import stats_frame
+
+START, END = datetime(2025, 3, 17), datetime(2025, 3, 19)
+
+
+class GatedReader:
+    """Counts reads on the wrapped reader and holds each one until the gate opens."""
+
+    def __init__(self, reader, calls, gate, fail):
+        self.reader, self.calls, self.gate, self.fail = reader, calls, gate, fail
+
+    def read_stats_batches(self, *args):
+        self.calls.append(args)
+        assert self.gate.wait(5)
+        if self.fail:
+            raise OSError("disk gone")
+        return self.reader.read_stats_batches(*args)
+
+    def close(self):
+        self.reader.close()
+
+
+class GatedStatsDB(OrderbookStatsSqlite):
+    calls: list
+    gate: threading.Event
+    fail = False
+
+    def open_reader(self):
+        return GatedReader(super().open_reader(), self.calls, self.gate, self.fail)
+
+
+@pytest.fixture
+def stats_db(tmp_path):
+    store = GatedStatsDB(str(tmp_path / "stats.db"))
+    store.calls, store.gate = [], threading.Event()
+    store.gate.set()
+    for i in range(3):
+        store.write_stats_df(stats_frame(date(2025, 3, 17) + timedelta(days=i), close=float(i)))
+    return store
+
+
+def run_service(service, test):
+    """Serves on a free local port while the test coroutine runs against it."""
+    async def main():
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            async with server:
+                return await test(port)
+        finally:
+            service.close()
+    return asyncio.run(main())
+
+
+async def fetch(port, target, method="GET"):
+    """Returns status, headers and the body chunks of one request."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, body = raw.split(b"\r\n\r\n", 1)
+    status_line, *header_lines = head.decode().split("\r\n")
+    headers = dict(line.split(": ", 1) for line in header_lines)
+    if headers.get('Transfer-Encoding') != 'chunked':
+        return int(status_line.split()[1]), headers, [body]
+    chunks = []
+    while True:
+        size_line, body = body.split(b"\r\n", 1)
+        size = int(size_line, 16)
+        if size == 0:
+            break
+        chunks.append(body[:size])
+        body = body[size + 2:]
+    return int(status_line.split()[1]), headers, chunks
+
+
+def test_concurrent_identical_queries_read_storage_once(stats_db):
+    service = StatsQueryService(stats_db, readers=2)
+    stats_db.gate.clear()
+    target = f"/stats?start={START:%Y-%m-%d}&end={END:%Y-%m-%d}&format=arrow"
+
+    async def test(port):
+        requests = [asyncio.ensure_future(fetch(port, target)) for _ in range(8)]
+        # the read is held until every request joined it
+        for _ in range(500):
+            if service.counters['coalesced'] == 7:
+                break
+            await asyncio.sleep(0.01)
+        stats_db.gate.set()
+        responses = await asyncio.gather(*requests)
+        again = await fetch(port, target)
+        return responses + [again]
+
+    responses = run_service(service, test)
+    assert len(stats_db.calls) == 1
+    assert {k: service.counters[k] for k in ('loads', 'coalesced', 'hits', 'errors')} == {
+        'loads': 1, 'coalesced': 7, 'hits': 1, 'errors': 0}
+    # batches are typed by STATS_SCHEMA, the sqlite frame has provisional as 0/1
+    expected = stats_db.read_stats(START, END).astype({'provisional': bool})
+    for status, headers, chunks in responses:
+        assert status == 200 and headers['Content-Type'] == 'application/vnd.apache.arrow.stream'
+        table = pa.ipc.open_stream(b"".join(chunks)).read_all()
+        assert table.to_pandas().equals(expected)
+
+
+def test_json_results_are_streamed_in_batches(stats_db, monkeypatch):
+    monkeypatch.setattr(statsservice, "BATCH_ROWS", 2)
+    service = StatsQueryService(stats_db)
+    status, headers, chunks = run_service(
+        service, lambda port: fetch(port, f"/stats?start={START:%Y-%m-%d}&end={END:%Y-%m-%d}&columns=date,orderbookcode,close"))
+    assert status == 200 and headers['Content-Type'] == 'application/x-ndjson'
+    # six rows read two at a time, each batch sent as it is read
+    assert len(chunks) == 3
+    records = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert records == [
+        {'date': f'2025-03-{17 + i}', 'orderbookcode': code, 'close': float(i)}
+        for i in range(3) for code in ('NTU1L', 'SAB1L')
+    ]
+
+
+def test_empty_result_is_a_valid_arrow_stream(stats_db):
+    service = StatsQueryService(stats_db)
+    status, _, chunks = run_service(service, lambda port: fetch(port, "/stats?start=2025-04-01&end=2025-04-30&format=arrow&columns=date,close"))
+    assert status == 200
+    table = pa.ipc.open_stream(b"".join(chunks)).read_all()
+    assert table.num_rows == 0 and table.schema.names == ['date', 'close']
+
+
+@pytest.mark.parametrize("target, method, status", [
+    ("/stats?start=2025-03-17", "GET", 400),
+    ("/stats?start=2025-03-17&end=2025-03-19&columns=nope", "GET", 400),
+    ("/stats?start=2025-03-17&end=2025-03-19&format=xml", "GET", 400),
+    ("/other", "GET", 404),
+    ("/stats?start=2025-03-17&end=2025-03-19", "POST", 405),
+])
+def test_bad_requests_get_an_error_response(stats_db, target, method, status):
+    service = StatsQueryService(stats_db)
+    got, _, chunks = run_service(service, lambda port: fetch(port, target, method))
+    assert got == status
+    assert 'error' in json.loads(chunks[0])
+    assert stats_db.calls == []
+
+
+def test_failed_read_returns_500_and_is_not_cached(stats_db):
+    stats_db.fail = True
+    service = StatsQueryService(stats_db)
+    target = f"/stats?start={START:%Y-%m-%d}&end={END:%Y-%m-%d}"
+
+    async def test(port):
+        failed = await fetch(port, target)
+        health = await fetch(port, "/health")
+        return failed, health
+
+    (status, _, chunks), (_, _, health) = run_service(service, test)
+    assert status == 500 and json.loads(chunks[0]) == {'error': 'disk gone'}
+    assert json.loads(health[0]) == {'inflight': 0, 'cached': 0, 'hits': 0, 'coalesced': 0, 'loads': 1, 'errors': 1}
+
+
+def test_cache_evicts_least_recently_used_by_bytes():
+    table = pa.table({'close': pa.array([1.0] * 100)})
+    cache = StatsResultCache(max_bytes=2 * table.nbytes, ttl=None)
+    cache.put('a', table)
+    cache.put('b', table)
+    assert cache.get('a') is table
+    cache.put('c', table)
+    assert cache.get('b') is None
+    assert cache.get('a') is table and cache.get('c') is table
+    # a result larger than the whole cache is not kept
+    cache.put('big', pa.concat_tables([table] * 3))
+    assert cache.get('big') is None and cache.get('a') is table
+
+
+def test_cache_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(statsservice.time, "monotonic", lambda: now[0])
+    cache = StatsResultCache(ttl=60.0)
+    table = pa.table({'close': [1.0]})
+    cache.put('a', table)
+    now[0] += 59
+    assert cache.get('a') is table
+    now[0] += 2
+    assert cache.get('a') is None
+    assert cache._bytes == 0
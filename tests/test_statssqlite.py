@@ -0,0 +1,55 @@
+import sqlite3
+from datetime import date, datetime
+import pyarrow as pa
+from orderbook.db.statssqlite import OrderbookStatsSqlite
+from test_statsparquet import stats_frame
+
+
+def test_batch_write_replaces_provisional_rows(tmp_path):
+    store = OrderbookStatsSqlite(str(tmp_path / "stats.db"))
+    streamed = stats_frame(date(2025, 3, 17), close=1.0)
+    streamed.loc[1, 'orderbookcode'] = 'TEL1L'
+    store.upsert_stats_df(streamed.assign(provisional=True))
+    assert not store.get_date_exists(datetime(2025, 3, 17))
+    assert store.get_max_date() is None
+
+    store.write_stats_df(stats_frame(date(2025, 3, 17), close=2.0))
+    assert store.get_date_exists(datetime(2025, 3, 17))
+    assert store.get_dates_between(datetime(2025, 3, 17), datetime(2025, 3, 18)) == [datetime(2025, 3, 17)]
+    stats = store.read_stats(datetime(2025, 3, 17), datetime(2025, 3, 17))
+    assert sorted(stats['orderbookcode']) == ['NTU1L', 'SAB1L']
+    assert (stats['close'] == 2.0).all() and not stats['provisional'].any()
+
+
+def test_existing_table_gets_provisional_column(tmp_path):
+    path = str(tmp_path / "stats.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE orderbook_stats (date DATE NOT NULL, market TEXT NOT NULL, orderbookcode TEXT NOT NULL, "
+                     "close REAL, PRIMARY KEY (date, market, orderbookcode))")
+        conn.execute("INSERT INTO orderbook_stats VALUES ('2025-03-17', 'INET_MainMarket', 'SAB1L', 1.0)")
+    store = OrderbookStatsSqlite(path)
+    assert store.get_date_exists(datetime(2025, 3, 17))
+
+
+def test_journal_mode_is_left_alone_unless_wal_is_asked_for(tmp_path):
+    path = str(tmp_path / "stats.db")
+    OrderbookStatsSqlite(path)
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+    OrderbookStatsSqlite(path, wal=True)
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+
+def test_batches_hold_the_rows_of_read_stats(tmp_path):
+    store = OrderbookStatsSqlite(str(tmp_path / "stats.db"))
+    for day in (17, 18, 19):
+        store.write_stats_df(stats_frame(date(2025, 3, day), close=float(day)))
+    start, end = datetime(2025, 3, 17), datetime(2025, 3, 19)
+    batches = list(store.open_reader().read_stats_batches(start, end, batch_rows=4))
+    assert [b.num_rows for b in batches] == [4, 2]
+    streamed = pa.Table.from_batches(batches).to_pandas()
+    assert streamed.equals(store.read_stats(start, end).astype({'provisional': bool}))
+    columns = list(store.read_stats_batches(start, end, columns=['date', 'close'], tickers=['SAB1L']))
+    assert pa.Table.from_batches(columns).to_pydict() == {
+        'date': [date(2025, 3, d) for d in (17, 18, 19)], 'close': [17.0, 18.0, 19.0]}
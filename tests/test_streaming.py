@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import DAY, MARKET
+from orderbook.db.csvreader import OrderbookCSVA
+from orderbook.etl import streaming
+from orderbook.etl.book import REMOVE_EVENTS
+from orderbook.etl.streaming import STATS_COLS, replay_daily_stats, run_stream, tail_file
+
+
+def amended_day(orders_dir) -> pd.DataFrame:
+    """
+    The fixture day, which has one side per orderbook, with some orders replaced on the other
+    side at a new price and size and some cancelled.
+    """
+    orders = OrderbookCSVA(orders_dir).fetch_filtered_orderbook_data(market=MARKET, start=DAY, end=DAY)
+    resting = orders.loc[orders['orderevent'] == 'NEWO']
+    replaced = resting.iloc[::7].assign(orderevent='REPL', remainingqtyinclhidden='7')
+    replaced['buysellind'] = replaced['buysellind'].map({'BUYI': 'SELL', 'SELL': 'BUYI'})
+    replaced['limitprice'] = np.where(replaced['buysellind'] == 'BUYI', '9.950', '10.500')
+    cancelled = resting.iloc[3::11].assign(orderevent='CAME')
+    amended = pd.concat([replaced, cancelled], ignore_index=True)
+    amended['seqnum'] = orders['seqnum'].max() + 1 + np.arange(len(amended))
+    return pd.concat([orders, amended], ignore_index=True)
+
+
+def reference_daily_stats(orders: pd.DataFrame) -> pd.DataFrame:
+    """Stats from whole-day groupbys: trades over all fills, the book from each order's last event."""
+    orders = orders.sort_values('seqnum')
+    trades = orders.assign(
+        price=lambda df: pd.to_numeric(df['transactionprice'], errors='coerce'),
+        qty=lambda df: pd.to_numeric(df['tradedquantity'], errors='coerce'),
+    )
+    trades = trades.loc[trades['qty'] > 0]
+    # both sides of an execution carry the venue transaction id, count it once
+    trades = trades.loc[trades['tradingvenuetransactionidcode'].isna()
+                        | ~trades.duplicated(['orderbookcode', 'tradingvenuetransactionidcode'])]
+    trades = trades.loc[trades['price'] > 0]
+    stats = trades.groupby('orderbookcode').agg(
+        open=('price', 'first'), high=('price', 'max'), low=('price', 'min'), close=('price', 'last'),
+        volume=('qty', 'sum'), trade_count=('price', 'size'),
+    )
+
+    last = orders.drop_duplicates('orderidcode', keep='last').assign(
+        side=lambda df: df['buysellind'].map({'BUY': 'BUY', 'BUYI': 'BUY', 'SELL': 'SELL'}),
+        price=lambda df: pd.to_numeric(df['limitprice'], errors='coerce'),
+        qty=lambda df: pd.to_numeric(df['remainingqtyinclhidden'], errors='coerce'),
+    )
+    resting = last.loc[~last['orderevent'].isin(REMOVE_EVENTS) & last['side'].notna() & last['price'].notna() & (last['qty'] > 0)]
+    levels = resting.groupby(['orderbookcode', 'side', 'price'])['qty'].sum().reset_index()
+    bids = levels.loc[levels['side'] == 'BUY'].sort_values('price', ascending=False).groupby('orderbookcode').head(5)
+    asks = levels.loc[levels['side'] == 'SELL'].sort_values('price').groupby('orderbookcode').head(5)
+    stats['top_spread'] = asks.groupby('orderbookcode')['price'].min() - bids.groupby('orderbookcode')['price'].max()
+    stats['buy_5_depth'] = bids.groupby('orderbookcode')['qty'].sum()
+    stats['sell_5_depth'] = asks.groupby('orderbookcode')['qty'].sum()
+    stats[['buy_5_depth', 'sell_5_depth']] = stats[['buy_5_depth', 'sell_5_depth']].fillna(0.0)
+    depth = stats['buy_5_depth'] + stats['sell_5_depth']
+    stats['imbalance'] = (stats['buy_5_depth'] - stats['sell_5_depth']) / depth.where(depth > 0)
+    return stats
+
+
+def test_streamed_stats_match_whole_day_reference(orders_dir):
+    orders = amended_day(orders_dir)
+    streamed = replay_daily_stats(orders, MARKET).set_index('orderbookcode').sort_index()
+    expected = reference_daily_stats(orders).sort_index()
+    assert expected['trade_count'].sum() < (orders['tradedquantity'].astype(float) > 0).sum()
+    assert expected['top_spread'].notna().all()
+
+    cols = STATS_COLS[3:]
+    pd.testing.assert_frame_equal(streamed[cols], expected[cols], check_dtype=False, check_names=False)
+    assert (streamed['date'] == DAY.date()).all() and (streamed['market'] == MARKET).all()
+
+
+def test_streamed_stats_match_batch_pipeline(orders_dir):
+    orderbookstats = pytest.importorskip("orderbook.etl.orderbookstats")
+    orders = amended_day(orders_dir)
+    streamed = replay_daily_stats(orders, MARKET).set_index('orderbookcode').sort_index()
+    batch = orderbookstats.get_daily_stats(orders).set_index('orderbookcode').sort_index()
+    cols = STATS_COLS[3:]
+    pd.testing.assert_frame_equal(streamed[cols], batch[cols], check_dtype=False, check_names=False)
+
+
+class RecordingStatsDB:
+    def __init__(self):
+        self.upserts = []
+
+    def upsert_stats_df(self, df):
+        self.upserts.append(df.copy())
+
+
+def _event(day, seqnum, code='SAB1L', price='10.000', qty='5', trade_id=''):
+    return dict(dateandtime=f'{day}T10:00:00.000000Z', seqnum=seqnum, orderbookcode=code, orderidcode=f'{day}{seqnum}',
+                orderevent='FILL', buysellind='BUYI', limitprice=price, remainingqtyinclhidden='0',
+                transactionprice=price, tradedquantity=qty, tradingvenuetransactionidcode=trade_id)
+
+
+def test_stream_rolls_over_at_midnight():
+    stats_db = RecordingStatsDB()
+    # seqnums restart on the next day
+    events = [_event('2025-03-17', 1), _event('2025-03-17', 2, price='11.000'),
+              _event('2025-03-18', 1, price='12.000'), _event('2025-03-17', 3), _event('2025-03-18', 2, price='13.000')]
+    final = run_stream(events, MARKET, stats_db=stats_db, flush_every_events=None, flush_every_seconds=None)
+
+    first_day, next_day = stats_db.upserts
+    assert list(first_day['date'].astype(str)) == ['2025-03-17']
+    assert first_day.iloc[0][['close', 'trade_count']].tolist() == [11.0, 2]
+    # the late event of the previous day is dropped, not counted in the new day
+    assert list(next_day['date'].astype(str)) == ['2025-03-18']
+    assert next_day.iloc[0][['open', 'close', 'trade_count']].tolist() == [12.0, 13.0, 2]
+    assert final.equals(next_day.drop(columns='provisional'))
+    assert first_day['provisional'].all() and next_day['provisional'].all()
+
+
+def test_idle_stream_flushes_on_time(monkeypatch):
+    clock = iter([0.0, 1.0, 100.0, 100.0])
+    monkeypatch.setattr(streaming.time, 'monotonic', lambda: next(clock))
+    flushed = []
+
+    def events():
+        yield _event('2025-03-17', 1)
+        yield None
+        # the idle tick has flushed before the source ends
+        flushed.append(len(stats_db.upserts))
+
+    stats_db = RecordingStatsDB()
+    run_stream(events(), MARKET, stats_db=stats_db, flush_every_events=None, flush_every_seconds=60.0)
+    assert flushed == [1]
+
+
+def test_tail_file_yields_none_while_idle(tmp_path):
+    path = tmp_path / "orders.csv"
+    path.write_text("seqnum,orderbookcode\n1,SAB1L\n")
+    events = tail_file(str(path), poll_interval=0)
+    assert next(events) == {'seqnum': '1', 'orderbookcode': 'SAB1L'}
+    assert next(events) is None
+    with open(path, 'a') as f:
+        f.write("2,NTU1L\n")
+    assert next(events) == {'seqnum': '2', 'orderbookcode': 'NTU1L'}
+    events.close()
@@ -0,0 +1,111 @@
+import os
+import sys
+import types
+from datetime import datetime, timedelta
+import pandas as pd
+from conftest import DAY, MARKET
+from orderbook.db.csvreader import OrderbookCSVA
+from orderbook.db.taskqueue import SqliteTaskQueue
+from orderbook.etl import pipeline, workqueue
+
+
+class FailingStatsDB:
+    def get_date_exists(self, date):
+        return False
+
+    def write_stats_df(self, df):
+        raise OSError("disk full")
+
+
+def test_stats_task_fails_when_insert_fails(orders_dir, tmp_path, monkeypatch):
+    orderbookstats = types.ModuleType("orderbook.etl.orderbookstats")
+    orderbookstats.get_daily_stats = lambda data: pd.DataFrame({'orderbookcode': data['orderbookcode'].unique()})
+    monkeypatch.setitem(sys.modules, "orderbook.etl.orderbookstats", orderbookstats)
+    monkeypatch.setattr(pipeline, "_default_pipeline", pipeline.StatsPipeline(OrderbookCSVA(orders_dir), FailingStatsDB()))
+
+    queue = SqliteTaskQueue(str(tmp_path / "tasks.db"), max_attempts=1)
+    queue.enqueue('stats_date', workqueue.stats_date_tasks(MARKET, DAY, DAY))
+    task = queue.claim("test-worker")
+    assert not workqueue.run_task(queue, task, "test-worker")
+    assert queue.counts()['failed'] == 1
+    assert "disk full" in queue.failed()[0][2]
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_expired_lease_is_reclaimed_until_attempts_run_out(tmp_path):
+    clock = Clock()
+    queue = SqliteTaskQueue(str(tmp_path / "tasks.db"), lease_seconds=10, max_attempts=2, clock=clock)
+    queue.enqueue('stats_date', [("a", {})])
+    first = queue.claim("worker-1")
+    assert first.attempts == 1
+    clock.now += 9
+    assert queue.claim("worker-2") is None
+    assert queue.heartbeat(first.id, "worker-1")
+
+    # worker-1 stops heartbeating, its lease runs out 10s after the last heartbeat
+    clock.now += 11
+    second = queue.claim("worker-2")
+    assert (second.id, second.attempts) == (first.id, 2)
+    assert not queue.heartbeat(first.id, "worker-1")
+    assert not queue.complete(first.id, "worker-1")
+
+    # the second claim was the last allowed attempt
+    clock.now += 11
+    assert queue.claim("worker-3") is None
+    assert queue.counts()['failed'] == 1
+    assert queue.failed() == [('stats_date', 'a', 'lease expired')]
+
+
+def test_failed_task_is_retried_after_backoff(tmp_path):
+    clock = Clock()
+    queue = SqliteTaskQueue(str(tmp_path / "tasks.db"), max_attempts=2, retry_backoff=30, clock=clock)
+    queue.enqueue('stats_date', [("a", {})])
+    task = queue.claim("worker-1")
+    assert queue.fail(task.id, "worker-1", "boom", task.attempts)
+    clock.now += 29
+    assert queue.claim("worker-1") is None
+    clock.now += 2
+    task = queue.claim("worker-1")
+    assert task.attempts == 2
+    assert queue.fail(task.id, "worker-1", "boom again", task.attempts)
+    assert queue.failed() == [('stats_date', 'a', 'boom again')]
+
+
+def test_stats_tasks_start_at_the_dataset():
+    tasks = workqueue.stats_date_tasks(MARKET, datetime(2021, 1, 4), pipeline.DATASET_START + timedelta(days=1))
+    assert [key for key, _ in tasks] == [f"{MARKET}/2025-03-17", f"{MARKET}/2025-03-18"]
+
+
+def test_xml_period_task_publishes_once_and_only_with_the_lease(tmp_path, monkeypatch):
+    from orderbook.xmlgen import adhoc_pipe
+    runs = []
+
+    def convert_period(period, path, backend="csv", tickers=None, publish_path=None):
+        runs.append(tickers[0])
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, f"{tickers[0]}.zip"), 'w') as f:
+            f.write("xml")
+        return 1
+
+    monkeypatch.setattr(adhoc_pipe, "_convert_period", convert_period)
+    out = str(tmp_path / "xml_output")
+    tasks = dict(workqueue.xml_period_tasks(datetime(2025, 3, 1), datetime(2025, 3, 31), path=out, tickers=['SAB1L', 'NTU1L']))
+    sab, ntu = tasks["SAB1L/2025-03-01/2025-03-31"], tasks["NTU1L/2025-03-01/2025-03-31"]
+
+    workqueue.HANDLERS['xml_period'](sab, lambda: True)
+    # a rerun, e.g. after the worker died before marking the task done, publishes nothing new
+    workqueue.HANDLERS['xml_period'](sab, lambda: True)
+    # a worker that lost the lease leaves publishing to the worker that took the task over
+    workqueue.HANDLERS['xml_period'](ntu, lambda: False)
+
+    assert runs == ['SAB1L', 'NTU1L']
+    assert os.listdir(out) == ['SAB1L.zip']
+    assert os.listdir(os.path.join(out + "_tasks", "staging")) == []
+    assert os.listdir(os.path.join(out + "_tasks", "done")) == ['SAB1L_2025-03-01_2025-03-31']